@@ -0,0 +1,55 @@
+from dataiku.connector import Connector
+
+from sharepoint_client import SharePointClient
+from sharepoint_library_inventory import SharePointLibraryInventory
+from safe_logger import SafeLogger
+from dss_constants import DSSConstants
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class SharePointLibraryInventoryConnector(Connector):
+    """
+    One row per file of a document library folder and its sub-folders, read page by page
+     with RenderListDataAsStream queries using the RecursiveAll scope.
+    """
+    def __init__(self, config, plugin_config):
+        Connector.__init__(self, config, plugin_config)
+        logger.info('SharePoint Online plugin library inventory connector v{}'.format(DSSConstants.PLUGIN_VERSION))
+        self.client = SharePointClient(config)
+        self.library_inventory = SharePointLibraryInventory(
+            self.client,
+            config.get("folder_path"),
+            custom_columns=config.get("custom_columns") or []
+        )
+        logger.info('init:folder_path={}, custom_columns={}'.format(self.library_inventory.folder_path, self.library_inventory.custom_columns))
+
+    def get_read_schema(self):
+        return self.library_inventory.get_read_schema()
+
+    def generate_rows(self, dataset_schema=None, dataset_partitioning=None,
+                      partition_id=None, records_limit=-1):
+        logger.info('generate_rows:folder_path={}, records_limit={}'.format(self.library_inventory.folder_path, records_limit))
+        for row in self.library_inventory.iter_rows(records_limit=records_limit):
+            yield row
+
+    def get_writer(self, dataset_schema=None, dataset_partitioning=None,
+                   partition_id=None, write_mode="OVERWRITE"):
+        raise Exception("The library inventory is read only")
+
+    def get_partitioning(self):
+        logger.info('get_partitioning')
+        raise Exception("Unimplemented")
+
+    def list_partitions(self, partitioning):
+        logger.info('list_partitions:partitioning={}'.format(partitioning))
+        return []
+
+    def partition_exists(self, partitioning, partition_id):
+        logger.info('partition_exists:partitioning={}, partition_id={}'.format(partitioning, partition_id))
+        raise Exception("unimplemented")
+
+    def get_records_count(self, partitioning=None, partition_id=None):
+        logger.info('get_records_count:partitioning={}, partition_id={}'.format(partitioning, partition_id))
+        raise Exception("unimplemented")
@@ -1,10 +1,11 @@
+import os
+import tempfile
 from dataiku.connector import Connector
 
 from sharepoint_client import SharePointClient
 from sharepoint_constants import SharePointConstants
 from sharepoint_lists import assert_list_title
-from sharepoint_lists import column_ids_to_names, sharepoint_to_dss_date
-from common import parse_query_string_to_dict
+from sharepoint_list_reader import SharePointListReader
 from safe_logger import SafeLogger
 from dss_constants import DSSConstants
 
@@ -25,22 +26,49 @@ class SharePointListsConnector(Connector):
         advanced_parameters = config.get("advanced_parameters", False)
         if not advanced_parameters:
             self.max_workers = 1  # no multithread per default
+            self.max_read_workers = 1
             self.batch_size = 100
             self.sharepoint_list_view_title = ""
+            self.project_columns = False
+            self.incremental_read = False
+            self.incremental_output = SharePointConstants.LIST_SYNC_OUTPUT_DELTA
+            self.sync_key = None
+            self.state_directory = None
         else:
             self.max_workers = config.get("max_workers", 1)
+            self.max_read_workers = config.get("max_read_workers", 1)
             self.batch_size = config.get("batch_size", 100)
             self.sharepoint_list_view_title = config.get("sharepoint_list_view_title", "")
-        logger.info("init:advanced_parameters={}, max_workers={}, batch_size={}".format(advanced_parameters, self.max_workers, self.batch_size))
+            self.project_columns = config.get("project_columns", False)
+            self.incremental_read = config.get("incremental_read", False)
+            self.incremental_output = config.get("incremental_output") or SharePointConstants.LIST_SYNC_OUTPUT_DELTA
+            self.sync_key = config.get("sync_key")
+            self.state_directory = config.get("state_directory")
+        logger.info("init:advanced_parameters={}, max_workers={}, max_read_workers={}, batch_size={}".format(
+            advanced_parameters, self.max_workers, self.max_read_workers, self.batch_size
+        ))
+        logger.info("init:incremental_read={}, incremental_output={}, sync_key={}".format(
+            self.incremental_read, self.incremental_output, self.sync_key
+        ))
+        if self.incremental_read and not self.sync_key:
+            raise ValueError("Set a sync key identifying this dataset to use the incremental read")
+        self.state_directory = self.state_directory or os.path.join(tempfile.gettempdir(), SharePointConstants.STATE_DIRECTORY_NAME)
         self.metadata_to_retrieve.append("Title")
         self.display_metadata = len(self.metadata_to_retrieve) > 0
         self.client = SharePointClient(config)
         self.sharepoint_list_view_id = None
         if self.sharepoint_list_view_title:
             self.sharepoint_list_view_id = self.client.get_view_id(self.sharepoint_list_title, self.sharepoint_list_view_title)
+        self.list_reader = SharePointListReader(
+            self.client,
+            self.sharepoint_list_title,
+            list_view_id=self.sharepoint_list_view_id,
+            max_read_workers=self.max_read_workers,
+            project_columns=self.project_columns
+        )
 
     def get_read_schema(self):
-        return self.client.get_read_schema(display_metadata=self.display_metadata, metadata_to_retrieve=self.metadata_to_retrieve)
+        return self.list_reader.get_read_schema(display_metadata=self.display_metadata, metadata_to_retrieve=self.metadata_to_retrieve)
 
     @staticmethod
     def get_column_lookup_field(column_static_name):
@@ -59,63 +87,32 @@ class SharePointListsConnector(Connector):
 
     def generate_rows(self, dataset_schema=None, dataset_partitioning=None,
                       partition_id=None, records_limit=-1):
-        if self.client.column_ids == {}:
-            self.client.get_read_schema()
+        self.get_read_schema()
 
         logger.info('generate_row:dataset_schema={}, dataset_partitioning={}, partition_id={}, records_limit={}'.format(
             dataset_schema, dataset_partitioning, partition_id, records_limit
         ))
 
-        page = {}
-        record_count = 0
-        is_first_run = True
-        is_record_limit = records_limit > 0
-        while is_first_run or self.is_not_last_page(page):
-            is_first_run = False
-            page = self.client.get_list_items(
-                self.sharepoint_list_title,
-                params=self.get_requests_params(page)
-            )
-            rows = self.get_page_rows(page)
-            for row in rows:
-                row = self.format_row(row)
-                yield column_ids_to_names(self.client.dss_column_name, row)
-            record_count += len(rows)
-            if is_record_limit and record_count >= records_limit:
-                break
-
-    @staticmethod
-    def is_not_last_page(page):
-        return "Row" in page and "NextHref" in page
-
-    def get_requests_params(self, page):
-        next_page_query_string = page.get("NextHref", "")
-        next_page_requests_params = parse_query_string_to_dict(next_page_query_string)
-        if self.sharepoint_list_view_id:
-            next_page_requests_params.update(
-                {
-                    "View": self.sharepoint_list_view_id
-                }
+        if self.incremental_read:
+            rows = self.list_reader.iter_incremental_rows(
+                self.state_directory,
+                self.sync_key,
+                dataset_schema=dataset_schema,
+                keep_snapshot=self.incremental_output == SharePointConstants.LIST_SYNC_OUTPUT_SNAPSHOT,
+                records_limit=records_limit
             )
-        return next_page_requests_params
-
-    @staticmethod
-    def get_page_rows(page):
-        return page.get("Row", "")
-
-    def format_row(self, row):
-        for column_to_format, type_to_process in self.client.columns_to_format:
-            if type_to_process == "date":
-                value = row.get(column_to_format)
-                if value:
-                    row[column_to_format] = sharepoint_to_dss_date(value)
-        return row
+        else:
+            rows = self.list_reader.iter_rows(dataset_schema=dataset_schema, records_limit=records_limit)
+        for row in rows:
+            yield row
 
     def get_writer(self, dataset_schema=None, dataset_partitioning=None,
                    partition_id=None, write_mode="OVERWRITE"):
         assert_list_title(self.sharepoint_list_title)
         if write_mode != "APPEND":
             write_mode = SharePointConstants.WRITE_MODE_CREATE
+        # The writer rebuilds the client's column mappings for the written schema
+        self.list_reader.reset_read_schema()
         return self.client.get_writer(dataset_schema, dataset_partitioning, partition_id, self.max_workers, self.batch_size, write_mode)
 
     def get_partitioning(self):
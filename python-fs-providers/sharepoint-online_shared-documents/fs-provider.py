@@ -1,19 +1,20 @@
 from dataiku.fsprovider import FSProvider
 
 import os
-import shutil
-
-from sharepoint_client import SharePointClient
+import tempfile
+
+from sharepoint_client import SharePointClient, SharePointClientError
+from sharepoint_constants import SharePointConstants
+from sharepoint_enumeration import SharePointFolderCrawler, SharePointLibraryEnumerator, SharePointSearchEnumerator
+from sharepoint_manifest import SharePointLibraryManifest
+from file_content_cache import FileContentCache
+from upload_hash_registry import UploadHashRegistry
+from sharepoint_prefetcher import SharePointReadPrefetcher
 from dss_constants import DSSConstants
-from sharepoint_items import loop_sharepoint_items, has_sharepoint_items, extract_item_from, get_size, get_last_modified, get_name, assert_path_is_not_root
-from common import get_rel_path, get_lnt_path, assert_valid_sharepoint_path, assert_no_percent_in_path
+from sharepoint_items import get_size, get_last_modified, get_name, assert_path_is_not_root
+from common import get_rel_path, get_lnt_path, assert_valid_sharepoint_path, assert_no_percent_in_path, is_limited
 from safe_logger import SafeLogger
 
-try:
-    from BytesIO import BytesIO  # for Python 2
-except ImportError:
-    from io import BytesIO  # for Python 3
-
 logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
 
 
@@ -37,6 +38,67 @@ class SharePointFSProvider(FSProvider):
             config,
             root_name_overwrite_legacy_mode=root_name_overwrite_legacy_mode
         )
+        enumeration_max_workers = SharePointConstants.ENUMERATION_MAX_WORKERS
+        self.enumeration_mode = SharePointConstants.ENUMERATION_MODE_LIBRARY_QUERY
+        state_directory = None
+        is_content_cache_enabled = False
+        is_skip_unchanged_enabled = False
+        read_prefetch_files = 0
+        search_glob = None
+        search_freshness_min = SharePointConstants.SEARCH_FRESHNESS_MIN
+        content_cache_max_size_mb = SharePointConstants.CONTENT_CACHE_MAX_SIZE_MB
+        if config.get("advanced_parameters", False):
+            enumeration_max_workers = config.get("enumeration_max_workers", enumeration_max_workers)
+            self.enumeration_mode = config.get("enumeration_mode", self.enumeration_mode)
+            state_directory = config.get("state_directory")
+            is_content_cache_enabled = config.get("content_cache", False)
+            content_cache_max_size_mb = config.get("content_cache_max_size_mb") or content_cache_max_size_mb
+            is_skip_unchanged_enabled = config.get("skip_unchanged_uploads", False)
+            read_prefetch_files = config.get("read_prefetch_files", read_prefetch_files) or 0
+            search_glob = config.get("search_glob")
+            search_freshness_min = config.get("search_freshness_min", search_freshness_min)
+        state_directory = state_directory or os.path.join(tempfile.gettempdir(), SharePointConstants.STATE_DIRECTORY_NAME)
+        logger.info('init:enumeration_mode={}, enumeration_max_workers={}'.format(self.enumeration_mode, enumeration_max_workers))
+        self.folder_crawler = SharePointFolderCrawler(self.client, max_workers=enumeration_max_workers)
+        self.library_enumerator = SharePointLibraryEnumerator(self.client)
+        self.search_enumerator = None
+        if self.enumeration_mode == SharePointConstants.ENUMERATION_MODE_SEARCH:
+            logger.info('init:search_glob={}, search_freshness_min={}'.format(search_glob, search_freshness_min))
+            self.search_enumerator = SharePointSearchEnumerator(
+                self.client,
+                self.library_enumerator,
+                glob_pattern=search_glob,
+                freshness_min=search_freshness_min
+            )
+        self.manifest = None
+        if self.enumeration_mode == SharePointConstants.ENUMERATION_MODE_INCREMENTAL:
+            self.manifest = SharePointLibraryManifest(
+                self.client,
+                self.library_enumerator,
+                get_lnt_path(self.get_full_path("")),
+                state_directory,
+                min_sync_interval_sec=self.client.listing_cache.ttl_sec
+            )
+        self.content_cache = None
+        if is_content_cache_enabled:
+            logger.info('init:content cache of {} MB'.format(content_cache_max_size_mb))
+            self.content_cache = FileContentCache(
+                os.path.join(state_directory, SharePointConstants.CONTENT_CACHE_DIRECTORY_NAME),
+                content_cache_max_size_mb * 1048576
+            )
+        self.upload_registry = None
+        if is_skip_unchanged_enabled:
+            self.upload_registry = UploadHashRegistry(
+                os.path.join(state_directory, SharePointConstants.UPLOAD_HASH_REGISTRY_DIRECTORY_NAME)
+            )
+        self.prefetcher = None
+        if read_prefetch_files > 0:
+            logger.info('init:prefetching {} files ahead'.format(read_prefetch_files))
+            self.prefetcher = SharePointReadPrefetcher(
+                self.download_file,
+                read_prefetch_files,
+                SharePointConstants.PREFETCH_SPOOL_MAX_MEMORY_SIZE
+            )
 
     # util methods
     def get_full_path(self, path):
@@ -44,45 +106,31 @@ class SharePointFSProvider(FSProvider):
         path_elts = [e for e in path_elts if len(e) > 0]
         return os.path.join(*path_elts)
 
+    def invalidate_manifest(self):
+        if self.manifest:
+            self.manifest.invalidate()
+        if self.prefetcher:
+            self.prefetcher.clear()
+
     def close(self):
-        logger.info('close')
+        logger.info('close:listing cache statistics={}'.format(self.client.get_listing_cache_statistics()))
+        self.client.flush_check_ins()
+        if self.prefetcher:
+            self.prefetcher.close()
 
     def stat(self, path):
         assert_valid_sharepoint_path(path)
         full_path = get_lnt_path(self.get_full_path(path))
         logger.info('stat:path="{}", full_path="{}"'.format(path, full_path))
-        files = self.client.get_files(full_path)
-        folders = self.client.get_folders(full_path)
-
-        if has_sharepoint_items(files) or has_sharepoint_items(folders):
-            return {
-                DSSConstants.PATH: get_lnt_path(path),
-                DSSConstants.SIZE: 0,
-                DSSConstants.IS_DIRECTORY: True
-            }
-
-        path_to_item, item_name = os.path.split(full_path)
-        files = self.client.get_files(path_to_item)
-        folders = self.client.get_folders(path_to_item)
-
-        file = extract_item_from(item_name, files)
-        folder = extract_item_from(item_name, folders)
-
-        if folder is not None:
-            return {
-                DSSConstants.PATH: get_lnt_path(path),
-                DSSConstants.SIZE: 0,
-                DSSConstants.LAST_MODIFIED: get_last_modified(folder),
-                DSSConstants.IS_DIRECTORY: True
-            }
-        if file is not None:
-            return {
-                DSSConstants.PATH: get_lnt_path(path),
-                DSSConstants.SIZE: get_size(file),
-                DSSConstants.LAST_MODIFIED: get_last_modified(file),
-                DSSConstants.IS_DIRECTORY: False
-            }
-        return None
+        item = self.client.resolve_path(full_path)
+        if item is None:
+            return None
+        return {
+            DSSConstants.PATH: get_lnt_path(path),
+            DSSConstants.SIZE: item.get(DSSConstants.SIZE),
+            DSSConstants.LAST_MODIFIED: item.get(DSSConstants.LAST_MODIFIED),
+            DSSConstants.IS_DIRECTORY: item.get(DSSConstants.IS_DIRECTORY)
+        }
 
     def set_last_modified(self, path, last_modified):
         full_path = self.get_full_path(path)
@@ -95,122 +143,125 @@ class SharePointFSProvider(FSProvider):
         full_path = get_lnt_path(self.get_full_path(path))
         logger.info('browse:path="{}", full_path="{}"'.format(path, full_path))
 
-        folders = self.client.get_folders(full_path)
-        files = self.client.get_files(full_path)
-        children = []
-
-        for file in loop_sharepoint_items(files):
-            children.append({
-                DSSConstants.FULL_PATH: get_lnt_path(os.path.join(path, get_name(file))),
-                DSSConstants.EXISTS: True,
-                DSSConstants.DIRECTORY: False,
-                DSSConstants.SIZE: get_size(file),
-                DSSConstants.LAST_MODIFIED: get_last_modified(file)
-            })
-        for folder in loop_sharepoint_items(folders):
-            children.append({
-                DSSConstants.FULL_PATH: get_lnt_path(os.path.join(path, get_name(folder))),
-                DSSConstants.EXISTS: True,
-                DSSConstants.DIRECTORY: True,
-                DSSConstants.SIZE: 0,
-                DSSConstants.LAST_MODIFIED: get_last_modified(folder)
-            })
-
-        if len(children) > 0:
-            return {
-                DSSConstants.FULL_PATH: get_lnt_path(path),
-                DSSConstants.EXISTS: True,
-                DSSConstants.DIRECTORY: True,
-                DSSConstants.CHILDREN: children
-            }
-        path_to_file, file_name = os.path.split(full_path)
-
-        files = self.client.get_files(path_to_file)
-
-        for file in loop_sharepoint_items(files):
-            if get_name(file) == file_name:
+        if self.manifest:
+            try:
+                return self.manifest.browse(path, full_path)
+            except Exception as error:
+                logger.warning("browse:manifest failed ({}), falling back to listing".format(error))
+
+        # Library roots and the folders already listed or written need no resolution, they are listed right away
+        is_folder_known = self.client.is_library_root(full_path) or self.client.is_known_folder(full_path)
+        if not is_folder_known:
+            item = self.client.resolve_path(full_path)
+            if item is None:
+                return {
+                    DSSConstants.FULL_PATH: None,
+                    DSSConstants.EXISTS: False
+                }
+            if not item.get(DSSConstants.IS_DIRECTORY):
                 return {
                     DSSConstants.FULL_PATH: get_lnt_path(path),
-                    DSSConstants.EXISTS: True, DSSConstants.SIZE: get_size(file),
-                    DSSConstants.LAST_MODIFIED: get_last_modified(file),
+                    DSSConstants.EXISTS: True,
+                    DSSConstants.SIZE: item.get(DSSConstants.SIZE),
+                    DSSConstants.LAST_MODIFIED: item.get(DSSConstants.LAST_MODIFIED),
                     DSSConstants.DIRECTORY: False
                 }
 
-        parent_path, item_name = os.path.split(full_path)
-        folders = self.client.get_folders(parent_path)
-        folder = extract_item_from(item_name, folders)
-        if folder is None:
-            ret = {
-                DSSConstants.FULL_PATH: None,
-                DSSConstants.EXISTS: False
-            }
-        else:
-            ret = {
-                DSSConstants.FULL_PATH: get_lnt_path(path),
-                DSSConstants.EXISTS: True,
-                DSSConstants.DIRECTORY: True,
-                DSSConstants.SIZE: 0
-            }
-        return ret
+        try:
+            children = self.list_children(path, full_path)
+        except SharePointClientError as error:
+            if not self.client.is_known_folder(full_path):
+                raise
+            # The folder may have been deleted since it was listed
+            logger.warning("browse:listing of known folder {} failed ({}), resolving it".format(full_path, error))
+            self.client.forget_known_folders(full_path)
+            return self.browse(path)
+
+        return {
+            DSSConstants.FULL_PATH: get_lnt_path(path),
+            DSSConstants.EXISTS: True,
+            DSSConstants.DIRECTORY: True,
+            DSSConstants.SIZE: 0,
+            DSSConstants.CHILDREN: children
+        }
+
+    def list_children(self, path, full_path):
+        children = []
+        for files in self.client.iter_files(full_path, select=SharePointConstants.FILE_LISTING_FIELDS):
+            for file in files:
+                children.append({
+                    DSSConstants.FULL_PATH: get_lnt_path(os.path.join(path, get_name(file))),
+                    DSSConstants.EXISTS: True,
+                    DSSConstants.DIRECTORY: False,
+                    DSSConstants.SIZE: get_size(file),
+                    DSSConstants.LAST_MODIFIED: get_last_modified(file)
+                })
+        folder_full_paths = []
+        for folders in self.client.iter_folders(full_path, select=SharePointConstants.FOLDER_LISTING_FIELDS):
+            for folder in folders:
+                folder_full_paths.append(get_lnt_path(os.path.join(full_path, get_name(folder))))
+                children.append({
+                    DSSConstants.FULL_PATH: get_lnt_path(os.path.join(path, get_name(folder))),
+                    DSSConstants.EXISTS: True,
+                    DSSConstants.DIRECTORY: True,
+                    DSSConstants.SIZE: 0,
+                    DSSConstants.LAST_MODIFIED: get_last_modified(folder)
+                })
+        # Browsing usually goes down to one of these sub-folders next
+        self.client.add_known_folders(folder_full_paths)
+        return children
 
     def enumerate(self, path, first_non_empty):
         assert_valid_sharepoint_path(path)
         full_path = get_lnt_path(self.get_full_path(path))
         logger.info('enumerate:path="{}",fullpath="{}", first_non_empty="{}"'.format(path, full_path, first_non_empty))
-        path_to_item, item_name = os.path.split(full_path)
-        is_file = self.client.is_file(full_path)
-        if is_file:
+        item = self.client.resolve_path(full_path)
+        if item is None:
+            return None
+        if not item.get(DSSConstants.IS_DIRECTORY):
             return [{
-                DSSConstants.PATH: path
+                DSSConstants.PATH: path,
+                DSSConstants.SIZE: item.get(DSSConstants.SIZE),
+                DSSConstants.LAST_MODIFIED: item.get(DSSConstants.LAST_MODIFIED)
             }]
         ret = self.list_recursive(path, full_path, first_non_empty)
+        if self.prefetcher and not first_non_empty:
+            self.prefetcher.schedule([self.get_full_path(file.get(DSSConstants.PATH)) for file in ret])
         return ret
 
     def list_recursive(self, path, full_path, first_non_empty):
-        paths = []
-        folders = self.client.get_folders(full_path)
-        for folder in loop_sharepoint_items(folders):
-            paths.extend(
-                self.list_recursive(
-                    get_lnt_path(os.path.join(path, get_name(folder))),
-                    get_lnt_path(os.path.join(full_path, get_name(folder))),
-                    first_non_empty
-                )
-            )
-        files = self.client.get_files(full_path)
-        for file in loop_sharepoint_items(files):
-            paths.append({
-                DSSConstants.PATH: get_lnt_path(os.path.join(path, get_name(file))),
-                DSSConstants.LAST_MODIFIED: get_last_modified(file),
-                DSSConstants.SIZE: get_size(file)
-            })
-            if first_non_empty:
-                return paths
-        return paths
+        if self.manifest:
+            try:
+                return self.manifest.list_files(path, full_path, first_non_empty)
+            except Exception as error:
+                logger.warning("list_recursive:manifest failed ({}), falling back to library query".format(error))
+        if self.search_enumerator:
+            try:
+                return self.search_enumerator.list_files(path, full_path, first_non_empty)
+            except Exception as error:
+                logger.warning("list_recursive:search failed ({}), falling back to library query".format(error))
+        if self.enumeration_mode != SharePointConstants.ENUMERATION_MODE_CRAWL:
+            try:
+                return self.library_enumerator.list_files(path, full_path, first_non_empty)
+            except Exception as error:
+                logger.warning("list_recursive:library query failed ({}), falling back to folder crawl".format(error))
+        return self.folder_crawler.list_files(path, full_path, first_non_empty)
 
     def delete_recursive(self, path):
         assert_valid_sharepoint_path(path)
         full_path = self.get_full_path(path)
         logger.info('delete_recursive:path={},fullpath={}'.format(path, full_path))
         assert_path_is_not_root(full_path)
-        path_to_item, item_name = os.path.split(full_path.rstrip("/"))
-        files = self.client.get_files(path_to_item)
-        folders = self.client.get_folders(path_to_item)
-        file = extract_item_from(item_name, files)
-        folder = extract_item_from(item_name, folders)
-
-        if file is not None and folder is not None:
-            raise Exception("Ambiguous naming with file / folder {}".format(item_name))
+        item = self.client.resolve_path(get_lnt_path(full_path))
+        if item is None:
+            return 0
 
-        if file is not None:
-            self.client.recycle_file(get_lnt_path(full_path))
-            return 1
-
-        if folder is not None:
+        if item.get(DSSConstants.IS_DIRECTORY):
             self.client.recycle_folder(get_lnt_path(full_path))
-            return 1
-
-        return 0
+        else:
+            self.client.recycle_file(get_lnt_path(full_path))
+        self.invalidate_manifest()
+        return 1
 
     def move(self, from_path, to_path):
         assert_valid_sharepoint_path(from_path)
@@ -222,26 +273,41 @@ class SharePointFSProvider(FSProvider):
         logger.info('move:from={},to={}'.format(full_from_path, full_to_path))
 
         self.client.move_file(full_from_path, full_to_path)
+        self.invalidate_manifest()
         # SP Online now returns {'odata.null': True}
         return True
 
     def read(self, path, stream, limit):
         assert_valid_sharepoint_path(path)
         full_path = self.get_full_path(path)
-        logger.info('read:full_path={}'.format(full_path))
-        response = self.client.get_file_content(full_path)
-        bio = BytesIO(response.content)
-        shutil.copyfileobj(bio, stream)
+        logger.info('read:full_path={}, limit={}'.format(full_path, limit))
+        if is_limited(limit):
+            self.client.download_file_content(full_path, stream, limit=limit)
+            return
+        if self.prefetcher and self.prefetcher.read(full_path, stream):
+            return
+        self.download_file(full_path, stream)
+
+    def download_file(self, full_path, stream):
+        if self.content_cache:
+            self.client.download_cached_file_content(full_path, stream, self.content_cache)
+            return
+        if self.client.is_parallel_download_enabled():
+            item = self.client.resolve_path(get_lnt_path(full_path))
+            if item is not None and not item.get(DSSConstants.IS_DIRECTORY):
+                self.client.download_file_content_in_parallel(full_path, stream, item.get(DSSConstants.SIZE))
+                return
+        self.client.download_file_content(full_path, stream)
 
     def write(self, path, stream):
         assert_valid_sharepoint_path(path)
         full_path = self.get_full_path(path)
         logger.info('write:path="{}", full_path="{}"'.format(path, full_path))
-        bio = BytesIO()
-        shutil.copyfileobj(stream, bio)
-        bio.seek(0)
-        data = bio.read()
         self.client.create_path(full_path)
-        response = self.client.write_file_content(full_path, data)
+        response = self.client.upload_file_content(full_path, stream, upload_registry=self.upload_registry)
+        if response is None:
+            return
         logger.info("write:response={}".format(response))
-        self.client.check_in_file(full_path)
+        self.invalidate_manifest()
+        self.client.queue_check_in(full_path)
+        self.client.flush_check_ins()
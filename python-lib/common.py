@@ -1,6 +1,11 @@
+import os
 import re
+import json
+import uuid
 import datetime
 import time
+import hashlib
+import threading
 try:
     import urlparse
 except:
@@ -26,6 +31,14 @@ def get_lnt_path(path):
     return '/' + '/'.join(elts)
 
 
+def is_same_or_child_path(path, parent_path):
+    path = get_lnt_path(path)
+    parent_path = get_lnt_path(parent_path)
+    if parent_path == '/':
+        return True
+    return path == parent_path or path.startswith(parent_path + '/')
+
+
 def is_email_address(address):
     return bool(re.match("^([a-zA-Z0-9_\-\.]+)@([a-zA-Z0-9_\-\.]+)\.([a-zA-Z]{2,5})$", address))
 
@@ -64,7 +77,7 @@ def parse_url(tenant_name):
     return url_tokens.scheme, url_tokens.netloc, url_tokens.path
 
 
-def is_request_performed(response):
+def is_request_performed(response, throttling_gate=None):
     if response is None:
         return False
     if response.status_code in [429, 503]:
@@ -74,7 +87,11 @@ def is_request_performed(response):
             logger.warning("dumping content: {}".format(response.content))
         seconds_before_retry = decode_retry_after_header(response)
         logger.warning("Sleeping for {} seconds".format(seconds_before_retry))
-        time.sleep(seconds_before_retry)
+        if throttling_gate:
+            throttling_gate.delay(seconds_before_retry)
+            throttling_gate.wait()
+        else:
+            time.sleep(seconds_before_retry)
         return False
     return True
 
@@ -106,6 +123,26 @@ def is_empty_path(path):
     return False
 
 
+def is_limited(limit):
+    return limit is not None and limit > 0
+
+
+def get_range_header(offset=0, length=-1):
+    """ HTTP Range header value for length bytes starting at offset, or up to the end of the file if length is not set """
+    offset = max(offset or 0, 0)
+    if is_limited(length):
+        return "bytes={}-{}".format(offset, offset + length - 1)
+    return "bytes={}-".format(offset)
+
+
+def get_content_range_size(content_range):
+    """ Complete size of the file from a Content-Range header such as bytes 0-99/1234, None if it is not known """
+    size = (content_range or "").rpartition("/")[2].strip()
+    if not size.isdigit():
+        return None
+    return int(size)
+
+
 def merge_paths(first_path, second_path):
     path_1 = first_path or ""
     path_2 = second_path or ""
@@ -189,6 +226,119 @@ def assert_not_forbidden_dataset_type(dataset, forbiden_type, forbiden_name, plu
             )
 
 
+def rewind_request_body(data):
+    # File-like bodies are consumed by each attempt, so they have to be rewound before being posted again
+    if hasattr(data, "seek"):
+        data.seek(0)
+
+
+def copy_and_hash(source, destination, buffer_size):
+    """ Copies source into destination block by block, returns the sha256 hex digest of the copied content """
+    content_hash = hashlib.sha256()
+    while True:
+        block = source.read(buffer_size)
+        if not block:
+            break
+        content_hash.update(block)
+        destination.write(block)
+    return content_hash.hexdigest()
+
+
+def get_state_key(*elements):
+    """ Hash of elements such as a site and a path, used to name the state files kept for them """
+    return hashlib.sha1("|".join(elements).encode("utf-8")).hexdigest()
+
+
+def save_json_atomically(file_path, content):
+    """ Dumps content in a temporary file renamed to file_path, so that other processes never read a partially written file """
+    temporary_file_path = "{}.{}.tmp".format(file_path, uuid.uuid4().hex)
+    try:
+        with open(temporary_file_path, "w") as json_file:
+            json.dump(content, json_file)
+        os.replace(temporary_file_path, file_path)
+    except Exception:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+        raise
+
+
+def parse_batch_response(content):
+    """ Status code and decoded JSON body (None if empty or not JSON) of each part of a $batch response, in request order """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    parts = []
+    # Answers to a changeset are nested in their own changesetresponse boundaries
+    for part in re.split(r"--(?:batch|changeset)response_[^\r\n]*", content):
+        match = re.search(r"HTTP/1\.1 (\d{3})[^\r\n]*(?:\r?\n[^\r\n]+)*(?:\r?\n\r?\n(.*))?", part, re.DOTALL)
+        if not match:
+            continue
+        body = (match.group(2) or "").strip()
+        try:
+            json_body = json.loads(body) if body else None
+        except ValueError:
+            json_body = None
+        parts.append((int(match.group(1)), json_body))
+    return parts
+
+
+class ThrottlingGate():
+    """
+    Pause shared by all the threads sending requests through the same session: once one of them is throttled,
+     the others hold their next request too instead of getting throttled in turn.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resume_time = 0
+
+    def delay(self, seconds):
+        with self.lock:
+            self.resume_time = max(self.resume_time, time.monotonic() + seconds)
+
+    def wait(self):
+        with self.lock:
+            time_to_wait = self.resume_time - time.monotonic()
+        if time_to_wait > 0:
+            time.sleep(time_to_wait)
+        return max(time_to_wait, 0)
+
+
+class FileSliceReader():
+    """
+    Read-only window over [offset, offset + length[ of a seekable file, used as a request body
+     so that chunks of a large file can be posted without copying them in memory.
+    """
+    def __init__(self, file_handle, offset, length):
+        self.file_handle = file_handle
+        self.offset = offset
+        self.length = length
+        self.position = 0
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        if remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        self.file_handle.seek(self.offset + self.position)
+        data = self.file_handle.read(size)
+        self.position += len(data)
+        return data
+
+    def seek(self, position, whence=0):
+        if whence == 1:
+            position += self.position
+        elif whence == 2:
+            position += self.length
+        self.position = min(max(position, 0), self.length)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
 class ItemsLimit():
     def __init__(self, records_limit=-1):
         self.has_no_limit = (records_limit == -1)
@@ -0,0 +1,152 @@
+import os
+import json
+import uuid
+import fcntl
+import shutil
+from contextlib import contextmanager
+
+from common import save_json_atomically
+from dss_constants import DSSConstants
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+LOCK_FILE_NAME = ".lock"
+METADATA_EXTENSION = ".json"
+DATA_EXTENSION = ".data"
+TEMPORARY_EXTENSION = ".tmp"
+
+
+class FileContentCache(object):
+    """
+    Disk cache of file contents, keyed by file and validated by the server's ETag.
+     Each entry is a data file and a metadata file pointing to it. Both are written under a temporary name and renamed,
+     so readers in other processes only ever see complete entries. Eviction is done under an exclusive file lock,
+     least recently used entries first, until the cache holds at most max_size bytes.
+    """
+    def __init__(self, cache_directory, max_size, copy_buffer_size=1048576):
+        self.cache_directory = cache_directory
+        self.max_size = max_size
+        self.copy_buffer_size = copy_buffer_size
+        os.makedirs(self.cache_directory, exist_ok=True)
+        self.lock_file_path = os.path.join(self.cache_directory, LOCK_FILE_NAME)
+
+    def get_etag(self, key):
+        entry = self.get_entry(key)
+        return entry.get("etag") if entry else None
+
+    def get_entry(self, key):
+        try:
+            with open(self.get_metadata_path(key), "r") as metadata_file:
+                return json.load(metadata_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def copy_to(self, key, etag, stream):
+        """ Copies the cached content into stream, returns False if there is no entry for this ETag any more """
+        entry = self.get_entry(key)
+        if not entry or entry.get("etag") != etag:
+            return False
+        data_path = os.path.join(self.cache_directory, entry.get("data_file"))
+        try:
+            data_file = open(data_path, "rb")
+        except (IOError, OSError):
+            # Evicted or replaced by another process in the meantime
+            return False
+        with data_file:
+            shutil.copyfileobj(data_file, stream, self.copy_buffer_size)
+        self.touch(key)
+        return True
+
+    @contextmanager
+    def writer(self, key, etag):
+        """ File to write the content of a new entry into, published when the block exits without error """
+        data_file_name = "{}.{}{}".format(key, uuid.uuid4().hex, DATA_EXTENSION)
+        data_path = os.path.join(self.cache_directory, data_file_name)
+        temporary_data_path = data_path + TEMPORARY_EXTENSION
+        try:
+            with open(temporary_data_path, "wb") as data_file:
+                yield data_file
+            os.replace(temporary_data_path, data_path)
+        except Exception:
+            remove_file(temporary_data_path)
+            raise
+        size = os.path.getsize(data_path)
+        if size > self.max_size:
+            remove_file(data_path)
+            return
+        with self.lock():
+            previous_entry = self.get_entry(key)
+            self.write_metadata(key, {"etag": etag, "size": size, "data_file": data_file_name})
+            if previous_entry and previous_entry.get("data_file") != data_file_name:
+                remove_file(os.path.join(self.cache_directory, previous_entry.get("data_file")))
+            self.evict()
+
+    def write_metadata(self, key, entry):
+        save_json_atomically(self.get_metadata_path(key), entry)
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache fits in max_size. Must be called under lock. """
+        entries = []
+        cache_size = 0
+        for file_name in os.listdir(self.cache_directory):
+            if not file_name.endswith(METADATA_EXTENSION):
+                continue
+            key = file_name[:-len(METADATA_EXTENSION)]
+            entry = self.get_entry(key)
+            if not entry:
+                continue
+            try:
+                last_access_time = os.path.getmtime(self.get_metadata_path(key))
+            except OSError:
+                continue
+            entries.append((last_access_time, key, entry))
+            cache_size += entry.get("size", 0)
+        if cache_size <= self.max_size:
+            return
+        entries.sort(key=lambda access_time_and_entry: access_time_and_entry[0])
+        number_of_evictions = 0
+        for last_access_time, key, entry in entries:
+            if cache_size <= self.max_size:
+                break
+            remove_file(self.get_metadata_path(key))
+            remove_file(os.path.join(self.cache_directory, entry.get("data_file")))
+            cache_size -= entry.get("size", 0)
+            number_of_evictions += 1
+        logger.info("FileContentCache:{} entries evicted, {} bytes left".format(number_of_evictions, cache_size))
+
+    def touch(self, key):
+        try:
+            os.utime(self.get_metadata_path(key))
+        except OSError:
+            pass
+
+    @contextmanager
+    def lock(self):
+        with open(self.lock_file_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_metadata_path(self, key):
+        return os.path.join(self.cache_directory, key + METADATA_EXTENSION)
+
+
+class TeeWriter(object):
+    """ Writes to several streams at once """
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, data):
+        for stream in self.streams:
+            stream.write(data)
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
@@ -1,7 +1,7 @@
 import time
 from safe_logger import SafeLogger
 from dss_constants import DSSConstants
-from common import update_dict_in_kwargs
+from common import update_dict_in_kwargs, rewind_request_body, ThrottlingGate
 
 
 logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
@@ -14,6 +14,7 @@ class RobustSessionError(ValueError):
 class RobustSession():
     """
     Implements a retry on status code 429 and connections reset by peer, and a connection reset + retry on error 403
+     The waits before retrying are shared by all the threads using the session.
     """
     def __init__(self, session=None, status_codes_to_retry=None, max_retries=1, base_retry_timer_sec=60, attempt_session_reset_on_403=False):
         logger.info("Init RobustSession")
@@ -26,6 +27,7 @@ class RobustSession():
         self.connection_library = None
         self.attempt_session_reset_on_403 = attempt_session_reset_on_403
         self.default_headers = {}
+        self.throttling_gate = ThrottlingGate()
 
     def update_settings(self, session=None, status_codes_to_retry=None, max_retries=None, base_retry_timer_sec=None, default_headers=None):
         self.session = session or self.session
@@ -101,6 +103,8 @@ class RobustSession():
                 if attempt_number > 1:
                     # Only log if there seems to be an issue
                     logger.info("RobustSession:retry:attempt {} #{}".format(func, attempt_number))
+                    rewind_request_body(kwargs.get("data"))
+                self.throttling_gate.wait()
                 response = func(*args, **kwargs)
                 if attempt_number > 1:
                     logger.info("RobustSession:retry:Response={}".format(response))
@@ -109,7 +113,8 @@ class RobustSession():
                         successful_func = True
                     elif response.status_code in self.status_codes_to_retry:
                         logger.warning("Error {} on attempt #{}".format(response.status_code, attempt_number))
-                        self.sleep(self.base_retry_timer_sec * attempt_number)
+                        logger.info("Pausing requests for {} seconds".format(self.base_retry_timer_sec * attempt_number))
+                        self.throttling_gate.delay(self.base_retry_timer_sec * attempt_number)
                     else:
                         return response
                 else:
@@ -7,20 +7,32 @@ import uuid
 import time
 import json
 import re
+import threading
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from xml.etree.ElementTree import Element, tostring
 from xml.dom import minidom
 from robust_session import RobustSession
 from sharepoint_constants import SharePointConstants
 from sharepoint_lists import SharePointListWriter, get_dss_type
+from sharepoint_items import (
+    get_item_resolution, get_last_modified, get_name, get_sharepoint_items, get_next_page_url
+)
 from dss_constants import DSSConstants
 from common import (
     is_email_address, get_value_from_path, parse_url,
     get_value_from_paths, is_request_performed, ItemsLimit,
-    is_empty_path, get_lnt_path,
-    format_private_key, format_certificate_thumbprint, url_encode
+    is_empty_path, get_lnt_path, ThrottlingGate, is_limited, merge_paths, is_same_or_child_path, get_range_header, get_content_range_size,
+    FileSliceReader, rewind_request_body,
+    copy_and_hash, parse_batch_response, format_private_key, format_certificate_thumbprint, url_encode, get_state_key
 )
 from safe_logger import SafeLogger
+from ttl_cache import TTLCache
+from file_content_cache import TeeWriter
 
 
 logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
@@ -30,6 +42,10 @@ class SharePointClientError(ValueError):
     pass
 
 
+class SharePointListViewThresholdError(SharePointClientError):
+    pass
+
+
 class SharePointClient():
 
     def __init__(self, config, root_name_overwrite_legacy_mode=False):
@@ -40,7 +56,30 @@ class SharePointClient():
         self.sharepoint_origin = None
         self.allow_string_recasting = config.get("advanced_parameters", False) and config.get("allow_string_recasting", False)
         attempt_session_reset_on_403 = config.get("advanced_parameters", False) and config.get("attempt_session_reset_on_403", False)
+        self.download_chunk_size = get_size_from_config(
+            config, "download_chunk_size_kb", SharePointConstants.FILE_DOWNLOAD_CHUNK_SIZE
+        )
+        self.download_max_workers = SharePointConstants.DOWNLOAD_MAX_WORKERS
+        if config.get("advanced_parameters", False):
+            self.download_max_workers = config.get("download_max_workers", self.download_max_workers)
+        self.download_part_size = get_size_from_config(
+            config, "download_part_size_mb", SharePointConstants.DOWNLOAD_PART_SIZE, unit=1048576
+        )
+        self.upload_spool_max_memory_size = get_size_from_config(
+            config, "upload_spool_max_memory_mb", SharePointConstants.FILE_UPLOAD_SPOOL_MAX_MEMORY_SIZE, unit=1048576
+        )
         self.session = RobustSession(status_codes_to_retry=[429, 503], attempt_session_reset_on_403=attempt_session_reset_on_403)
+        listing_cache_ttl_sec = SharePointConstants.LISTING_CACHE_TTL_SEC
+        if config.get("advanced_parameters", False):
+            listing_cache_ttl_sec = config.get("listing_cache_ttl_sec", listing_cache_ttl_sec)
+        self.listing_cache = TTLCache(ttl_sec=listing_cache_ttl_sec, max_entries=SharePointConstants.LISTING_CACHE_MAX_ENTRIES)
+        self.known_folders = set()
+        self.known_folders_lock = threading.Lock()
+        self.libraries_force_checkout = {}
+        self.libraries_force_checkout_lock = threading.Lock()
+        self.pending_check_ins = []
+        self.pending_upload_records = []
+        self.pending_check_ins_lock = threading.Lock()
         self.number_dumped_logs = 0
         self.username_for_namespace_diag = None
 
@@ -50,6 +89,7 @@ class SharePointClient():
         self.column_entity_property_name = {}
         self.columns_to_format = []
         self.column_sharepoint_type = {}
+        self.schema_lock = threading.Lock()
 
         if config.get('auth_type') == DSSConstants.AUTH_OAUTH:
             logger.info("SharePointClient:sharepoint_oauth")
@@ -211,28 +251,192 @@ class SharePointClient():
             )
         )
 
-    def get_folders(self, path):
-        url = self.get_folder_url() + "/Folders/{}".format(
-            self.get_path_as_query_string(path)
-        )
-        response = self.session.get(url)
-        self.assert_response_ok(response, calling_method="get_folders")
-        return response.json()
-
-    def get_files(self, path):
-        response = self.session.get(self.get_folder_url() + "/Files/{}".format(
-                self.get_path_as_query_string(path)
+    def get_folders(self, path, select=None):
+        folders = []
+        for page in self.iter_folders(path, select=select):
+            folders.extend(page)
+        return {SharePointConstants.RESULTS_CONTAINER_NOMETADATA: folders}
+
+    def get_files(self, path, select=None):
+        files = []
+        for page in self.iter_files(path, select=select):
+            files.extend(page)
+        return {SharePointConstants.RESULTS_CONTAINER_NOMETADATA: files}
+
+    def iter_folders(self, path, select=None):
+        for page in self.iter_listing_pages(path, SharePointConstants.FOLDERS, select):
+            self.add_known_folders([
+                os.path.join(get_lnt_path(path), get_name(folder)) for folder in page if get_name(folder)
+            ])
+            yield page
+
+    def iter_files(self, path, select=None):
+        for page in self.iter_listing_pages(path, SharePointConstants.FILES, select):
+            yield page
+
+    def iter_listing_pages(self, path, collection, select=None):
+        """
+        Yields the Folders or Files of path page by page, following the server's next links.
+         The listing is only cached once all its pages have been read.
+        """
+        cache_key = (collection, get_lnt_path(path), get_projection_key(select))
+        is_cached, items = self.listing_cache.get(cache_key)
+        if is_cached:
+            yield items
+            return
+        url = self.get_folder_url() + "/{}/{}".format(collection, self.get_path_as_query_string(path))
+        kwargs = get_projection_kwargs(select)
+        is_cache_enabled = self.listing_cache.is_enabled()
+        items = []
+        number_of_pages = 0
+        while url:
+            response = self.session.get(url, **kwargs)
+            self.assert_response_ok(response, calling_method="iter_listing_pages")
+            json_response = response.json()
+            page = get_sharepoint_items(json_response)
+            number_of_pages += 1
+            if is_cache_enabled:
+                items.extend(page)
+            yield page
+            url = get_next_page_url(json_response)
+            # The next link already holds the query parameters
+            kwargs.pop("params", None)
+        if number_of_pages > 1:
+            logger.info("iter_listing_pages:{} pages of {} in {}".format(number_of_pages, collection, path))
+        if is_cache_enabled:
+            self.listing_cache.set(cache_key, items)
+
+    def invalidate_listings(self, full_path):
+        """ Drop the cached listings of full_path, of its sub-folders and of its parent folder """
+        changed_path = get_lnt_path(full_path)
+        parent_path = get_lnt_path(os.path.split(changed_path)[0])
+
+        def is_listing_affected(cache_key):
+            listing_path = cache_key[1]
+            return listing_path == parent_path or is_same_or_child_path(listing_path, changed_path)
+
+        self.listing_cache.invalidate(is_listing_affected)
+
+    def add_known_folders(self, full_paths):
+        with self.known_folders_lock:
+            for full_path in full_paths:
+                self.known_folders.add(get_lnt_path(full_path))
+
+    def is_known_folder(self, full_path):
+        with self.known_folders_lock:
+            return get_lnt_path(full_path) in self.known_folders
+
+    def forget_known_folders(self, full_path):
+        """ Forget full_path and all the folders below it """
+        with self.known_folders_lock:
+            self.known_folders = set(
+                known_folder for known_folder in self.known_folders if not is_same_or_child_path(known_folder, full_path)
             )
+
+    def get_listing_cache_statistics(self):
+        return self.listing_cache.get_statistics()
+
+    def resolve_path(self, full_path):
+        """
+        Tells with a single request whether full_path exists, whether it is a file or a folder, its size and last modification.
+         Returns None if the path does not exist.
+        """
+        cache_key = (SharePointConstants.RESOLUTION, get_lnt_path(full_path))
+        is_cached, item = self.listing_cache.get(cache_key)
+        if is_cached:
+            return item
+        if self.is_library_root(full_path):
+            # Library roots and the site itself are folders without list item
+            item = self.resolve_folder(full_path)
+        else:
+            response = self.session.get(self.get_resolution_url(full_path))
+            if response.status_code == 404:
+                item = None
+            else:
+                self.assert_response_ok(response, calling_method="resolve_path")
+                item = get_item_resolution(response.json().get(SharePointConstants.RESULTS_CONTAINER_V2))
+        self.listing_cache.set(cache_key, item)
+        if item is not None and item.get(DSSConstants.IS_DIRECTORY):
+            self.add_known_folders([full_path])
+        return item
+
+    def resolve_paths(self, full_paths):
+        """
+        resolve_path for many paths, looked up by $batch requests of up to BATCH_MAX_REQUESTS paths.
+         Returns a dict of the resolution of each path, None for paths that do not exist.
+        """
+        items = {}
+        paths_to_resolve = []
+        for full_path in full_paths:
+            full_path = get_lnt_path(full_path)
+            is_cached, item = self.listing_cache.get((SharePointConstants.RESOLUTION, full_path))
+            if is_cached:
+                items[full_path] = item
+            elif self.is_library_root(full_path):
+                items[full_path] = self.resolve_path(full_path)
+            elif full_path not in paths_to_resolve:
+                paths_to_resolve.append(full_path)
+        for offset in range(0, len(paths_to_resolve), SharePointConstants.BATCH_MAX_REQUESTS):
+            batch_paths = paths_to_resolve[offset:offset + SharePointConstants.BATCH_MAX_REQUESTS]
+            kwargs_array = [
+                {
+                    "verb": "get",
+                    "url": self.get_resolution_url(full_path),
+                    "headers": {"Accept": DSSConstants.APPLICATION_JSON}
+                } for full_path in batch_paths
+            ]
+            response = self.process_batch(kwargs_array)
+            parts = parse_batch_response(response.content) if response.status_code < 400 else []
+            if len(parts) != len(batch_paths):
+                logger.warning("resolve_paths:unexpected batch response, resolving {} paths one by one".format(len(batch_paths)))
+                parts = [(None, None)] * len(batch_paths)
+            for full_path, (status_code, json_response) in zip(batch_paths, parts):
+                if status_code == 404:
+                    item = None
+                    self.listing_cache.set((SharePointConstants.RESOLUTION, full_path), item)
+                    items[full_path] = item
+                    continue
+                if status_code is None or status_code >= 400:
+                    # Failed lookups get the single path treatment, which raises on errors
+                    items[full_path] = self.resolve_path(full_path)
+                    continue
+                item = get_item_resolution((json_response or {}).get(SharePointConstants.RESULTS_CONTAINER_V2))
+                self.listing_cache.set((SharePointConstants.RESOLUTION, full_path), item)
+                if item is not None and item.get(DSSConstants.IS_DIRECTORY):
+                    self.add_known_folders([full_path])
+                items[full_path] = item
+        logger.info("resolve_paths:{} paths resolved, {} by batch".format(len(items), len(paths_to_resolve)))
+        return items
+
+    def is_library_root(self, full_path):
+        return len([element for element in merge_paths(self.sharepoint_root, get_lnt_path(full_path)).split("/") if element]) <= 1
+
+    def get_resolution_url(self, full_path):
+        # The list item of a path, whether it is a file or a folder
+        return self.get_base_url() + "/GetListItemUsingPath(DecodedUrl=@a1){}&$select={}&$expand={}".format(
+            self.get_path_as_query_string(full_path),
+            SharePointConstants.RESOLUTION_SELECT,
+            SharePointConstants.RESOLUTION_EXPAND
         )
-        self.assert_response_ok(response, calling_method="get_files")
-        return response.json()
 
-    def get_item_fields(self, path):
-        response = self.session.get(self.get_folder_url() + "/ListItemAllFields{}".format(
-            self.get_path_as_query_string(path)
-        ))
-        self.assert_response_ok(response, calling_method="get_item_fields")
-        return response.json()
+    def resolve_folder(self, full_path):
+        response = self.session.get(
+            self.get_folder_url() + self.get_path_as_query_string(full_path),
+            params={
+                "$select": SharePointConstants.FOLDER_RESOLUTION_SELECT
+            }
+        )
+        if response.status_code == 404:
+            return None
+        self.assert_response_ok(response, calling_method="resolve_folder")
+        folder = response.json().get(SharePointConstants.RESULTS_CONTAINER_V2, {})
+        if not folder.get(SharePointConstants.EXISTS):
+            return None
+        return {
+            DSSConstants.IS_DIRECTORY: True,
+            DSSConstants.SIZE: 0,
+            DSSConstants.LAST_MODIFIED: get_last_modified(folder)
+        }
 
     def get_start_upload_url(self, path, upload_id):
         return self.get_file_url() + "/startupload(uploadId=guid'{}'){}".format(
@@ -254,31 +458,281 @@ class SharePointClient():
             self.get_path_as_query_string(path)
         )
 
-    def is_file(self, path):
-        item_fields = self.get_item_fields(path)
-        file_system_object_type = item_fields.get(SharePointConstants.RESULTS_CONTAINER_V2, {}).get(SharePointConstants.FILE_SYSTEM_OBJECT_TYPE)
-        return (file_system_object_type == SharePointConstants.FILE)
-
-    def get_file_content(self, full_path):
+    def download_file_content(self, full_path, stream, limit=-1, offset=0):
+        """
+        Stream the content of the file into the output stream, chunk by chunk, without loading it in memory.
+         When offset or limit are set, only the [offset, offset + limit[ byte range is requested from SharePoint.
+        """
+        headers = {}
+        if is_limited(limit) or offset > 0:
+            headers["Range"] = get_range_header(offset, limit)
         response = self.session.get(
-            self.get_file_content_url(full_path)
+            self.get_file_content_url(full_path),
+            headers=headers,
+            stream=True
         )
-        self.assert_response_ok(response, no_json=True, calling_method="get_file_content")
-        return response
+        if response.status_code == 416:
+            # Range not satisfiable, the offset is past the end of the file
+            response.close()
+            return 0
+        self.assert_response_ok(response, no_json=True, calling_method="download_file_content")
+        bytes_to_skip = 0
+        if headers and response.status_code != 206:
+            logger.info("download_file_content:range request not honored, skipping the first {} bytes".format(offset))
+            bytes_to_skip = offset
+        bytes_written = 0
+        with closing(response):
+            for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                if bytes_to_skip > 0:
+                    skipped_bytes = min(bytes_to_skip, len(chunk))
+                    chunk = chunk[skipped_bytes:]
+                    bytes_to_skip -= skipped_bytes
+                if not chunk:
+                    continue
+                if is_limited(limit) and bytes_written + len(chunk) >= limit:
+                    stream.write(chunk[:limit - bytes_written])
+                    bytes_written = limit
+                    break
+                stream.write(chunk)
+                bytes_written += len(chunk)
+        logger.info("download_file_content:{} bytes written".format(bytes_written))
+        return bytes_written
+
+    def download_cached_file_content(self, full_path, stream, content_cache):
+        """
+        Serve the file from content_cache if SharePoint answers 304 to a request conditioned on the cached ETag,
+         otherwise stream it from SharePoint and store it in the cache along the way.
+        """
+        cache_key = get_state_key(self.sharepoint_origin, self.get_server_relative_path(get_lnt_path(full_path)))
+        cached_etag = content_cache.get_etag(cache_key)
+        headers = {}
+        if cached_etag:
+            headers["If-None-Match"] = cached_etag
+        response = self.session.get(
+            self.get_file_content_url(full_path),
+            headers=headers,
+            stream=True
+        )
+        if response.status_code == 304:
+            response.close()
+            if content_cache.copy_to(cache_key, cached_etag, stream):
+                logger.info("download_cached_file_content:{} served from cache".format(full_path))
+                return
+            response = self.session.get(self.get_file_content_url(full_path), stream=True)
+        self.assert_response_ok(response, no_json=True, calling_method="download_cached_file_content")
+        etag = response.headers.get("ETag")
+        with closing(response):
+            if not etag:
+                for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                    stream.write(chunk)
+                return
+            with content_cache.writer(cache_key, etag) as cache_file:
+                tee_writer = TeeWriter(stream, cache_file)
+                for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                    tee_writer.write(chunk)
+        logger.info("download_cached_file_content:{} downloaded and cached".format(full_path))
+
+    def upload_files(self, full_paths_and_streams, max_workers=SharePointConstants.BULK_TRANSFER_MAX_WORKERS, upload_registry=None):
+        """
+        Upload (full_path, stream) pairs over a pool of max_workers threads sharing this client.
+         Returns the upload responses in the same order, None for the files skipped as unchanged.
+        """
+        full_paths_and_streams = list(full_paths_and_streams)
+        # Whether each file already exists and needs a check out is looked up in a few batches instead of one by one,
+        #  for the files of the libraries forcing check out
+        full_paths = [full_path for full_path, stream in full_paths_and_streams if self.is_check_out_forced(full_path)]
+        if full_paths:
+            self.resolve_paths(full_paths)
+
+        def upload_file(full_path, stream):
+            self.create_path(full_path)
+            response = self.upload_file_content(full_path, stream, upload_registry=upload_registry)
+            if response is not None:
+                self.queue_check_in(full_path)
+            return response
+        try:
+            return self.run_bulk_transfer(upload_file, full_paths_and_streams, max_workers)
+        finally:
+            # Files uploaded to a library forcing check out are only visible to others once checked in
+            self.flush_check_ins()
+
+    def download_files(self, full_paths_and_streams, max_workers=SharePointConstants.BULK_TRANSFER_MAX_WORKERS):
+        """ Download (full_path, stream) pairs over a pool of max_workers threads, returns the number of bytes of each file """
+        return self.run_bulk_transfer(self.download_file_content, full_paths_and_streams, max_workers)
+
+    @staticmethod
+    def run_bulk_transfer(transfer_file, full_paths_and_streams, max_workers):
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [
+                executor.submit(transfer_file, full_path, stream) for full_path, stream in full_paths_and_streams
+            ]
+            results = [future.result() for future in futures]
+        logger.info("run_bulk_transfer:{} files transferred".format(len(results)))
+        return results
 
-    def write_file_content(self, full_path, data):
-        self.file_size = len(data)
+    def is_parallel_download_enabled(self):
+        return self.download_max_workers > 1
+
+    def download_file_content_in_parallel(self, full_path, stream, file_size):
+        """
+        Download the file as download_part_size byte ranges fetched concurrently, and write them in order into the stream.
+         At most download_max_workers + DOWNLOAD_REORDER_BUFFER_PARTS parts are held in memory at any time.
+         Falls back to a single stream if the file is small or if the server does not honor range requests.
+         file_size, which may come from a cache, only decides whether to try ranges, the parts follow the size returned with the first one.
+        """
+        part_size = self.download_part_size
+        if not self.is_parallel_download_enabled() or file_size <= part_size:
+            return self.download_file_content(full_path, stream)
+        first_part, file_size = self.get_file_part(full_path, 0, part_size)
+        if file_size is None:
+            logger.warning("download_file_content_in_parallel:range requests not honored, falling back to a single stream")
+            return self.download_file_content(full_path, stream)
+        stream.write(first_part)
+        bytes_written = len(first_part)
+        number_of_parts = (file_size + part_size - 1) // part_size
+        logger.info("download_file_content_in_parallel:{} bytes in {} parts of {} bytes".format(file_size, number_of_parts, part_size))
+        max_parts_in_flight = self.download_max_workers + SharePointConstants.DOWNLOAD_REORDER_BUFFER_PARTS
+        with ThreadPoolExecutor(max_workers=self.download_max_workers) as executor:
+            parts_in_flight = deque()
+            next_part = 1
+            while next_part < number_of_parts or parts_in_flight:
+                while next_part < number_of_parts and len(parts_in_flight) < max_parts_in_flight:
+                    offset = next_part * part_size
+                    parts_in_flight.append(
+                        executor.submit(self.get_file_part, full_path, offset, min(part_size, file_size - offset))
+                    )
+                    next_part += 1
+                part, part_file_size = parts_in_flight.popleft().result()
+                if part_file_size is None:
+                    raise SharePointClientError("Range request not honored while downloading {}".format(full_path))
+                if part_file_size != file_size:
+                    raise SharePointClientError("{} changed from {} to {} bytes while being downloaded".format(full_path, file_size, part_file_size))
+                stream.write(part)
+                bytes_written += len(part)
+        logger.info("download_file_content_in_parallel:{} bytes written".format(bytes_written))
+        return bytes_written
+
+    def get_file_part(self, full_path, offset, length):
+        """
+        Returns the [offset, offset + length[ bytes of the file, cut at its end, and the complete size of the file.
+         The size is None if the server did not honor the range request.
+        """
+        response = self.session.get(
+            self.get_file_content_url(full_path),
+            headers={"Range": get_range_header(offset, length)},
+            stream=True
+        )
+        with closing(response):
+            self.assert_response_ok(response, no_json=True, calling_method="get_file_part")
+            file_size = get_content_range_size(response.headers.get("Content-Range"))
+            if response.status_code != 206 or file_size is None:
+                return None, None
+            part = response.content
+        expected_length = max(0, min(length, file_size - offset))
+        if len(part) != expected_length:
+            raise SharePointClientError("Expected {} bytes from offset {} of {}, got {}".format(expected_length, offset, full_path, len(part)))
+        return part, file_size
+
+    def get_file_content_range(self, full_path, offset, length):
+        """ Bytes [offset, offset + length[ of the file """
+        buffer = BytesIO()
+        self.download_file_content(full_path, buffer, limit=length, offset=offset)
+        return buffer.getvalue()
+
+    def upload_file_content(self, full_path, stream, upload_registry=None):
+        """
+        Read the incoming stream by blocks into a spool file, which stays in memory for small files
+         and spills to disk past upload_spool_max_memory_size, then upload it from there.
+         With an upload_registry, the upload is skipped and None is returned if the remote file already has this content.
+        """
+        with SpooledTemporaryFile(max_size=self.upload_spool_max_memory_size) as spool:
+            content_hash = copy_and_hash(stream, spool, SharePointConstants.FILE_UPLOAD_COPY_BUFFER_SIZE)
+            file_size = spool.tell()
+            spool.seek(0)
+            logger.info("upload_file_content:{} bytes spooled".format(file_size))
+            registry_key = None
+            if upload_registry:
+                registry_key = get_state_key(self.sharepoint_origin, self.get_server_relative_path(get_lnt_path(full_path)))
+                if self.is_remote_content_unchanged(full_path, upload_registry.get(registry_key), file_size, content_hash):
+                    logger.info("upload_file_content:{} is unchanged, skipping upload".format(full_path))
+                    return None
+                upload_registry.remove(registry_key)
+            try:
+                response = self.write_file_content(full_path, spool, file_size)
+            finally:
+                self.invalidate_listings(full_path)
+            if upload_registry:
+                upload_record = (upload_registry, registry_key, full_path, file_size, content_hash)
+                if self.is_check_out_forced(full_path):
+                    # The check in changes the ETag, so it is recorded once the file is checked in
+                    with self.pending_check_ins_lock:
+                        self.pending_upload_records.append(upload_record)
+                else:
+                    # files/add and FinishUpload answer with the uploaded file, ETag included
+                    self.record_upload(*upload_record, etag=get_response_etag(response))
+            return response
+
+    def record_upload(self, upload_registry, registry_key, full_path, file_size, content_hash, etag=None):
+        if etag is None:
+            file_properties = self.get_file_properties(full_path)
+            etag = file_properties.get(SharePointConstants.ETAG) if file_properties else None
+        if etag:
+            upload_registry.set(registry_key, file_size, content_hash, etag)
+
+    def is_remote_content_unchanged(self, full_path, registry_entry, file_size, content_hash):
+        if not registry_entry or registry_entry.get("size") != file_size or registry_entry.get("hash") != content_hash:
+            return False
+        file_properties = self.get_file_properties(full_path)
+        if not file_properties:
+            return False
+        return "{}".format(file_properties.get(SharePointConstants.LENGTH)) == "{}".format(file_size) \
+            and file_properties.get(SharePointConstants.ETAG) == registry_entry.get("etag")
+
+    def get_files_etags(self, full_paths):
+        """ ETag of each file, looked up by $batch requests of up to BATCH_MAX_REQUESTS files. Failed lookups are left out. """
+        etags = {}
+        for offset in range(0, len(full_paths), SharePointConstants.BATCH_MAX_REQUESTS):
+            batch_paths = full_paths[offset:offset + SharePointConstants.BATCH_MAX_REQUESTS]
+            kwargs_array = [
+                {
+                    "verb": "get",
+                    "url": self.get_file_url(get_lnt_path(full_path)) + "?$select={}".format(SharePointConstants.ETAG),
+                    "headers": {"Accept": DSSConstants.APPLICATION_JSON_NOMETADATA}
+                } for full_path in batch_paths
+            ]
+            response = self.process_batch(kwargs_array)
+            parts = parse_batch_response(response.content) if response.status_code < 400 else []
+            if len(parts) != len(batch_paths):
+                logger.warning("get_files_etags:unexpected batch response for {} files".format(len(batch_paths)))
+                continue
+            for full_path, (status_code, json_response) in zip(batch_paths, parts):
+                if status_code < 400 and json_response:
+                    etags[full_path] = json_response.get(SharePointConstants.ETAG)
+        return etags
+
+    def get_file_properties(self, full_path):
+        """ ETag and Length of the file, None if it does not exist """
+        response = self.session.get(
+            self.get_file_url(get_lnt_path(full_path)),
+            **get_projection_kwargs([SharePointConstants.ETAG, SharePointConstants.LENGTH])
+        )
+        if response.status_code == 404:
+            return None
+        self.assert_response_ok(response, calling_method="get_file_properties")
+        return response.json()
 
-        # Preventive file check out, in case it already exists on SP's side
-        self.check_out_file(full_path)
+    def write_file_content(self, full_path, file_handle, file_size):
+        if self.is_check_out_required(full_path):
+            # The file already exists in a library forcing check out, so it has to be checked out before being overwritten
+            self.check_out_file(full_path)
 
-        if self.file_size < SharePointConstants.MAX_FILE_SIZE_CONTINUOUS_UPLOAD:
+        if file_size < SharePointConstants.MAX_FILE_SIZE_CONTINUOUS_UPLOAD:
             # below 262MB, the file can be uploaded in one go
-            self.write_full_file_content(full_path, data)
+            return self.write_full_file_content(full_path, FileSliceReader(file_handle, 0, file_size))
         else:
             # Start by creating an empty file. Thanks, MS doc, not.
             self.write_full_file_content(full_path, [])
-            self.write_chunked_file_content(full_path, data)
+            return self.write_chunked_file_content(full_path, file_handle, file_size)
 
     def write_full_file_content(self, full_path, data):
         full_path_parent, file_name = os.path.split(full_path)
@@ -296,17 +750,17 @@ class SharePointClient():
         self.assert_response_ok(response, calling_method="write_file_content")
         return response
 
-    def write_chunked_file_content(self, full_path, data):
+    def write_chunked_file_content(self, full_path, file_handle, file_size):
         is_initial_chunk = True
         is_last_chunk = False
         chunk_size = SharePointConstants.FILE_UPLOAD_CHUNK_SIZE
         save_upload_offset = 0
         upload_id = self.get_random_guid()
-        while save_upload_offset < self.file_size:
+        while save_upload_offset < file_size:
             next_save_upload_offset = save_upload_offset + chunk_size
-            if next_save_upload_offset >= self.file_size:
+            if next_save_upload_offset >= file_size:
                 is_last_chunk = True
-                next_save_upload_offset = self.file_size
+                next_save_upload_offset = file_size
             if is_initial_chunk:
                 is_initial_chunk = False
                 logger.info("write_chunked_file_content:start_upload")
@@ -320,7 +774,7 @@ class SharePointClient():
             logger.info("write_chunked_file_content from {} to {}".format(save_upload_offset, next_save_upload_offset))
             response = self.session.post(
                 url,
-                data=data[save_upload_offset:next_save_upload_offset]
+                data=FileSliceReader(file_handle, save_upload_offset, next_save_upload_offset - save_upload_offset)
             )
             save_upload_offset = next_save_upload_offset
             self.assert_response_ok(response, calling_method="write_chunked_file_content")
@@ -332,6 +786,7 @@ class SharePointClient():
         response = self.session.post(
             self.get_add_folder_url(full_path)
         )
+        self.invalidate_listings(full_path)
         return response
 
     def create_path(self, file_full_path):
@@ -348,25 +803,125 @@ class SharePointClient():
         for token in tokens:
             previous_path = path
             path = get_lnt_path(path + "/" + token)
+            if self.is_known_folder(path):
+                # Already created or listed by this client, no need to post it again
+                continue
             response = self.create_folder(path)
+            if response is None:
+                continue
             status_code = response.status_code
+            if status_code < 400:
+                self.add_known_folders([path])
             if previous_status == 403 and status_code == 404:
                 logger.error("Could not create folder for '{}'. Check your write permission for the folder {}.".format(path, previous_path))
+            previous_status = status_code
 
-    def move_file(self, full_from_path, full_to_path):        
+    def move_file(self, full_from_path, full_to_path):
         get_move_url = self.get_move_url(
             full_from_path,
             full_to_path
         )
         response = self.session.post(get_move_url)
+        self.invalidate_listings(full_from_path)
+        self.invalidate_listings(full_to_path)
+        self.forget_known_folders(full_from_path)
         self.assert_response_ok(response, calling_method="move_file")
         return response.json()
 
-    def check_in_file(self, full_path):
-        logger.info("Checking in {}.".format(full_path))
-        file_check_in_url = self.get_file_check_in_url(full_path)
-        self.session.post(file_check_in_url)
-        return
+    def queue_check_in(self, full_path):
+        """
+        Files uploaded to a library forcing check out have to be checked in to be visible by others.
+         These check ins are bundled in $batch requests of CHECK_IN_BATCH_SIZE, the remaining ones are sent by flush_check_ins,
+         which every write operation calls before returning.
+        """
+        if not self.is_check_out_forced(full_path):
+            return
+        with self.pending_check_ins_lock:
+            self.pending_check_ins.append(full_path)
+            is_batch_full = len(self.pending_check_ins) >= SharePointConstants.CHECK_IN_BATCH_SIZE
+        if is_batch_full:
+            self.flush_check_ins()
+
+    def flush_check_ins(self):
+        with self.pending_check_ins_lock:
+            full_paths = self.pending_check_ins
+            self.pending_check_ins = []
+            upload_records = self.pending_upload_records
+            self.pending_upload_records = []
+        failed_full_paths = []
+        if full_paths:
+            logger.info("Checking in {} files.".format(len(full_paths)))
+            kwargs_array = [
+                {
+                    "verb": "post",
+                    "url": self.get_file_check_in_url(full_path)
+                } for full_path in full_paths
+            ]
+            response = self.process_batch(kwargs_array)
+            failed_full_paths = self.get_failed_check_ins(response, full_paths)
+        checked_in_records = [upload_record for upload_record in upload_records if upload_record[2] not in failed_full_paths]
+        if checked_in_records:
+            etags = self.get_files_etags([upload_record[2] for upload_record in checked_in_records])
+            for upload_record in checked_in_records:
+                upload_registry, registry_key, full_path, file_size, content_hash = upload_record
+                if etags.get(full_path):
+                    upload_registry.set(registry_key, file_size, content_hash, etags.get(full_path))
+        if failed_full_paths:
+            raise SharePointClientError("{} of {} files could not be checked in, they stay checked out: {}".format(
+                len(failed_full_paths), len(full_paths), ", ".join(failed_full_paths)
+            ))
+
+    @staticmethod
+    def get_failed_check_ins(response, full_paths):
+        results = parse_batch_response(response.content)
+        if response.status_code >= 400 or len(results) != len(full_paths):
+            # A failing request makes the whole changeset fail with a single answer
+            logger.warning("Check in batch failed with status {}, {} answers for {} files".format(
+                response.status_code, len(results), len(full_paths)
+            ))
+            return list(full_paths)
+        failed_full_paths = []
+        for full_path, (status, json_response) in zip(full_paths, results):
+            if status >= 400:
+                error_message = get_batch_error_message(json_response)
+                logger.warning("Check in of {} failed with status {}: {}".format(full_path, status, error_message))
+                failed_full_paths.append(full_path)
+        return failed_full_paths
+
+    def is_check_out_required(self, full_path):
+        if not self.is_check_out_forced(full_path):
+            return False
+        return self.resolve_path(get_lnt_path(full_path)) is not None
+
+    def is_check_out_forced(self, full_path):
+        try:
+            library_path = self.get_library_server_relative_path(full_path)
+        except SharePointClientError:
+            return True
+        # The upload threads share the settings of each library, which are only requested once
+        with self.libraries_force_checkout_lock:
+            if library_path not in self.libraries_force_checkout:
+                self.libraries_force_checkout[library_path] = self.get_library_force_checkout(library_path)
+            return self.libraries_force_checkout[library_path]
+
+    def get_library_force_checkout(self, library_path):
+        response = self.session.get(
+            self.get_base_url() + "/GetList(@a1)?@a1='{}'".format(url_encode(self.escape_path(library_path))),
+            params={
+                "$select": SharePointConstants.FORCE_CHECKOUT
+            }
+        )
+        if response.status_code >= 400:
+            # Without this information, we keep on checking files out and in as a precaution
+            logger.warning("Could not retrieve the check out settings of {} ({})".format(library_path, response.status_code))
+            return True
+        force_checkout = get_value_from_path(
+            response.json(),
+            [SharePointConstants.RESULTS_CONTAINER_V2, SharePointConstants.FORCE_CHECKOUT],
+            default_reply=True
+        )
+        logger.info("Library {} force checkout: {}".format(library_path, force_checkout))
+        return force_checkout
 
     def check_out_file(self, full_path):
         logger.info("Checking out {}.".format(full_path))
@@ -377,11 +932,14 @@ class SharePointClient():
     def recycle_file(self, full_path):
         recycle_file_url = self.get_recycle_file_url(full_path)
         response = self.session.post(recycle_file_url)
+        self.invalidate_listings(full_path)
         self.assert_response_ok(response, calling_method="recycle_file")
 
     def recycle_folder(self, full_path):
         recycle_folder_url = self.get_recycle_folder_url(full_path)
         response = self.session.post(recycle_folder_url)
+        self.invalidate_listings(full_path)
+        self.forget_known_folders(full_path)
         self.assert_response_ok(response, calling_method="recycle_folder")
 
     def get_list_fields(self, list_title):
@@ -403,7 +961,7 @@ class SharePointClient():
     def extract_results(response):
         return response[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]
 
-    def get_list_items(self, list_title, params=None):
+    def get_list_items(self, list_title, params=None, view_xml=None):
         params = params or {}
         data = {
             "parameters": {
@@ -415,6 +973,8 @@ class SharePointClient():
                 "AddRequiredFields": True
             }
         }
+        if view_xml:
+            data["parameters"]["ViewXml"] = view_xml
         headers = DSSConstants.JSON_HEADERS
         response = self.session.post(
             self.get_list_data_as_stream(list_title),
@@ -422,9 +982,187 @@ class SharePointClient():
             headers=headers,
             json=data
         )
+        self.assert_no_list_view_threshold_error(response, calling_method="get_list_items")
         self.assert_response_ok(response, calling_method="get_list_items")
         return response.json().get("ListData", {})
 
+    def get_list_id_range(self, list_title):
+        """ Lowest and highest item IDs of the list, (None, None) if it is empty """
+        item_ids = []
+        for order in ["asc", "desc"]:
+            response = self.session.get(
+                self.get_list_items_url(list_title),
+                params={
+                    "$select": SharePointConstants.ID,
+                    "$orderby": "{} {}".format(SharePointConstants.ID, order),
+                    "$top": 1
+                }
+            )
+            self.assert_response_ok(response, calling_method="get_list_id_range")
+            items = get_value_from_path(response.json(), [SharePointConstants.RESULTS_CONTAINER_V2, "results"]) or []
+            if not items:
+                return None, None
+            item_ids.append(items[0].get(SharePointConstants.ID))
+        return item_ids[0], item_ids[1]
+
+    def get_list_item_ids(self, list_title):
+        """ IDs of all the items of the list, read in pages of indexed ID order so that it stays under the list view threshold """
+        item_ids = set()
+        url = self.get_list_items_url(list_title)
+        params = {
+            "$select": SharePointConstants.ID,
+            "$orderby": "{} asc".format(SharePointConstants.ID),
+            "$top": SharePointConstants.LIST_DATA_PAGE_SIZE
+        }
+        while url:
+            response = self.session.get(url, params=params)
+            self.assert_response_ok(response, calling_method="get_list_item_ids")
+            json_response = response.json()
+            for item in get_sharepoint_items(json_response):
+                item_ids.add("{}".format(item.get(SharePointConstants.ID)))
+            url = get_next_page_url(json_response)
+            # The next link already holds the query parameters
+            params = None
+        return item_ids
+
+    def get_library_items(self, full_path, view_xml, params=None):
+        """
+        Query the document library hosting full_path with RenderListDataAsStream,
+         starting from the full_path folder instead of the library root.
+        """
+        params = params or {}
+        data = {
+            "parameters": {
+                "__metadata": {
+                    "type": "SP.RenderListDataParameters"
+                },
+                "RenderOptions": SharePointConstants.RENDER_OPTIONS_LIST_DATA,
+                "ViewXml": view_xml,
+                "FolderServerRelativeUrl": self.get_server_relative_path(full_path),
+                "DatesInUtc": True
+            }
+        }
+        headers = DSSConstants.JSON_HEADERS
+        response = self.session.post(
+            self.get_library_data_as_stream_url(full_path),
+            params=params,
+            headers=headers,
+            json=data
+        )
+        self.assert_no_list_view_threshold_error(response, calling_method="get_library_items")
+        self.assert_response_ok(response, calling_method="get_library_items")
+        return response.json().get("ListData", {})
+
+    def search_files(self, full_path, query_text="", start_row=0, row_limit=SharePointConstants.SEARCH_PAGE_SIZE):
+        """ One page of the search index's documents below full_path, which can be narrowed down with a KQL query_text """
+        query_text = 'path:"{}" IsDocument:true {}'.format(self.get_absolute_url(full_path), query_text).strip()
+        response = self.session.get(
+            "{}/{}/_api/search/query".format(self.sharepoint_origin, self.sharepoint_site),
+            params={
+                "querytext": "'{}'".format(query_text.replace("'", "''")),
+                "selectproperties": "'{}'".format(",".join(SharePointConstants.SEARCH_SELECT_PROPERTIES)),
+                "startrow": start_row,
+                "rowlimit": row_limit,
+                "trimduplicates": "false"
+            }
+        )
+        self.assert_response_ok(response, calling_method="search_files")
+        return response.json()
+
+    def get_absolute_url(self, full_path):
+        return self.sharepoint_origin + self.get_server_relative_path(full_path).rstrip("/")
+
+    def get_library_change_token(self, full_path):
+        response = self.session.get(
+            self.get_library_url(full_path),
+            params={
+                "$select": SharePointConstants.CURRENT_CHANGE_TOKEN
+            }
+        )
+        self.assert_response_ok(response, calling_method="get_library_change_token")
+        return get_value_from_path(
+            response.json(),
+            [SharePointConstants.RESULTS_CONTAINER_V2, SharePointConstants.CURRENT_CHANGE_TOKEN, SharePointConstants.STRING_VALUE]
+        )
+
+    def get_library_changes(self, full_path, change_token):
+        """ Item changes of the library hosting full_path since change_token, limited to one page of the change log """
+        data = {
+            "query": {
+                "__metadata": {
+                    "type": "SP.ChangeQuery"
+                },
+                "Add": True,
+                "Update": True,
+                "DeleteObject": True,
+                "Rename": True,
+                "Move": True,
+                "Restore": True,
+                "Item": True,
+                "ChangeTokenStart": {
+                    "__metadata": {
+                        "type": "SP.ChangeToken"
+                    },
+                    "StringValue": change_token
+                }
+            }
+        }
+        headers = DSSConstants.JSON_HEADERS
+        response = self.session.post(
+            self.get_library_url(full_path, "/GetChanges"),
+            headers=headers,
+            json=data
+        )
+        self.assert_response_ok(response, calling_method="get_library_changes")
+        json_response = response.json()
+        if self.is_response_empty(json_response):
+            return []
+        return self.extract_results(json_response)
+
+    def get_library_item(self, full_path, item_id):
+        """ Path, type, size and last modification of an item of the library hosting full_path, None if it does not exist """
+        response = self.session.get(
+            self.get_library_url(full_path, "/Items({})".format(item_id)),
+            params={
+                "$select": SharePointConstants.LIBRARY_ITEM_SELECT,
+                "$expand": SharePointConstants.FILE_PROPERTY
+            }
+        )
+        if response.status_code == 404:
+            return None
+        self.assert_response_ok(response, calling_method="get_library_item")
+        return response.json().get(SharePointConstants.RESULTS_CONTAINER_V2)
+
+    def get_library_items_by_ids(self, full_path, item_ids):
+        """ get_library_item for many items, looked up by $batch requests of up to BATCH_MAX_REQUESTS items """
+        items = {}
+        item_ids = list(item_ids)
+        for offset in range(0, len(item_ids), SharePointConstants.BATCH_MAX_REQUESTS):
+            batch_item_ids = item_ids[offset:offset + SharePointConstants.BATCH_MAX_REQUESTS]
+            kwargs_array = [
+                {
+                    "verb": "get",
+                    "url": self.get_library_url(full_path, "/Items({})".format(item_id)) + "&$select={}&$expand={}".format(
+                        SharePointConstants.LIBRARY_ITEM_SELECT,
+                        SharePointConstants.FILE_PROPERTY
+                    ),
+                    "headers": {"Accept": DSSConstants.APPLICATION_JSON}
+                } for item_id in batch_item_ids
+            ]
+            response = self.process_batch(kwargs_array)
+            self.assert_response_ok(response, no_json=True, calling_method="get_library_items_by_ids")
+            parts = parse_batch_response(response.content)
+            if len(parts) != len(batch_item_ids):
+                raise SharePointClientError("Expected {} answers in batch response, got {}".format(len(batch_item_ids), len(parts)))
+            for item_id, (status_code, json_response) in zip(batch_item_ids, parts):
+                if status_code == 404:
+                    items[item_id] = None
+                elif status_code >= 400:
+                    raise SharePointClientError("Error {} while retrieving item {}".format(status_code, item_id))
+                else:
+                    items[item_id] = (json_response or {}).get(SharePointConstants.RESULTS_CONTAINER_V2)
+        return items
+
     def create_list(self, list_name):
         headers = DSSConstants.JSON_HEADERS
         data = {
@@ -528,6 +1266,19 @@ class SharePointClient():
         json_response = response.json()
         return json_response.get(SharePointConstants.RESULTS_CONTAINER_V2, {"Items": {"results": []}}).get("Items", {"results": []}).get("results", [])
 
+    def get_list_default_view_query(self, list_name):
+        """ CAML query (Where and OrderBy elements) of the default view of the list """
+        response = self.session.get(
+            self.get_list_default_view_query_url(list_name),
+            params={
+                "$select": SharePointConstants.VIEW_QUERY
+            }
+        )
+        if response.status_code == 404:
+            return ""
+        self.assert_response_ok(response, calling_method="get_list_default_view_query")
+        return get_value_from_path(response.json(), [SharePointConstants.RESULTS_CONTAINER_V2, SharePointConstants.VIEW_QUERY]) or ""
+
     def add_column_to_list_default_view(self, column_name, list_name):
         escaped_column_name = self.escape_path(column_name)
         list_default_view_url = os.path.join(
@@ -636,8 +1387,14 @@ class SharePointClient():
         }
 
     def process_batch(self, kwargs_array):
+        """
+        Send the requests described in kwargs_array in a single $batch request.
+         Requests changing data are grouped in a changeset, while GET-only batches are sent as plain parts,
+         whose answers can be read with parse_batch_response.
+        """
         batch_id = self.get_random_guid()
         change_set_id = self.get_random_guid()
+        is_read_only = all(kwargs["verb"].lower() == "get" for kwargs in kwargs_array)
 
         headers = {
             "Content-Type": "multipart/mixed;boundary=\"batch_{}\"".format(batch_id),
@@ -645,22 +1402,31 @@ class SharePointClient():
         }
         url = "{}/{}/_api/$batch".format(self.sharepoint_origin, self.sharepoint_site)
         body_elements = []
-        body_elements.append("--batch_{}".format(batch_id))
-        body_elements.append("Content-Type: multipart/mixed; boundary=changeset_{}".format(change_set_id))
-        body_elements.append("")
+        if is_read_only:
+            part_boundary = "--batch_{}".format(batch_id)
+        else:
+            part_boundary = "--changeset_{}".format(change_set_id)
+            body_elements.append("--batch_{}".format(batch_id))
+            body_elements.append("Content-Type: multipart/mixed; boundary=changeset_{}".format(change_set_id))
+            body_elements.append("")
 
         for kwargs in kwargs_array:
-            body_elements.append("--changeset_{}".format(change_set_id))
+            body_elements.append(part_boundary)
             body_elements.append("Content-Type: application/http")
             body_elements.append("Content-Transfer-Encoding: binary")
             body_elements.append("")
             body_elements.append("{} {} HTTP/1.1".format(kwargs["verb"].upper(), kwargs["url"]))
-            for header in kwargs["headers"]:
-                body_elements.append("{}: {}".format(header, kwargs["headers"][header]))
+            part_headers = kwargs.get("headers") or {}
+            for header in part_headers:
+                body_elements.append("{}: {}".format(header, part_headers[header]))
             body_elements.append("Accept-Charset: UTF-8")
             body_elements.append("")
-            body_elements.append(json.dumps(kwargs["json"]))
-        body_elements.append("--changeset_{}--".format(change_set_id))
+            if kwargs.get("json") is not None:
+                body_elements.append(json.dumps(kwargs["json"]))
+            elif not is_read_only:
+                body_elements.append("")
+        if not is_read_only:
+            body_elements.append("--changeset_{}--".format(change_set_id))
         body_elements.append('--batch_{}--'.format(batch_id))
         body = "\r\n".join(body_elements)
         successful_post = False
@@ -691,7 +1457,9 @@ class SharePointClient():
                     raise SharePointClientError("Error in batch processing on attempt #{}: {}".format(attempt_number, err))
                 time.sleep(SharePointConstants.WAIT_TIME_BEFORE_RETRY_SEC)
 
-        self.log_batch_errors(response, kwargs_array)
+        if not is_read_only:
+            # Errors of read only batches, such as 404 on lookups, are left to the caller
+            self.log_batch_errors(response, kwargs_array)
 
         return response
 
@@ -747,6 +1515,15 @@ class SharePointClient():
     def get_list_data_as_stream(self, list_title):
         return self.get_lists_by_title_url(list_title) + "/RenderListDataAsStream"
 
+    def get_library_url(self, full_path, endpoint=""):
+        return self.get_base_url() + "/GetList(@a1){}?@a1='{}'".format(
+            endpoint,
+            url_encode(self.escape_path(self.get_library_server_relative_path(full_path)))
+        )
+
+    def get_library_data_as_stream_url(self, full_path):
+        return self.get_library_url(full_path, "/RenderListDataAsStream")
+
     def get_list_items_url_by_id(self, list_id):
         return self.get_lists_by_id_url(list_id) + "/Items"
 
@@ -833,6 +1610,16 @@ class SharePointClient():
             self.escape_path(full_path)
         ).replace("//", "/")
 
+    def get_server_relative_path(self, full_path):
+        return "/" + merge_paths(self.sharepoint_site, merge_paths(self.sharepoint_root, full_path))
+
+    def get_library_server_relative_path(self, full_path):
+        # Document libraries are located right below the site, so the first element of the path is the library
+        library_name = merge_paths(self.sharepoint_root, full_path).split("/")[0]
+        if not library_name:
+            raise SharePointClientError("The path '{}' is not located inside a document library".format(full_path))
+        return "/" + merge_paths(self.sharepoint_site, library_name)
+
     def get_add_folder_url(self, full_path):
         return self.get_base_url() + "/Folders/AddUsingPath(decodedurl=@a1){}".format(
             self.get_path_as_query_string(full_path)
@@ -852,6 +1639,12 @@ class SharePointClient():
             SharePointConstants.DEFAULT_VIEW_ENDPOINT
         )
 
+    def get_list_default_view_query_url(self, list_title):
+        return os.path.join(
+            self.get_lists_by_title_url(list_title),
+            SharePointConstants.DEFAULT_VIEW_QUERY_ENDPOINT
+        )
+
     def get_path_as_query_string(self, path):
         if path:
             if path == '/':
@@ -890,6 +1683,14 @@ class SharePointClient():
         if not no_json:
             self.assert_no_error_in_json(response, calling_method=calling_method)
 
+    @staticmethod
+    def assert_no_list_view_threshold_error(response, calling_method=""):
+        # Filtering or sorting on a non indexed column is refused on lists above the list view threshold (5000 items)
+        if response.status_code >= 400 and b"SPQueryThrottledException" in (response.content or b""):
+            raise SharePointListViewThresholdError(
+                "The query exceeds the list view threshold, the filtered column has to be indexed ({})".format(calling_method)
+            )
+
     def assert_non_federated_namespace(self):
         # Called following 403 error
         if self.username_for_namespace_diag:
@@ -1052,10 +1853,12 @@ class SharePointClient():
         logger.info('get_read_schema')
         sharepoint_columns = self.get_list_fields(self.sharepoint_list_title)
         dss_columns = []
-        self.column_ids = {}
-        self.column_names = {}
-        self.column_entity_property_name = {}
-        self.columns_to_format = []
+        column_ids = {}
+        column_names = {}
+        column_entity_property_name = {}
+        columns_to_format = []
+        dss_column_name = {}
+        column_sharepoint_type = {}
         for column in sharepoint_columns:
             logger.info("get_read_schema:{}/{}/{}/{}/{}/{}".format(
                 column[SharePointConstants.TITLE_COLUMN],
@@ -1067,24 +1870,32 @@ class SharePointClient():
             ))
             if self.is_column_displayable(column, display_metadata, metadata_to_retrieve):
                 sharepoint_type = get_dss_type(column[SharePointConstants.TYPE_AS_STRING])
-                self.column_sharepoint_type[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.TYPE_AS_STRING]
+                column_sharepoint_type[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.TYPE_AS_STRING]
                 if sharepoint_type is not None:
                     dss_columns.append({
                         SharePointConstants.NAME_COLUMN: column[SharePointConstants.TITLE_COLUMN],
                         SharePointConstants.TYPE_COLUMN: sharepoint_type
                     })
-                    self.column_ids[column[SharePointConstants.STATIC_NAME]] = sharepoint_type
-                    self.column_names[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.TITLE_COLUMN]
-                    self.column_entity_property_name[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.ENTITY_PROPERTY_NAME]
-                    self.dss_column_name[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.TITLE_COLUMN]
-                    self.dss_column_name[column[SharePointConstants.ENTITY_PROPERTY_NAME]] = column[SharePointConstants.TITLE_COLUMN]
+                    column_ids[column[SharePointConstants.STATIC_NAME]] = sharepoint_type
+                    column_names[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.TITLE_COLUMN]
+                    column_entity_property_name[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.ENTITY_PROPERTY_NAME]
+                    dss_column_name[column[SharePointConstants.STATIC_NAME]] = column[SharePointConstants.TITLE_COLUMN]
+                    dss_column_name[column[SharePointConstants.ENTITY_PROPERTY_NAME]] = column[SharePointConstants.TITLE_COLUMN]
                 if sharepoint_type == "date":
-                    self.columns_to_format.append((column[SharePointConstants.STATIC_NAME], sharepoint_type))
+                    columns_to_format.append((column[SharePointConstants.STATIC_NAME], sharepoint_type))
                 if column[SharePointConstants.TYPE_AS_STRING] == SharePointConstants.TYPE_NOTE:
                     if write_mode == SharePointConstants.WRITE_MODE_CREATE:
-                        self.columns_to_format.append((column[SharePointConstants.COLUMN_TITLE], SharePointConstants.TYPE_NOTE))
+                        columns_to_format.append((column[SharePointConstants.COLUMN_TITLE], SharePointConstants.TYPE_NOTE))
                     else:
-                        self.columns_to_format.append((column[SharePointConstants.STATIC_NAME], SharePointConstants.TYPE_NOTE))
+                        columns_to_format.append((column[SharePointConstants.STATIC_NAME], SharePointConstants.TYPE_NOTE))
+        # The column mappings are swapped in at once, so that other threads never see them half built
+        with self.schema_lock:
+            self.column_ids = column_ids
+            self.column_names = column_names
+            self.column_entity_property_name = column_entity_property_name
+            self.columns_to_format = columns_to_format
+            self.dss_column_name = dict(self.dss_column_name, **dss_column_name)
+            self.column_sharepoint_type = dict(self.column_sharepoint_type, **column_sharepoint_type)
         logger.info("get_read_schema: Schema updated with {}".format(dss_columns))
         return {
             SharePointConstants.COLUMNS: dss_columns
@@ -1104,15 +1915,17 @@ class SharePointSession():
         self.sharepoint_access_token = sharepoint_access_token
         requests.adapters.DEFAULT_RETRIES = max_retry
         self.form_digest_value = get_form_digest_value(sharepoint_url, sharepoint_site, sharepoint_access_token=self.sharepoint_access_token)
+        self.throttling_gate = ThrottlingGate()
 
-    def get(self, url, headers=None, params=None):
+    def get(self, url, headers=None, params=None, stream=False):
         retries_limit = ItemsLimit(SharePointConstants.MAX_RETRIES)
         headers = headers or {}
-        headers["Accept"] = DSSConstants.APPLICATION_JSON
+        headers.setdefault("Accept", DSSConstants.APPLICATION_JSON)
         headers["Authorization"] = self.get_authorization_bearer()
         response = None
-        while not is_request_performed(response) and not retries_limit.is_reached():
-            response = requests.get(url, headers=headers, params=params, timeout=SharePointConstants.TIMEOUT_SEC)
+        while not is_request_performed(response, self.throttling_gate) and not retries_limit.is_reached():
+            self.throttling_gate.wait()
+            response = requests.get(url, headers=headers, params=params, stream=stream, timeout=SharePointConstants.TIMEOUT_SEC)
         return response
 
     def post(self, url, headers=None, json=None, data=None, params=None):
@@ -1127,7 +1940,9 @@ class SharePointSession():
             default_headers.update({"X-RequestDigest": self.form_digest_value})
         default_headers.update(headers)
         response = None
-        while not is_request_performed(response) and not retries_limit.is_reached():
+        while not is_request_performed(response, self.throttling_gate) and not retries_limit.is_reached():
+            rewind_request_body(data)
+            self.throttling_gate.wait()
             response = requests.post(url, headers=default_headers, json=json, data=data, params=params, timeout=SharePointConstants.TIMEOUT_SEC)
         return response
 
@@ -1143,7 +1958,9 @@ class SharePointSession():
             default_headers.update({"X-RequestDigest": self.form_digest_value})
         default_headers.update(headers)
         response = None
-        while not is_request_performed(response) and not retries_limit.is_reached():
+        while not is_request_performed(response, self.throttling_gate) and not retries_limit.is_reached():
+            rewind_request_body(data)
+            self.throttling_gate.wait()
             response = requests.request(method, url, headers=default_headers, json=json, data=data, params=params, timeout=SharePointConstants.TIMEOUT_SEC)
         return response
 
@@ -1197,6 +2014,57 @@ def get_form_digest_value(sharepoint_url, sharepoint_site, session=None, sharepo
     return form_digest_value
 
 
+def get_projection_kwargs(select):
+    """ Request only the select fields, without the verbose OData metadata """
+    if not select:
+        return {}
+    return {
+        "params": {
+            "$select": ",".join(select)
+        },
+        "headers": {
+            "Accept": DSSConstants.APPLICATION_JSON_NOMETADATA
+        }
+    }
+
+
+def get_projection_key(select):
+    if not select:
+        return None
+    return ",".join(select)
+
+
+def get_response_etag(response):
+    """ ETag of the file described by an upload answer, None if it is not there """
+    try:
+        json_response = response.json()
+    except ValueError:
+        return None
+    if not isinstance(json_response, dict):
+        return None
+    return get_value_from_paths(json_response, [
+        [SharePointConstants.RESULTS_CONTAINER_V2, SharePointConstants.ETAG],
+        [SharePointConstants.ETAG]
+    ])
+
+
+def get_batch_error_message(json_response):
+    error = (json_response or {}).get("error") or (json_response or {}).get("odata.error") or {}
+    message = error.get("message")
+    if isinstance(message, dict):
+        return message.get("value")
+    return message
+
+
+def get_size_from_config(config, parameter_name, default_size, unit=1024):
+    if not config.get("advanced_parameters", False):
+        return default_size
+    size_in_units = config.get(parameter_name)
+    if not size_in_units or size_in_units <= 0:
+        return default_size
+    return int(size_in_units) * unit
+
+
 class SuppressFilter(logging.Filter):
     # Avoid poluting logs with redondant warnings
     # https://github.com/diyan/pywinrm/issues/269
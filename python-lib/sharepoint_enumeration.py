@@ -0,0 +1,235 @@
+import os
+import fnmatch
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sharepoint_constants import SharePointConstants
+from sharepoint_items import (
+    get_name, get_size, get_last_modified,
+    get_list_data_size, get_list_data_last_modified, is_list_data_file, is_list_data_row_in_folder,
+    get_search_rows, format_search_date
+)
+from sharepoint_lists import build_view_xml, build_modified_since_query
+from sharepoint_client import SharePointListViewThresholdError
+from dss_constants import DSSConstants
+from common import get_lnt_path, parse_query_string_to_dict
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class SharePointFolderCrawler(object):
+    """
+    Breadth-first enumeration of all the files below a folder.
+     Folders are listed concurrently by a bounded pool of workers. All workers share the client's session,
+     so throttling (429 / 503 + Retry-After) is handled by its retry logic.
+    """
+    def __init__(self, client, max_workers=SharePointConstants.ENUMERATION_MAX_WORKERS):
+        self.client = client
+        self.max_workers = max(1, max_workers)
+
+    def list_files(self, path, full_path, first_non_empty=False):
+        paths = list(self.iter_files(path, full_path, first_non_empty))
+        logger.info("list_files:{} files found".format(len(paths)))
+        return paths
+
+    def iter_files(self, path, full_path, first_non_empty=False):
+        """ Yields the files of each folder as soon as it has been listed """
+        number_of_folders = 0
+        stop_event = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self.list_folder, path, full_path, first_non_empty, stop_event)}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        files, sub_folders = future.result()
+                        number_of_folders += 1
+                        for file in files:
+                            yield file
+                        if first_non_empty and files:
+                            return
+                        for sub_path, sub_full_path in sub_folders:
+                            pending.add(executor.submit(self.list_folder, sub_path, sub_full_path, first_non_empty, stop_event))
+            finally:
+                # Stop the running workers as early as possible and drop the queued ones
+                stop_event.set()
+                for pending_future in pending:
+                    pending_future.cancel()
+                logger.info("iter_files:{} folders listed".format(number_of_folders))
+
+    def list_folder(self, path, full_path, first_non_empty, stop_event):
+        if stop_event.is_set():
+            return [], []
+        files = []
+        for page in self.client.iter_files(full_path, select=SharePointConstants.FILE_LISTING_FIELDS):
+            for file in page:
+                files.append({
+                    DSSConstants.PATH: get_lnt_path(os.path.join(path, get_name(file))),
+                    DSSConstants.LAST_MODIFIED: get_last_modified(file),
+                    DSSConstants.SIZE: get_size(file)
+                })
+            if (first_non_empty and files) or stop_event.is_set():
+                return files, []
+        sub_folders = []
+        for page in self.client.iter_folders(full_path, select=SharePointConstants.FOLDER_LISTING_FIELDS):
+            for folder in page:
+                sub_folders.append((
+                    get_lnt_path(os.path.join(path, get_name(folder))),
+                    get_lnt_path(os.path.join(full_path, get_name(folder)))
+                ))
+            if stop_event.is_set():
+                return files, []
+        return files, sub_folders
+
+
+class SharePointLibraryEnumerator(object):
+    """
+    Enumeration of all the files below a folder with RenderListDataAsStream queries on the hosting document library.
+     The RecursiveAll scope returns the whole subtree in pages of LIST_DATA_PAGE_SIZE items,
+     so the number of round trips depends on the number of files, not on the number of folders.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.view_xml = build_view_xml(
+            view_fields=SharePointConstants.LIBRARY_VIEW_FIELDS,
+            scope=SharePointConstants.SCOPE_RECURSIVE_ALL,
+            row_limit=SharePointConstants.LIST_DATA_PAGE_SIZE
+        )
+
+    def list_files(self, path, full_path, first_non_empty=False):
+        paths = list(self.iter_files(path, full_path, first_non_empty))
+        logger.info("list_files:{} files found".format(len(paths)))
+        return paths
+
+    def iter_files(self, path, full_path, first_non_empty=False, view_xml=None):
+        """ Yields the files below full_path page by page, stopping after the first page holding a file if first_non_empty """
+        folder_server_relative_path = self.client.get_server_relative_path(full_path).rstrip("/")
+        for rows in self.iter_pages(full_path, view_xml=view_xml):
+            is_file_found = False
+            for row in rows:
+                # The scope is set server side by the query's folder, this makes sure of the FileDirRef prefix
+                if not is_list_data_file(row) or not is_list_data_row_in_folder(row, folder_server_relative_path):
+                    continue
+                is_file_found = True
+                file_relative_path = row.get(SharePointConstants.FILE_REF, "")[len(folder_server_relative_path):]
+                yield {
+                    DSSConstants.PATH: get_lnt_path(os.path.join(path, file_relative_path.strip("/"))),
+                    DSSConstants.LAST_MODIFIED: get_list_data_last_modified(row),
+                    DSSConstants.SIZE: get_list_data_size(row)
+                }
+            if first_non_empty and is_file_found:
+                return
+
+    def iter_rows(self, full_path, view_xml=None):
+        for rows in self.iter_pages(full_path, view_xml=view_xml):
+            for row in rows:
+                yield row
+
+    def iter_pages(self, full_path, view_xml=None):
+        page = {}
+        is_first_page = True
+        while is_first_page or self.is_not_last_page(page):
+            is_first_page = False
+            page = self.client.get_library_items(
+                full_path,
+                view_xml or self.view_xml,
+                params=parse_query_string_to_dict(page.get("NextHref", ""))
+            )
+            yield page.get("Row", [])
+
+    @staticmethod
+    def is_not_last_page(page):
+        return "Row" in page and "NextHref" in page
+
+
+class SharePointSearchEnumerator(object):
+    """
+    Enumeration of the files below a folder with queries on the tenant's search index, restricted to the folder's path
+     and, for globs such as *.xlsx, to the file extension. The index lags behind the libraries by a few minutes,
+     so the files modified in the last freshness_min minutes are listed with a library query as well.
+     This query filters on Modified, which has to be indexed on libraries above the list view threshold,
+     otherwise only the files of the index are listed.
+    """
+    def __init__(self, client, library_enumerator, glob_pattern=None, freshness_min=SharePointConstants.SEARCH_FRESHNESS_MIN):
+        self.client = client
+        self.library_enumerator = library_enumerator
+        self.glob_pattern = glob_pattern or None
+        self.freshness_min = freshness_min
+
+    def list_files(self, path, full_path, first_non_empty=False):
+        paths = list(self.iter_files(path, full_path, first_non_empty))
+        logger.info("list_files:{} files found".format(len(paths)))
+        return paths
+
+    def iter_files(self, path, full_path, first_non_empty=False):
+        listed_paths = set()
+        for file in self.iter_recent_files(path, full_path, first_non_empty):
+            listed_paths.add(file.get(DSSConstants.PATH))
+            yield file
+        if first_non_empty and listed_paths:
+            return
+        folder_url = unquote(self.client.get_absolute_url(full_path)).lower()
+        query_text = get_extension_query(self.glob_pattern)
+        start_row = 0
+        while True:
+            rows = get_search_rows(self.client.search_files(full_path, query_text=query_text, start_row=start_row))
+            is_file_found = False
+            for row in rows:
+                file_url = unquote(row.get(SharePointConstants.SEARCH_PATH) or "")
+                if not file_url.lower().startswith(folder_url + "/"):
+                    continue
+                file_path = get_lnt_path(os.path.join(path, file_url[len(folder_url):].strip("/")))
+                if file_path in listed_paths or not self.is_matching(file_path):
+                    continue
+                listed_paths.add(file_path)
+                is_file_found = True
+                yield {
+                    DSSConstants.PATH: file_path,
+                    DSSConstants.LAST_MODIFIED: format_search_date(row.get(SharePointConstants.SEARCH_LAST_MODIFIED_TIME)),
+                    DSSConstants.SIZE: int(row.get(SharePointConstants.SEARCH_SIZE) or 0)
+                }
+            if (first_non_empty and is_file_found) or len(rows) < SharePointConstants.SEARCH_PAGE_SIZE:
+                return
+            start_row += len(rows)
+
+    def iter_recent_files(self, path, full_path, first_non_empty):
+        """ Files modified too recently to be in the search index """
+        if not self.freshness_min:
+            return
+        modified_since = datetime.utcnow() - timedelta(minutes=self.freshness_min)
+        view_xml = build_view_xml(
+            view_fields=SharePointConstants.LIBRARY_VIEW_FIELDS,
+            scope=SharePointConstants.SCOPE_RECURSIVE_ALL,
+            query=build_modified_since_query(modified_since.strftime(SharePointConstants.TIME_FORMAT)),
+            row_limit=SharePointConstants.LIST_DATA_PAGE_SIZE
+        )
+        try:
+            files = list(self.library_enumerator.iter_files(path, full_path, first_non_empty, view_xml=view_xml))
+        except SharePointListViewThresholdError as error:
+            logger.warning("iter_recent_files:{}, the recent files are skipped until the Modified column of the library is indexed".format(error))
+            return
+        for file in files:
+            if self.is_matching(file.get(DSSConstants.PATH)):
+                yield file
+                if first_non_empty:
+                    return
+
+    def is_matching(self, file_path):
+        if not self.glob_pattern:
+            return True
+        return fnmatch.fnmatch(file_path.lower(), get_lnt_path(self.glob_pattern).lower()) \
+            or fnmatch.fnmatch(os.path.basename(file_path).lower(), self.glob_pattern.lower())
+
+
+def get_extension_query(glob_pattern):
+    """ KQL restriction on the file extension of globs ending with *.extension """
+    if not glob_pattern:
+        return ""
+    extension = os.path.splitext(glob_pattern)[1].lstrip(".")
+    if not extension or any(character in extension for character in "*?[]"):
+        return ""
+    return "{}:{}".format(SharePointConstants.SEARCH_FILE_EXTENSION, extension)
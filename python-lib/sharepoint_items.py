@@ -1,31 +1,28 @@
 import os.path
+import json
 
 from sharepoint_constants import SharePointConstants
 from datetime import datetime
-from common import get_lnt_path, get_rel_path
+from dss_constants import DSSConstants
+from common import get_lnt_path, get_rel_path, get_value_from_path
 
 
-def loop_sharepoint_items(items):
-    if SharePointConstants.RESULTS_CONTAINER_V2 not in items or SharePointConstants.RESULTS not in items[SharePointConstants.RESULTS_CONTAINER_V2]:
-        yield
-    for item in items[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]:
-        yield item
+def get_sharepoint_items(items):
+    """ Items of a listing response, in verbose (d/results) or nometadata (value) format """
+    if not items:
+        return []
+    if SharePointConstants.RESULTS_CONTAINER_NOMETADATA in items:
+        return items[SharePointConstants.RESULTS_CONTAINER_NOMETADATA] or []
+    return items.get(SharePointConstants.RESULTS_CONTAINER_V2, {}).get(SharePointConstants.RESULTS) or []
 
 
-def extract_item_from(item_name, items):
-    for item in loop_sharepoint_items(items):
-        if SharePointConstants.NAME in item and item[SharePointConstants.NAME] == item_name:
-            return item
-    return None
-
-
-def has_sharepoint_items(items):
-    if SharePointConstants.RESULTS_CONTAINER_V2 not in items or SharePointConstants.RESULTS not in items[SharePointConstants.RESULTS_CONTAINER_V2]:
-        return False
-    if len(items[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]) > 0:
-        return True
-    else:
-        return False
+def get_next_page_url(items):
+    """ Server paging link of a listing response, None on its last page """
+    if not items:
+        return None
+    if SharePointConstants.NEXT_PAGE_NOMETADATA in items:
+        return items[SharePointConstants.NEXT_PAGE_NOMETADATA]
+    return items.get(SharePointConstants.RESULTS_CONTAINER_V2, {}).get(SharePointConstants.NEXT_PAGE)
 
 
 def get_last_modified(item):
@@ -42,6 +39,114 @@ def format_date(date):
         return None
 
 
+def format_list_data_date(date):
+    # Depending on the request parameters and the site's regional settings,
+    # RenderListDataAsStream returns either ISO or display formatted dates
+    if not date:
+        return None
+    for date_format in SharePointConstants.LIST_DATA_DATE_FORMATS:
+        try:
+            utc_time = datetime.strptime(date, date_format)
+        except ValueError:
+            continue
+        epoch_time = (utc_time - datetime(1970, 1, 1)).total_seconds()
+        return int(epoch_time) * 1000
+    return None
+
+
+def format_search_date(date):
+    # The search index returns dates with 7 digits of fractional seconds, which strptime can't parse
+    if not date:
+        return None
+    return format_list_data_date("{}Z".format(date[:19]))
+
+
+def get_search_rows(response):
+    """ Properties of each result of a search query response, as dicts, in verbose or nometadata format """
+    query = response.get(SharePointConstants.RESULTS_CONTAINER_V2, {}).get(SharePointConstants.SEARCH_QUERY, response)
+    table = get_value_from_path(
+        query,
+        [SharePointConstants.SEARCH_PRIMARY_QUERY_RESULT, SharePointConstants.SEARCH_RELEVANT_RESULTS, SharePointConstants.SEARCH_TABLE],
+        default_reply={}
+    )
+    rows = []
+    for row in get_results(table.get(SharePointConstants.SEARCH_ROWS)):
+        rows.append({
+            cell.get(SharePointConstants.SEARCH_KEY): cell.get(SharePointConstants.SEARCH_VALUE)
+            for cell in get_results(row.get(SharePointConstants.SEARCH_CELLS))
+        })
+    return rows
+
+
+def get_results(collection):
+    # Collections are wrapped in a results object in verbose responses
+    if isinstance(collection, dict):
+        return collection.get(SharePointConstants.RESULTS) or []
+    return collection or []
+
+
+def get_list_data_last_modified(row):
+    return format_list_data_date(row.get("{}.".format(SharePointConstants.MODIFIED)) or row.get(SharePointConstants.MODIFIED))
+
+
+def format_list_data_value(value):
+    """ Flat value of a RenderListDataAsStream field: people and lookups are lists of dicts, other complex fields are dumped as JSON """
+    if isinstance(value, list):
+        if all(isinstance(element, dict) for element in value):
+            return ", ".join(
+                "{}".format(element.get("title") or element.get("lookupValue") or element.get("email") or "") for element in value
+            )
+        return ", ".join("{}".format(element) for element in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def format_epoch_to_iso(epoch_time_ms):
+    if epoch_time_ms is None:
+        return None
+    return datetime.utcfromtimestamp(epoch_time_ms / 1000).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def get_list_data_size(row):
+    size = row.get(SharePointConstants.FILE_SIZE)
+    if size:
+        return int(size)
+    return 0
+
+
+def is_list_data_file(row):
+    return "{}".format(row.get(SharePointConstants.FS_OBJ_TYPE)) == "{}".format(SharePointConstants.FILE)
+
+
+def is_list_data_row_in_folder(row, folder_server_relative_path):
+    folder = folder_server_relative_path.rstrip("/").lower()
+    file_dir_ref = (row.get(SharePointConstants.FILE_DIR_REF) or "").rstrip("/").lower()
+    return file_dir_ref == folder or file_dir_ref.startswith(folder + "/")
+
+
+def get_item_resolution(list_item):
+    """ Size, last modification and type of a list item retrieved with its File and Folder properties expanded """
+    if not list_item:
+        return None
+    file_system_object_type = list_item.get(SharePointConstants.FILE_SYSTEM_OBJECT_TYPE)
+    if file_system_object_type == SharePointConstants.FILE:
+        file = list_item.get(SharePointConstants.FILE_PROPERTY) or {}
+        return {
+            DSSConstants.IS_DIRECTORY: False,
+            DSSConstants.SIZE: get_size(file),
+            DSSConstants.LAST_MODIFIED: get_last_modified(file)
+        }
+    if file_system_object_type == SharePointConstants.FOLDER:
+        folder = list_item.get(SharePointConstants.FOLDER_PROPERTY) or {}
+        return {
+            DSSConstants.IS_DIRECTORY: True,
+            DSSConstants.SIZE: 0,
+            DSSConstants.LAST_MODIFIED: get_last_modified(folder)
+        }
+    return None
+
+
 def get_size(item):
     if SharePointConstants.LENGTH in item:
         return int(item[SharePointConstants.LENGTH])
@@ -0,0 +1,89 @@
+from sharepoint_constants import SharePointConstants
+from sharepoint_enumeration import SharePointLibraryEnumerator
+from sharepoint_items import (
+    is_list_data_file, is_list_data_row_in_folder, get_list_data_size,
+    format_list_data_date, format_list_data_value, format_epoch_to_iso
+)
+from sharepoint_lists import build_view_xml
+from common import get_lnt_path
+from safe_logger import SafeLogger
+from dss_constants import DSSConstants
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class SharePointLibraryInventory(object):
+    """
+    One row per file of a document library folder and its sub-folders, read page by page
+     with RenderListDataAsStream queries using the RecursiveAll scope, for the library inventory connector.
+    """
+    def __init__(self, client, folder_path, custom_columns=None):
+        self.client = client
+        self.folder_path = get_lnt_path(folder_path or "/")
+        self.custom_columns = [custom_column.strip() for custom_column in custom_columns or [] if custom_column and custom_column.strip()]
+        self.library_enumerator = SharePointLibraryEnumerator(client)
+
+    def get_read_schema(self):
+        columns = [
+            {SharePointConstants.NAME_COLUMN: "path", SharePointConstants.TYPE_COLUMN: "string"},
+            {SharePointConstants.NAME_COLUMN: "name", SharePointConstants.TYPE_COLUMN: "string"},
+            {SharePointConstants.NAME_COLUMN: "folder", SharePointConstants.TYPE_COLUMN: "string"},
+            {SharePointConstants.NAME_COLUMN: "size", SharePointConstants.TYPE_COLUMN: "bigint"},
+            {SharePointConstants.NAME_COLUMN: "created", SharePointConstants.TYPE_COLUMN: "date"},
+            {SharePointConstants.NAME_COLUMN: "modified", SharePointConstants.TYPE_COLUMN: "date"},
+            {SharePointConstants.NAME_COLUMN: "author", SharePointConstants.TYPE_COLUMN: "string"},
+            {SharePointConstants.NAME_COLUMN: "editor", SharePointConstants.TYPE_COLUMN: "string"},
+            {SharePointConstants.NAME_COLUMN: "id", SharePointConstants.TYPE_COLUMN: "int"},
+            {SharePointConstants.NAME_COLUMN: "server_relative_url", SharePointConstants.TYPE_COLUMN: "string"}
+        ]
+        for custom_column in self.custom_columns:
+            columns.append({SharePointConstants.NAME_COLUMN: custom_column, SharePointConstants.TYPE_COLUMN: "string"})
+        return {
+            SharePointConstants.COLUMNS: columns
+        }
+
+    def iter_rows(self, records_limit=-1):
+        row_limit = SharePointConstants.LIST_DATA_PAGE_SIZE
+        if records_limit > 0:
+            row_limit = min(row_limit, records_limit)
+        view_xml = build_view_xml(
+            view_fields=SharePointConstants.LIBRARY_INVENTORY_FIELDS + self.custom_columns,
+            scope=SharePointConstants.SCOPE_RECURSIVE_ALL,
+            row_limit=row_limit
+        )
+        folder_server_relative_path = self.client.get_server_relative_path(self.folder_path).rstrip("/")
+        record_count = 0
+        for row in self.library_enumerator.iter_rows(self.folder_path, view_xml=view_xml):
+            if not is_list_data_file(row) or not is_list_data_row_in_folder(row, folder_server_relative_path):
+                continue
+            yield self.format_row(row, folder_server_relative_path)
+            record_count += 1
+            if records_limit > 0 and record_count >= records_limit:
+                break
+        logger.info('iter_rows:{} files'.format(record_count))
+
+    def format_row(self, row, folder_server_relative_path):
+        file_ref = row.get(SharePointConstants.FILE_REF) or ""
+        file_dir_ref = row.get(SharePointConstants.FILE_DIR_REF) or ""
+        formatted_row = {
+            "path": get_lnt_path(file_ref[len(folder_server_relative_path):]),
+            "name": row.get("FileLeafRef"),
+            "folder": get_lnt_path(file_dir_ref[len(folder_server_relative_path):]),
+            "size": get_list_data_size(row),
+            "created": self.format_date(row, "Created"),
+            "modified": self.format_date(row, SharePointConstants.MODIFIED),
+            "author": format_list_data_value(row.get("Author")),
+            "editor": format_list_data_value(row.get("Editor")),
+            "id": row.get(SharePointConstants.ID),
+            "server_relative_url": file_ref
+        }
+        for custom_column in self.custom_columns:
+            formatted_row[custom_column] = format_list_data_value(row.get(custom_column))
+        return formatted_row
+
+    @staticmethod
+    def format_date(row, field_name):
+        # The "field." variant holds the raw value when the site's display format differs
+        date = row.get("{}.".format(field_name)) or row.get(field_name)
+        return format_epoch_to_iso(format_list_data_date(date))
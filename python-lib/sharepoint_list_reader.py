@@ -0,0 +1,232 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sharepoint_constants import SharePointConstants
+from sharepoint_lists import column_ids_to_names, sharepoint_to_dss_date
+from sharepoint_lists import build_view_xml, build_id_range_query, get_id_ranges, iter_pages_ahead, get_projected_fields
+from sharepoint_lists import parse_view_query, map_view_fields
+from sharepoint_list_sync import SharePointListSyncState, get_item_id
+from sharepoint_items import get_list_data_last_modified
+from common import parse_query_string_to_dict
+from safe_logger import SafeLogger
+from dss_constants import DSSConstants
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class SharePointListReader(object):
+    """
+    Reads the rows of a SharePoint list for the lists connector, page by page with RenderListDataAsStream.
+     The read schema is built once and reused by the following reads, until reset_read_schema.
+     Reads that need their own ViewXml keep the fields, filters and sort of the list's default view.
+    """
+    def __init__(self, client, list_title, list_view_id=None, max_read_workers=1, project_columns=False):
+        self.client = client
+        self.list_title = list_title
+        self.list_view_id = list_view_id
+        self.max_read_workers = max_read_workers
+        self.project_columns = project_columns
+        self.read_schema = None
+        self.default_view_query = None
+        self.default_view_fields = None
+
+    def get_read_schema(self, display_metadata=False, metadata_to_retrieve=[]):
+        # The client keeps the column mappings of the last schema it built, so it is only requested once
+        if self.read_schema is None:
+            self.read_schema = self.client.get_read_schema(display_metadata=display_metadata, metadata_to_retrieve=metadata_to_retrieve)
+        return self.read_schema
+
+    def reset_read_schema(self):
+        self.read_schema = None
+        self.default_view_fields = None
+
+    def get_default_view_query(self):
+        if self.default_view_query is None:
+            self.default_view_query = parse_view_query(self.client.get_list_default_view_query(self.list_title))
+        return self.default_view_query
+
+    def get_default_view_fields(self):
+        if self.default_view_fields is None:
+            self.default_view_fields = map_view_fields(self.client.get_list_default_view(self.list_title), self.client.column_ids)
+        return self.default_view_fields
+
+    def iter_rows(self, dataset_schema=None, records_limit=-1):
+        if self.max_read_workers > 1 and not self.list_view_id:
+            for row in self.iter_rows_by_id_ranges(self.get_view_fields(dataset_schema), records_limit):
+                yield row
+            return
+
+        record_count = 0
+        is_record_limit = records_limit > 0
+        # Previews and samples only request the rows they need, projected reads only the columns they need,
+        #  both with the default view's query. A named view is sent as is, its rows are capped client side.
+        is_view_xml_needed = (is_record_limit or self.project_columns) and not self.list_view_id
+        view_fields = self.get_view_fields(dataset_schema) if is_view_xml_needed else None
+        view_query = self.get_default_view_query() if is_view_xml_needed else None
+        fetched_record_count = [0]
+
+        def get_page(page):
+            view_xml = None
+            if is_view_xml_needed:
+                row_limit = SharePointConstants.LIST_DATA_PAGE_SIZE
+                if is_record_limit:
+                    row_limit = max(1, min(records_limit - fetched_record_count[0], row_limit))
+                view_xml = self.get_view_xml(view_fields, query=view_query, row_limit=row_limit)
+            return self.get_next_page(page, view_xml)
+
+        def is_last_page(page):
+            fetched_record_count[0] += len(self.get_page_rows(page))
+            return not self.is_not_last_page(page) or (is_record_limit and fetched_record_count[0] >= records_limit)
+
+        # The next page is fetched while the rows of the current one are consumed
+        for page in iter_pages_ahead(get_page, is_last_page):
+            for row in self.get_page_rows(page):
+                row = self.format_row(row)
+                yield column_ids_to_names(self.client.dss_column_name, row)
+                record_count += 1
+                if is_record_limit and record_count >= records_limit:
+                    return
+
+    def get_next_page(self, page, view_xml=None):
+        return self.client.get_list_items(
+            self.list_title,
+            params=self.get_requests_params(page),
+            view_xml=view_xml
+        )
+
+    def get_view_fields(self, dataset_schema):
+        default_view_fields = self.get_default_view_fields()
+        if self.project_columns:
+            projected_fields = get_projected_fields(self.client.column_names, dataset_schema)
+            view_fields = [view_field for view_field in projected_fields if view_field in default_view_fields] or default_view_fields
+            logger.info("get_view_fields:{} of {} columns retrieved".format(len(view_fields), len(default_view_fields)))
+            return view_fields
+        return default_view_fields
+
+    @staticmethod
+    def get_view_xml(view_fields, query=None, row_limit=SharePointConstants.LIST_DATA_PAGE_SIZE):
+        return build_view_xml(view_fields=view_fields, query=query, row_limit=row_limit)
+
+    def iter_incremental_rows(self, state_directory, sync_key, dataset_schema=None, keep_snapshot=False, records_limit=-1):
+        """
+        Only reads the items modified since the high-water mark of the previous read. In delta mode, these are the rows returned,
+         in snapshot mode they are merged by ID into the rows kept from the previous reads, which are all returned.
+         The Modified filter is applied within ranges of item IDs, so it does not need an index to stay under the list view threshold.
+         Deleted items do not show in the delta, they are only removed from the snapshot.
+         The mark only moves forward once a read without records limit has gone through every range.
+         Each sync key and output mode keeps its own state, so that datasets reading the same list do not share their mark.
+        """
+        if not sync_key:
+            raise ValueError("A sync key is required to keep the state of the incremental read")
+        view_fields = self.get_view_fields(dataset_schema)
+        sync_mode = SharePointConstants.LIST_SYNC_OUTPUT_SNAPSHOT if keep_snapshot else SharePointConstants.LIST_SYNC_OUTPUT_DELTA
+        sync_state = SharePointListSyncState(
+            state_directory,
+            [sync_key, sync_mode, self.client.sharepoint_origin, self.client.sharepoint_site, self.list_title, ",".join(view_fields)],
+            keep_snapshot=keep_snapshot
+        )
+        if SharePointConstants.MODIFIED not in view_fields:
+            view_fields = view_fields + [SharePointConstants.MODIFIED]
+        query = sync_state.get_query(self.get_default_view_query())
+        record_count = 0
+        is_record_limit = records_limit > 0
+        for row in self.iter_id_range_rows(view_fields, query):
+            item_id = get_item_id(row)
+            last_modified = get_list_data_last_modified(row)
+            if sync_state.is_already_read(item_id, last_modified):
+                continue
+            row = column_ids_to_names(self.client.dss_column_name, self.format_row(row))
+            sync_state.add(item_id, last_modified, row)
+            if not keep_snapshot:
+                yield row
+                record_count += 1
+                if is_record_limit and record_count >= records_limit:
+                    return
+        if keep_snapshot:
+            sync_state.remove_deleted_rows(self.client.get_list_item_ids(self.list_title))
+        if not is_record_limit:
+            sync_state.save()
+        if keep_snapshot:
+            for row in sync_state.iter_rows():
+                yield row
+                record_count += 1
+                if is_record_limit and record_count >= records_limit:
+                    return
+
+    def iter_rows_by_id_ranges(self, view_fields, records_limit=-1):
+        """
+        Reads the list with max_read_workers concurrent queries, each one bounded to a range of item IDs
+         so that it stays under the list view threshold. Rows are yielded as the ranges complete, not in ID order.
+        """
+        record_count = 0
+        is_record_limit = records_limit > 0
+        for row in self.iter_id_range_rows(view_fields, self.get_default_view_query()):
+            row = self.format_row(row)
+            yield column_ids_to_names(self.client.dss_column_name, row)
+            record_count += 1
+            if is_record_limit and record_count >= records_limit:
+                return
+
+    def iter_id_range_rows(self, view_fields, query):
+        """ Raw rows of query, read by ranges of item IDs with max_read_workers workers """
+        min_id, max_id = self.client.get_list_id_range(self.list_title)
+        if min_id is None:
+            return
+        id_ranges = get_id_ranges(min_id, max_id, SharePointConstants.LIST_DATA_PAGE_SIZE)
+        logger.info("iter_id_range_rows:IDs {} to {} read in {} ranges by {} workers".format(
+            min_id, max_id, len(id_ranges), self.max_read_workers
+        ))
+        executor = ThreadPoolExecutor(max_workers=self.max_read_workers)
+        pending_reads = set()
+        try:
+            while id_ranges or pending_reads:
+                # A few ranges are queued ahead so that the workers never wait for the consumer
+                while id_ranges and len(pending_reads) < 2 * self.max_read_workers:
+                    first_id, last_id = id_ranges.pop(0)
+                    pending_reads.add(executor.submit(self.get_id_range_rows, view_fields, first_id, last_id, query))
+                done_reads, pending_reads = wait(pending_reads, return_when=FIRST_COMPLETED)
+                for done_read in done_reads:
+                    for row in done_read.result():
+                        yield row
+        finally:
+            for pending_read in pending_reads:
+                pending_read.cancel()
+            executor.shutdown(wait=False)
+
+    def get_id_range_rows(self, view_fields, first_id, last_id, query=None):
+        view_xml = self.get_view_xml(view_fields, query=build_id_range_query(first_id, last_id, query))
+        rows = []
+        page = {}
+        is_first_run = True
+        while is_first_run or self.is_not_last_page(page):
+            is_first_run = False
+            page = self.get_next_page(page, view_xml)
+            rows.extend(self.get_page_rows(page))
+        return rows
+
+    @staticmethod
+    def is_not_last_page(page):
+        return "Row" in page and "NextHref" in page
+
+    def get_requests_params(self, page):
+        next_page_query_string = page.get("NextHref", "")
+        next_page_requests_params = parse_query_string_to_dict(next_page_query_string)
+        if self.list_view_id:
+            next_page_requests_params.update(
+                {
+                    "View": self.list_view_id
+                }
+            )
+        return next_page_requests_params
+
+    @staticmethod
+    def get_page_rows(page):
+        return page.get("Row", "")
+
+    def format_row(self, row):
+        for column_to_format, type_to_process in self.client.columns_to_format:
+            if type_to_process == "date":
+                value = row.get(column_to_format)
+                if value:
+                    row[column_to_format] = sharepoint_to_dss_date(value)
+        return row
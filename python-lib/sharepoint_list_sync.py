@@ -0,0 +1,93 @@
+import os
+import json
+
+from sharepoint_constants import SharePointConstants
+from sharepoint_items import format_epoch_to_iso
+from sharepoint_lists import build_modified_since_query
+from common import get_state_key, save_json_atomically
+from dss_constants import DSSConstants
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class SharePointListSyncState(object):
+    """
+    High-water mark of an incremental list read, saved in a state file: the latest Modified date read so far,
+     and the IDs of the items modified at that exact date, which the next read (filtered on Modified >= mark) skips.
+     In snapshot mode, the state also keeps the latest version of every row read, keyed by item ID,
+     and the rows of the items deleted since are removed with remove_deleted_rows.
+    """
+    def __init__(self, state_directory, state_elements, keep_snapshot=False):
+        self.state_file_path = os.path.join(
+            state_directory,
+            "list_sync_{}.json".format(get_state_key(*state_elements))
+        )
+        self.keep_snapshot = keep_snapshot
+        self.last_modified = None
+        self.last_ids = set()
+        self.rows = {}
+        self.number_of_changes = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_file_path, "r") as state_file:
+                state = json.load(state_file)
+        except (IOError, OSError, ValueError) as error:
+            logger.info("SharePointListSyncState:no usable state in {} ({})".format(self.state_file_path, error))
+            return
+        if self.keep_snapshot and "rows" not in state:
+            # The previous reads only kept the delta, the snapshot has to be read again from scratch
+            return
+        self.last_modified = state.get("last_modified")
+        self.last_ids = set(state.get("last_ids", []))
+        self.rows = state.get("rows", {})
+        logger.info("SharePointListSyncState:items modified since {} will be read".format(format_epoch_to_iso(self.last_modified)))
+
+    def save(self):
+        state_directory = os.path.dirname(self.state_file_path)
+        if not os.path.exists(state_directory):
+            os.makedirs(state_directory, exist_ok=True)
+        state = {"last_modified": self.last_modified, "last_ids": sorted(self.last_ids)}
+        if self.keep_snapshot:
+            state["rows"] = self.rows
+        save_json_atomically(self.state_file_path, state)
+        logger.info("SharePointListSyncState:{} changed items saved, high-water mark at {}".format(
+            self.number_of_changes, format_epoch_to_iso(self.last_modified)
+        ))
+
+    def get_query(self, view_query=None):
+        """ CAML Query of the items of view_query to read, view_query itself for a first full read """
+        if self.last_modified is None:
+            return view_query
+        return build_modified_since_query(format_epoch_to_iso(self.last_modified), view_query)
+
+    def is_already_read(self, item_id, last_modified):
+        return last_modified is not None and last_modified == self.last_modified and item_id in self.last_ids
+
+    def add(self, item_id, last_modified, row):
+        self.number_of_changes += 1
+        if last_modified is not None:
+            if self.last_modified is None or last_modified > self.last_modified:
+                self.last_modified = last_modified
+                self.last_ids = set()
+            if last_modified == self.last_modified:
+                self.last_ids.add(item_id)
+        if self.keep_snapshot:
+            self.rows[item_id] = row
+
+    def remove_deleted_rows(self, item_ids):
+        """ Drops the rows of the snapshot whose item is not in item_ids anymore """
+        deleted_item_ids = [item_id for item_id in self.rows if item_id not in item_ids]
+        for item_id in deleted_item_ids:
+            del self.rows[item_id]
+        self.number_of_changes += len(deleted_item_ids)
+
+    def iter_rows(self):
+        return iter(self.rows.values())
+
+
+def get_item_id(row):
+    return "{}".format(row.get(SharePointConstants.ID))
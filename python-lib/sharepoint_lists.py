@@ -1,4 +1,8 @@
+import copy
 import datetime
+import threading
+from queue import Queue, Full
+from xml.etree.ElementTree import Element, SubElement, tostring, fromstring
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from sharepoint_constants import SharePointConstants
 from dss_constants import DSSConstants
@@ -53,6 +57,144 @@ def assert_list_title(list_title):
         raise ValueError("The list title contains a '?' characters")
 
 
+def build_view_xml(view_fields=None, scope=None, query=None, row_limit=None):
+    """ Build the CAML ViewXml parameter of a RenderListDataAsStream request """
+    view = Element("View")
+    if scope:
+        view.set("Scope", scope)
+    if query is not None:
+        view.append(query)
+    if view_fields:
+        view_fields_element = SubElement(view, "ViewFields")
+        for view_field in view_fields:
+            SubElement(view_fields_element, "FieldRef", Name=view_field)
+    if row_limit:
+        row_limit_element = SubElement(view, "RowLimit", Paged="TRUE")
+        row_limit_element.text = "{}".format(row_limit)
+    return tostring(view, encoding="unicode")
+
+
+def build_modified_since_query(modified_since, query=None):
+    """ CAML Query element selecting the items modified since the modified_since ISO UTC date among the ones of query """
+    query = copy.deepcopy(query) if query is not None else Element("Query")
+    greater_or_equal = Element("Geq")
+    SubElement(greater_or_equal, "FieldRef", Name=SharePointConstants.MODIFIED)
+    value = SubElement(greater_or_equal, "Value", Type="DateTime", IncludeTimeValue="TRUE", StorageTZ="TRUE")
+    value.text = modified_since
+    return add_where_condition(query, greater_or_equal)
+
+
+def build_id_range_query(first_id, last_id, query=None):
+    """
+    CAML Query element selecting the items with first_id <= ID <= last_id among the ones of query,
+     in the query's order or else in ID order. The ID condition comes first, so that the indexed column is used.
+    """
+    query = copy.deepcopy(query) if query is not None else Element("Query")
+    both = Element("And")
+    for operator, item_id in [("Geq", first_id), ("Leq", last_id)]:
+        comparison = SubElement(both, operator)
+        SubElement(comparison, "FieldRef", Name=SharePointConstants.ID)
+        value = SubElement(comparison, "Value", Type="Counter")
+        value.text = "{}".format(item_id)
+    add_where_condition(query, both)
+    if query.find("OrderBy") is None:
+        order_by = SubElement(query, "OrderBy")
+        SubElement(order_by, "FieldRef", Name=SharePointConstants.ID, Ascending="TRUE")
+    return query
+
+
+def parse_view_query(view_query):
+    """ CAML Query element holding the Where and OrderBy elements of a view's ViewQuery """
+    return fromstring("<Query>{}</Query>".format(view_query or ""))
+
+
+def add_where_condition(query, condition):
+    """ Restricts the Where element of a CAML Query to the items matching condition as well """
+    where = query.find("Where")
+    if where is None:
+        where = SubElement(query, "Where")
+    view_conditions = list(where)
+    for view_condition in view_conditions:
+        where.remove(view_condition)
+    if not view_conditions:
+        where.append(condition)
+        return query
+    both = SubElement(where, "And")
+    both.append(condition)
+    both.extend(view_conditions)
+    return query
+
+
+def map_view_fields(view_field_names, column_ids):
+    """ Static names of the list columns displayed by the default view, all the list columns if none is """
+    view_fields = []
+    for view_field_name in view_field_names:
+        static_name = SharePointConstants.VIEW_FIELD_ALIASES.get(view_field_name, view_field_name)
+        if static_name in column_ids and static_name not in view_fields:
+            view_fields.append(static_name)
+    return view_fields or list(column_ids.keys())
+
+
+def get_id_ranges(min_id, max_id, range_size):
+    """ Splits [min_id, max_id] into consecutive (first_id, last_id) ranges of at most range_size IDs """
+    range_size = max(1, range_size)
+    return [(first_id, min(first_id + range_size - 1, max_id)) for first_id in range(min_id, max_id + 1, range_size)]
+
+
+def get_projected_fields(column_names, dataset_schema):
+    """ Static names of the list columns whose title is in the dataset schema, all of them if none is """
+    schema_column_names = set(
+        column.get(SharePointConstants.NAME_COLUMN) for column in (dataset_schema or {}).get(SharePointConstants.COLUMNS, [])
+    )
+    projected_fields = [static_name for static_name, title in column_names.items() if title in schema_column_names]
+    return projected_fields or list(column_names.keys())
+
+
+def iter_pages_ahead(get_page, is_last_page, pages_ahead=SharePointConstants.LIST_PAGES_AHEAD):
+    """
+    Yields the pages returned by get_page(previous_page), starting with get_page({}), until is_last_page(page).
+     The next page is requested by a background thread as soon as the current one is decoded, and up to
+     pages_ahead pages wait in a bounded queue for the consumer.
+    """
+    pages = Queue(maxsize=max(1, pages_ahead))
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def read_pages():
+        page = {}
+        try:
+            while True:
+                page = get_page(page)
+                if not put((page, None)) or is_last_page(page):
+                    break
+        except Exception as error:
+            put((None, error))
+            return
+        put((None, None))
+
+    reader = threading.Thread(target=read_pages)
+    reader.daemon = True
+    reader.start()
+    try:
+        while True:
+            page, error = pages.get()
+            if error is not None:
+                raise error
+            if page is None:
+                return
+            yield page
+    finally:
+        stopped.set()
+
+
 def dss_to_sharepoint_date(date):
     return format_date(date, DSSConstants.DATE_FORMAT, SharePointConstants.DATE_FORMAT)
 
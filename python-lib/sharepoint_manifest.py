@@ -0,0 +1,250 @@
+import os
+import json
+import time
+
+from sharepoint_constants import SharePointConstants
+from sharepoint_items import (
+    format_list_data_date, get_list_data_size, get_list_data_last_modified,
+    is_list_data_file, is_list_data_row_in_folder
+)
+from sharepoint_lists import build_view_xml
+from dss_constants import DSSConstants
+from common import get_lnt_path, get_value_from_path, is_same_or_child_path, get_state_key, save_json_atomically
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+MANIFEST_PATH = "path"
+MANIFEST_IS_DIRECTORY = "is_directory"
+MANIFEST_SIZE = "size"
+MANIFEST_LAST_MODIFIED = "last_modified"
+
+
+class SharePointLibraryManifest(object):
+    """
+    Local copy of the files and folders below a folder of a document library, saved in a state file together
+     with the library's change token. Each sync only applies the changes logged by SharePoint since that token (GetChanges),
+     instead of enumerating the whole folder again.
+    """
+    def __init__(self, client, library_enumerator, full_path, state_directory, min_sync_interval_sec=0):
+        self.client = client
+        self.library_enumerator = library_enumerator
+        self.full_path = get_lnt_path(full_path)
+        self.root_server_relative_path = client.get_server_relative_path(self.full_path).rstrip("/")
+        self.state_file_path = os.path.join(
+            state_directory,
+            "manifest_{}.json".format(get_state_key(client.sharepoint_origin, self.root_server_relative_path))
+        )
+        self.min_sync_interval_sec = min_sync_interval_sec
+        self.change_token = None
+        self.items = {}
+        self.items_by_path = {}
+        self.last_sync_time = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_file_path, "r") as state_file:
+                state = json.load(state_file)
+        except (IOError, OSError, ValueError) as error:
+            logger.info("SharePointLibraryManifest:no usable state in {} ({})".format(self.state_file_path, error))
+            return
+        self.change_token = state.get("change_token")
+        self.items = state.get("items", {})
+        self.index_items()
+        logger.info("SharePointLibraryManifest:{} items loaded from {}".format(len(self.items), self.state_file_path))
+
+    def save(self):
+        state_directory = os.path.dirname(self.state_file_path)
+        if not os.path.exists(state_directory):
+            os.makedirs(state_directory, exist_ok=True)
+        save_json_atomically(self.state_file_path, {"change_token": self.change_token, "items": self.items})
+
+    def invalidate(self):
+        """ Force a sync on next use, after a change made by this process """
+        self.last_sync_time = None
+
+    def sync(self):
+        if self.last_sync_time is not None and time.monotonic() - self.last_sync_time < self.min_sync_interval_sec:
+            return
+        if self.change_token is None:
+            self.rebuild()
+        else:
+            try:
+                is_up_to_date = self.apply_changes()
+            except Exception as error:
+                # Typically an expired change token
+                logger.warning("SharePointLibraryManifest:could not apply changes ({})".format(error))
+                is_up_to_date = False
+            if not is_up_to_date:
+                self.rebuild()
+        self.last_sync_time = time.monotonic()
+        self.save()
+
+    def rebuild(self):
+        logger.info("SharePointLibraryManifest:rebuilding from {}".format(self.root_server_relative_path))
+        # The token is taken before enumerating, so that changes happening meanwhile are applied on next sync
+        change_token = self.client.get_library_change_token(self.full_path)
+        view_xml = build_view_xml(
+            view_fields=SharePointConstants.LIBRARY_VIEW_FIELDS + [SharePointConstants.ID],
+            scope=SharePointConstants.SCOPE_RECURSIVE_ALL,
+            row_limit=SharePointConstants.LIST_DATA_PAGE_SIZE
+        )
+        items = {}
+        for row in self.library_enumerator.iter_rows(self.full_path, view_xml=view_xml):
+            if not is_list_data_row_in_folder(row, self.root_server_relative_path):
+                continue
+            items["{}".format(row.get(SharePointConstants.ID))] = {
+                MANIFEST_PATH: row.get(SharePointConstants.FILE_REF),
+                MANIFEST_IS_DIRECTORY: not is_list_data_file(row),
+                MANIFEST_SIZE: get_list_data_size(row),
+                MANIFEST_LAST_MODIFIED: get_list_data_last_modified(row)
+            }
+        self.items = items
+        self.change_token = change_token
+        self.index_items()
+        logger.info("SharePointLibraryManifest:{} items".format(len(self.items)))
+
+    def apply_changes(self):
+        """ Returns False if the changes can't be applied item by item and the manifest has to be rebuilt """
+        changed_item_ids = set()
+        removed_item_ids = set()
+        change_token = self.change_token
+        while True:
+            changes = self.client.get_library_changes(self.full_path, change_token)
+            if not changes:
+                break
+            previous_change_token = change_token
+            for change in changes:
+                item_id = "{}".format(change.get(SharePointConstants.ITEM_ID))
+                if change.get(SharePointConstants.CHANGE_TYPE) in SharePointConstants.CHANGE_TYPES_REMOVING_ITEM:
+                    removed_item_ids.add(item_id)
+                    changed_item_ids.discard(item_id)
+                else:
+                    changed_item_ids.add(item_id)
+                    removed_item_ids.discard(item_id)
+                change_token = get_value_from_path(change, [SharePointConstants.CHANGE_TOKEN, SharePointConstants.STRING_VALUE], change_token)
+            if len(changed_item_ids) + len(removed_item_ids) > SharePointConstants.MANIFEST_MAX_CHANGES:
+                logger.info("SharePointLibraryManifest:too many changes")
+                return False
+            if change_token == previous_change_token:
+                break
+        logger.info("SharePointLibraryManifest:{} items changed, {} removed".format(len(changed_item_ids), len(removed_item_ids)))
+        for item_id in removed_item_ids:
+            self.remove_item(item_id)
+        changed_items = self.client.get_library_items_by_ids(self.full_path, changed_item_ids)
+        for item_id in changed_item_ids:
+            previous_entry = self.items.get(item_id)
+            item = changed_items.get(item_id)
+            if item is None:
+                self.remove_item(item_id)
+                continue
+            entry = get_manifest_entry(item)
+            if previous_entry and previous_entry.get(MANIFEST_IS_DIRECTORY) and previous_entry.get(MANIFEST_PATH) != entry.get(MANIFEST_PATH):
+                # The paths of everything below a renamed or moved folder have changed too
+                logger.info("SharePointLibraryManifest:folder {} moved".format(previous_entry.get(MANIFEST_PATH)))
+                return False
+            if is_same_or_child_path(entry.get(MANIFEST_PATH) or "", self.root_server_relative_path):
+                self.items[item_id] = entry
+            else:
+                self.items.pop(item_id, None)
+        self.change_token = change_token
+        self.index_items()
+        return True
+
+    def remove_item(self, item_id):
+        entry = self.items.pop(item_id, None)
+        if entry and entry.get(MANIFEST_IS_DIRECTORY):
+            # Only the folder itself is logged when a folder is deleted
+            folder_path = entry.get(MANIFEST_PATH)
+            self.items = {
+                other_item_id: other_entry for other_item_id, other_entry in self.items.items()
+                if not is_same_or_child_path(other_entry.get(MANIFEST_PATH) or "", folder_path)
+            }
+
+    def index_items(self):
+        self.items_by_path = {}
+        for entry in self.items.values():
+            self.items_by_path[get_path_key(entry.get(MANIFEST_PATH))] = entry
+
+    def list_files(self, path, full_path, first_non_empty=False):
+        self.sync()
+        folder_server_relative_path = self.client.get_server_relative_path(full_path).rstrip("/")
+        paths = []
+        for entry in self.items.values():
+            entry_path = entry.get(MANIFEST_PATH) or ""
+            if entry.get(MANIFEST_IS_DIRECTORY) or not is_child_path_key(entry_path, folder_server_relative_path):
+                continue
+            paths.append({
+                DSSConstants.PATH: get_lnt_path(os.path.join(path, entry_path[len(folder_server_relative_path):].strip("/"))),
+                DSSConstants.LAST_MODIFIED: entry.get(MANIFEST_LAST_MODIFIED),
+                DSSConstants.SIZE: entry.get(MANIFEST_SIZE)
+            })
+            if first_non_empty:
+                break
+        return paths
+
+    def browse(self, path, full_path):
+        self.sync()
+        folder_server_relative_path = self.client.get_server_relative_path(full_path).rstrip("/")
+        if get_path_key(folder_server_relative_path) == get_path_key(self.root_server_relative_path):
+            entry = {MANIFEST_IS_DIRECTORY: True, MANIFEST_SIZE: 0}
+        else:
+            entry = self.items_by_path.get(get_path_key(folder_server_relative_path))
+        if entry is None:
+            return {
+                DSSConstants.FULL_PATH: None,
+                DSSConstants.EXISTS: False
+            }
+        if not entry.get(MANIFEST_IS_DIRECTORY):
+            return {
+                DSSConstants.FULL_PATH: get_lnt_path(path),
+                DSSConstants.EXISTS: True,
+                DSSConstants.SIZE: entry.get(MANIFEST_SIZE),
+                DSSConstants.LAST_MODIFIED: entry.get(MANIFEST_LAST_MODIFIED),
+                DSSConstants.DIRECTORY: False
+            }
+        children = []
+        for child in self.items.values():
+            child_path = child.get(MANIFEST_PATH) or ""
+            parent_path, child_name = child_path.rsplit("/", 1) if "/" in child_path else ("", child_path)
+            if get_path_key(parent_path) != get_path_key(folder_server_relative_path):
+                continue
+            children.append({
+                DSSConstants.FULL_PATH: get_lnt_path(os.path.join(path, child_name)),
+                DSSConstants.EXISTS: True,
+                DSSConstants.DIRECTORY: child.get(MANIFEST_IS_DIRECTORY),
+                DSSConstants.SIZE: child.get(MANIFEST_SIZE),
+                DSSConstants.LAST_MODIFIED: child.get(MANIFEST_LAST_MODIFIED)
+            })
+        return {
+            DSSConstants.FULL_PATH: get_lnt_path(path),
+            DSSConstants.EXISTS: True,
+            DSSConstants.DIRECTORY: True,
+            DSSConstants.SIZE: 0,
+            DSSConstants.CHILDREN: children
+        }
+
+
+def get_manifest_entry(item):
+    """ Manifest entry of a list item retrieved with LIBRARY_ITEM_SELECT """
+    is_directory = not is_list_data_file(item)
+    file_properties = item.get(SharePointConstants.FILE_PROPERTY) or {}
+    return {
+        MANIFEST_PATH: item.get(SharePointConstants.FILE_REF),
+        MANIFEST_IS_DIRECTORY: is_directory,
+        MANIFEST_SIZE: 0 if is_directory else int(file_properties.get(SharePointConstants.LENGTH) or 0),
+        MANIFEST_LAST_MODIFIED: format_list_data_date(item.get(SharePointConstants.MODIFIED))
+    }
+
+
+def get_path_key(server_relative_path):
+    # SharePoint paths are case insensitive
+    return get_lnt_path(server_relative_path or "").lower()
+
+
+def is_child_path_key(path, folder_path):
+    path_key = get_path_key(path)
+    folder_path_key = get_path_key(folder_path)
+    return path_key != folder_path_key and is_same_or_child_path(path_key, folder_path_key)
@@ -0,0 +1,135 @@
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from sharepoint_constants import SharePointConstants
+from dss_constants import DSSConstants
+from common import get_lnt_path
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class SharePointReadPrefetcher(object):
+    """
+    Downloads the files of the last enumeration in the background, in enumeration order, so that the read calls
+     which usually follow can be served from local buffers. At most files_ahead files are downloaded or buffered at any time,
+     each in a spool file staying in memory up to spool_max_memory_size bytes.
+     Once closed, the queued downloads are cancelled and the running ones stop at their next chunk.
+    """
+    def __init__(self, download_file, files_ahead, spool_max_memory_size):
+        self.download_file = download_file
+        self.files_ahead = max(1, files_ahead)
+        self.spool_max_memory_size = spool_max_memory_size
+        self.executor = ThreadPoolExecutor(max_workers=self.files_ahead)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.full_paths = []
+        self.positions = {}
+        self.next_position = 0
+        self.downloads = {}
+        self.hits = 0
+        self.misses = 0
+
+    def schedule(self, full_paths):
+        with self.lock:
+            self.drop_downloads(list(self.downloads.keys()))
+            self.full_paths = [get_lnt_path(full_path) for full_path in full_paths]
+            self.positions = {full_path: position for position, full_path in enumerate(self.full_paths)}
+            self.next_position = 0
+            self.start_downloads()
+        logger.info("SharePointReadPrefetcher:{} files scheduled".format(len(self.full_paths)))
+
+    def read(self, full_path, stream):
+        """ Copy the prefetched content of full_path into stream, returns False if it was not prefetched """
+        full_path = get_lnt_path(full_path)
+        with self.lock:
+            download = self.downloads.pop(full_path, None)
+            position = self.positions.get(full_path)
+            if download is None and position is not None and position >= self.next_position:
+                # Read out of order, prefetching resumes after this file
+                self.drop_downloads([
+                    prefetched_path for prefetched_path in self.downloads if self.positions.get(prefetched_path, 0) < position
+                ])
+                self.next_position = position + 1
+            self.start_downloads()
+            if download is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+        try:
+            spool = download.result()
+        except Exception as error:
+            logger.warning("SharePointReadPrefetcher:prefetching {} failed ({})".format(full_path, error))
+            return False
+        if spool is None:
+            return False
+        with spool:
+            shutil.copyfileobj(spool, stream, SharePointConstants.FILE_UPLOAD_COPY_BUFFER_SIZE)
+        return True
+
+    def clear(self):
+        """ Forget the scheduled files, after a change in the folder """
+        with self.lock:
+            self.drop_downloads(list(self.downloads.keys()))
+            self.full_paths = []
+            self.positions = {}
+            self.next_position = 0
+
+    def close(self):
+        self.stop_event.set()
+        self.clear()
+        self.executor.shutdown(wait=True)
+        logger.info("SharePointReadPrefetcher:{} reads served from prefetch, {} missed".format(self.hits, self.misses))
+
+    def start_downloads(self):
+        if self.stop_event.is_set():
+            return
+        while len(self.downloads) < self.files_ahead and self.next_position < len(self.full_paths):
+            full_path = self.full_paths[self.next_position]
+            self.next_position += 1
+            self.downloads[full_path] = self.executor.submit(self.prefetch, full_path)
+
+    def drop_downloads(self, full_paths):
+        for full_path in full_paths:
+            download = self.downloads.pop(full_path)
+            if not download.cancel():
+                download.add_done_callback(close_spool)
+
+    def prefetch(self, full_path):
+        if self.stop_event.is_set():
+            return None
+        spool = SpooledTemporaryFile(max_size=self.spool_max_memory_size)
+        try:
+            self.download_file(full_path, StoppableWriter(spool, self.stop_event))
+        except Exception:
+            spool.close()
+            if self.stop_event.is_set():
+                return None
+            raise
+        spool.seek(0)
+        return spool
+
+
+class PrefetchStopped(Exception):
+    pass
+
+
+class StoppableWriter(object):
+    """ Writes to stream until stop_event is set, then interrupts the download with PrefetchStopped """
+    def __init__(self, stream, stop_event):
+        self.stream = stream
+        self.stop_event = stop_event
+
+    def write(self, data):
+        if self.stop_event.is_set():
+            raise PrefetchStopped()
+        return self.stream.write(data)
+
+
+def close_spool(download):
+    if download.cancelled() or download.exception() is not None or download.result() is None:
+        return
+    download.result().close()
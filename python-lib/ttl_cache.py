@@ -0,0 +1,67 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    Thread safe LRU cache whose entries expire ttl_sec seconds after being stored.
+     A ttl_sec of 0 disables the cache.
+    """
+    def __init__(self, ttl_sec=30, max_entries=1000):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_enabled(self):
+        return self.ttl_sec > 0 and self.max_entries > 0
+
+    def get(self, key):
+        """ Returns a (is_cached, value) tuple """
+        if not self.is_enabled():
+            return False, None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expiry_time, value = entry
+            if expiry_time < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value):
+        if not self.is_enabled():
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_sec, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        """ Remove all the entries whose key matches the predicate """
+        with self.lock:
+            keys_to_remove = [key for key in self.entries if predicate(key)]
+            for key in keys_to_remove:
+                del self.entries[key]
+        return len(keys_to_remove)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_statistics(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries)
+            }
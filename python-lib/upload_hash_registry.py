@@ -0,0 +1,39 @@
+import os
+import json
+
+from common import save_json_atomically
+from dss_constants import DSSConstants
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("sharepoint-online plugin", DSSConstants.SECRET_PARAMETERS_KEYS)
+
+
+class UploadHashRegistry(object):
+    """
+    Size, content hash and resulting ETag of the files uploaded by the plugin, one small state file per remote file.
+     A remote file whose ETag still matches the one recorded after the upload has not been modified since,
+     so its content is known to have the recorded hash.
+    """
+    def __init__(self, registry_directory):
+        self.registry_directory = registry_directory
+        os.makedirs(self.registry_directory, exist_ok=True)
+
+    def get(self, key):
+        try:
+            with open(self.get_entry_path(key), "r") as entry_file:
+                return json.load(entry_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, size, content_hash, etag):
+        save_json_atomically(self.get_entry_path(key), {"size": size, "hash": content_hash, "etag": etag})
+
+    def remove(self, key):
+        try:
+            os.remove(self.get_entry_path(key))
+        except OSError:
+            pass
+
+    def get_entry_path(self, key):
+        return os.path.join(self.registry_directory, key + ".json")
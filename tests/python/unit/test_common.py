@@ -1,6 +1,14 @@
-from common import get_value_from_path, is_request_performed, decode_retry_after_header
+from common import (
+    get_value_from_path, is_request_performed, decode_retry_after_header, is_limited, FileSliceReader, rewind_request_body,
+    is_same_or_child_path, get_range_header, get_content_range_size, copy_and_hash, ThrottlingGate, parse_batch_response
+)
+from common import get_state_key, save_json_atomically
 from sharepoint_constants import SharePointConstants
 import pytest
+import io
+import hashlib
+import json
+import os
 
 
 class MockResponse:
@@ -85,3 +93,124 @@ class TestCommonMethods:
     def test_decode_retry_after_header_no_header(self):
         seconds_before_retry = decode_retry_after_header(self.mock_response_http_429_no_header)
         assert seconds_before_retry == SharePointConstants.DEFAULT_WAIT_BEFORE_RETRY
+
+    def test_is_limited(self):
+        assert is_limited(100) is True
+        assert is_limited(-1) is False
+        assert is_limited(None) is False
+
+    def test_file_slice_reader(self):
+        file_handle = io.BytesIO(b"0123456789")
+        file_slice = FileSliceReader(file_handle, 2, 5)
+        assert len(file_slice) == 5
+        assert file_slice.read(3) == b"234"
+        assert file_slice.read() == b"56"
+        assert file_slice.read() == b""
+
+    def test_file_slice_reader_rewind(self):
+        file_handle = io.BytesIO(b"0123456789")
+        file_slice = FileSliceReader(file_handle, 8, 5)
+        assert file_slice.read() == b"89"
+        rewind_request_body(file_slice)
+        assert file_slice.tell() == 0
+        assert file_slice.read() == b"89"
+
+    def test_copy_and_hash(self):
+        destination = io.BytesIO()
+        content_hash = copy_and_hash(io.BytesIO(b"0123456789"), destination, 4)
+        assert destination.getvalue() == b"0123456789"
+        assert content_hash == hashlib.sha256(b"0123456789").hexdigest()
+
+    def test_throttling_gate(self):
+        throttling_gate = ThrottlingGate()
+        assert throttling_gate.wait() == 0
+        throttling_gate.delay(0.05)
+        throttling_gate.delay(0.01)
+        assert throttling_gate.wait() > 0.02
+        assert throttling_gate.wait() == 0
+
+    def test_parse_batch_response(self):
+        content = "\r\n".join([
+            "--batchresponse_1",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            "HTTP/1.1 200 OK",
+            "CONTENT-TYPE: application/json;odata=verbose;charset=utf-8",
+            "",
+            '{"d":{"FileSystemObjectType":0}}',
+            "--batchresponse_1",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            "HTTP/1.1 404 Not Found",
+            "CONTENT-TYPE: application/json;odata=verbose;charset=utf-8",
+            "",
+            '{"error":{"code":"-2147024894"}}',
+            "--batchresponse_1",
+            "Content-Type: application/http",
+            "",
+            "HTTP/1.1 204 No Content",
+            "",
+            "--batchresponse_1--",
+            ""
+        ]).encode("utf-8")
+        parts = parse_batch_response(content)
+        assert parts[0] == (200, {"d": {"FileSystemObjectType": 0}})
+        assert parts[1][0] == 404
+        assert parts[2] == (204, None)
+        assert len(parts) == 3
+
+    def test_parse_batch_response_changeset(self):
+        content = "\r\n".join([
+            "--batchresponse_1",
+            "Content-Type: multipart/mixed; boundary=changesetresponse_2",
+            "",
+            "--changesetresponse_2",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            "HTTP/1.1 200 OK",
+            "",
+            "--changesetresponse_2",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            "HTTP/1.1 400 Bad Request",
+            "CONTENT-TYPE: application/json;odata=verbose;charset=utf-8",
+            "",
+            '{"error":{"message":{"value":"The file is not checked out."}}}',
+            "--changesetresponse_2--",
+            "--batchresponse_1--",
+            ""
+        ])
+        parts = parse_batch_response(content)
+        assert [status for status, json_body in parts] == [200, 400]
+        assert parts[1][1]["error"]["message"]["value"] == "The file is not checked out."
+
+    def test_is_same_or_child_path(self):
+        assert is_same_or_child_path("/a/b", "/a") is True
+        assert is_same_or_child_path("/a", "/a/") is True
+        assert is_same_or_child_path("/ab", "/a") is False
+        assert is_same_or_child_path("/ab", "/") is True
+
+    def test_get_range_header(self):
+        assert get_range_header(0, 100) == "bytes=0-99"
+        assert get_range_header(10, 1) == "bytes=10-10"
+        assert get_range_header(10) == "bytes=10-"
+
+    def test_get_content_range_size(self):
+        assert get_content_range_size("bytes 0-99/1234") == 1234
+        assert get_content_range_size("bytes 0-99/*") is None
+        assert get_content_range_size(None) is None
+
+    def test_get_state_key(self):
+        assert get_state_key("https://tenant.sharepoint.com", "/sites/site") == hashlib.sha1(b"https://tenant.sharepoint.com|/sites/site").hexdigest()
+
+    def test_save_json_atomically(self, tmp_path):
+        file_path = os.path.join(str(tmp_path), "state.json")
+        save_json_atomically(file_path, {"a": 1})
+        save_json_atomically(file_path, {"a": 2})
+        with open(file_path, "r") as json_file:
+            assert json.load(json_file) == {"a": 2}
+        assert os.listdir(str(tmp_path)) == ["state.json"]
@@ -0,0 +1,54 @@
+import os
+import time
+from io import BytesIO
+
+from file_content_cache import FileContentCache
+from common import get_state_key
+
+
+class TestFileContentCacheMethods:
+    def write_entry(self, cache, key, etag, content):
+        with cache.writer(key, etag) as cache_file:
+            cache_file.write(content)
+
+    def test_write_and_read(self, tmp_path):
+        cache = FileContentCache(str(tmp_path), 100)
+        key = get_state_key("https://tenant.sharepoint.com", "/sites/site/Docs/a.csv")
+        self.write_entry(cache, key, '"{etag},1"', b"a,b\n1,2\n")
+        assert cache.get_etag(key) == '"{etag},1"'
+        stream = BytesIO()
+        assert cache.copy_to(key, '"{etag},1"', stream) is True
+        assert stream.getvalue() == b"a,b\n1,2\n"
+        assert cache.copy_to(key, '"{etag},2"', BytesIO()) is False
+
+    def test_replace_entry(self, tmp_path):
+        cache = FileContentCache(str(tmp_path), 100)
+        self.write_entry(cache, "key", "1", b"old")
+        self.write_entry(cache, "key", "2", b"new")
+        stream = BytesIO()
+        assert cache.copy_to("key", "2", stream) is True
+        assert stream.getvalue() == b"new"
+        assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".data")]) == 1
+
+    def test_failed_write_is_not_published(self, tmp_path):
+        cache = FileContentCache(str(tmp_path), 100)
+        try:
+            with cache.writer("key", "1") as cache_file:
+                cache_file.write(b"partial")
+                raise IOError("connection lost")
+        except IOError:
+            pass
+        assert cache.get_etag("key") is None
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_lru_eviction(self, tmp_path):
+        cache = FileContentCache(str(tmp_path), 10)
+        self.write_entry(cache, "first", "1", b"12345")
+        self.write_entry(cache, "second", "1", b"12345")
+        past_time = time.time() - 60
+        os.utime(cache.get_metadata_path("second"), (past_time, past_time))
+        cache.copy_to("first", "1", BytesIO())
+        self.write_entry(cache, "third", "1", b"12345")
+        assert cache.get_etag("first") == "1"
+        assert cache.get_etag("second") is None
+        assert cache.get_etag("third") == "1"
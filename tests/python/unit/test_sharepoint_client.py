@@ -0,0 +1,409 @@
+import io
+import json
+import time
+import pytest
+
+import sharepoint_client
+from sharepoint_client import SharePointClient, SharePointClientError
+from upload_hash_registry import UploadHashRegistry
+from file_content_cache import FileContentCache
+from common import get_state_key
+from dss_constants import DSSConstants
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, json_content=None, content=b"", headers=None):
+        self.status_code = status_code
+        self.json_content = json_content
+        self.content = json.dumps(json_content).encode("utf-8") if json_content is not None else content
+        self.headers = headers or {}
+        self.url = "https://tenant.sharepoint.com/fake"
+
+    def json(self):
+        return self.json_content
+
+    def iter_content(self, chunk_size=1):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+    """ Records the requests sent by the client and answers them with get_response(verb, url, kwargs) """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        return self.send("get", url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self.send("post", url, kwargs)
+
+    def send(self, verb, url, kwargs):
+        self.requests.append((verb, url, kwargs))
+        return self.get_response(verb, url, kwargs)
+
+
+def get_range_response(content, kwargs):
+    """ Answers a Range request on content, such as bytes=4-7 or bytes=4- """
+    first_byte, last_byte = kwargs["headers"]["Range"][len("bytes="):].split("-")
+    first_byte = int(first_byte)
+    last_byte = min(int(last_byte), len(content) - 1) if last_byte else len(content) - 1
+    return FakeResponse(
+        status_code=206,
+        content=content[first_byte:last_byte + 1],
+        headers={"Content-Range": "bytes {}-{}/{}".format(first_byte, last_byte, len(content))}
+    )
+
+
+def get_batch_response(statuses):
+    lines = ["--batchresponse_1", "Content-Type: multipart/mixed; boundary=changesetresponse_2", ""]
+    for status in statuses:
+        lines.extend(["--changesetresponse_2", "Content-Type: application/http", "", "HTTP/1.1 {} Status".format(status), ""])
+    lines.extend(["--changesetresponse_2--", "--batchresponse_1--", ""])
+    return FakeResponse(content="\r\n".join(lines).encode("utf-8"))
+
+
+def get_read_batch_response(json_bodies, statuses=None):
+    lines = []
+    for json_body, status in zip(json_bodies, statuses or ["200 OK"] * len(json_bodies)):
+        lines.extend(["--batchresponse_1", "Content-Type: application/http", "", "HTTP/1.1 {}".format(status)])
+        lines.extend(["Content-Type: application/json", "", json.dumps(json_body)])
+    lines.extend(["--batchresponse_1--", ""])
+    return FakeResponse(content="\r\n".join(lines).encode("utf-8"))
+
+
+def get_listing_session():
+    """ Serves a listing of two pages, chained by their __next link """
+    def get_response(verb, url, kwargs):
+        if verb == "post":
+            return FakeResponse(json_content={})
+        if url.endswith("page_2"):
+            return FakeResponse(json_content={"d": {"results": [{"Name": "b.csv"}]}})
+        return FakeResponse(json_content={"d": {"results": [{"Name": "a.csv"}], "__next": "https://tenant.sharepoint.com/page_2"}})
+    return FakeSession(get_response)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(sharepoint_client, "get_form_digest_value", lambda *args, **kwargs: None)
+    return SharePointClient({
+        "auth_type": "oauth",
+        "sharepoint_oauth": {
+            "sharepoint_tenant": "tenant",
+            "sharepoint_site": "sites/site",
+            "sharepoint_root": "Shared Documents",
+            "sharepoint_oauth": "token"
+        }
+    })
+
+
+class TestSharePointClientMethods:
+    def test_process_batch_headers_and_body(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: get_batch_response([201, 201]))
+        client.process_batch([
+            {"verb": "post", "url": "https://tenant.sharepoint.com/a", "headers": {"Content-Type": "application/json"}, "json": {"Title": "a"}},
+            {"verb": "post", "url": "https://tenant.sharepoint.com/b"}
+        ])
+        verb, url, kwargs = client.session.requests[0]
+        assert url == "https://tenant.sharepoint.com/sites/site/_api/$batch"
+        assert kwargs["headers"]["Content-Type"].startswith('multipart/mixed;boundary="batch_')
+        assert kwargs["headers"]["Accept"] == "multipart/mixed"
+        body = kwargs["data"].decode("utf-8")
+        assert "POST https://tenant.sharepoint.com/a HTTP/1.1\r\nContent-Type: application/json\r\n" in body
+        assert '{"Title": "a"}' in body
+        assert "POST https://tenant.sharepoint.com/b HTTP/1.1\r\nAccept-Charset: UTF-8\r\n" in body
+        assert body.count("--changeset_") == 3
+
+    def test_process_batch_read_only(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(content=b""))
+        client.process_batch([{"verb": "get", "url": "https://tenant.sharepoint.com/a", "headers": {"Accept": "application/json"}}])
+        body = client.session.requests[0][2]["data"].decode("utf-8")
+        assert "changeset" not in body
+        assert "GET https://tenant.sharepoint.com/a HTTP/1.1\r\nAccept: application/json\r\n" in body
+
+    def test_flush_check_ins(self, client):
+        client.libraries_force_checkout["/sites/site/Shared Documents"] = True
+        client.session = FakeSession(lambda verb, url, kwargs: get_batch_response([200, 200]))
+        client.queue_check_in("/Shared Documents/a.csv")
+        client.queue_check_in("/Shared Documents/b.csv")
+        client.flush_check_ins()
+        body = client.session.requests[0][2]["data"].decode("utf-8")
+        assert body.count("/CheckIn()") == 2
+        assert client.pending_check_ins == []
+
+    def test_flush_check_ins_failure(self, client):
+        client.libraries_force_checkout["/sites/site/Shared Documents"] = True
+        client.session = FakeSession(lambda verb, url, kwargs: get_batch_response([200, 400]))
+        client.queue_check_in("/Shared Documents/a.csv")
+        client.queue_check_in("/Shared Documents/b.csv")
+        with pytest.raises(SharePointClientError, match="b.csv"):
+            client.flush_check_ins()
+
+    def test_upload_records_the_etag_of_the_answer(self, client, tmp_path):
+        client.libraries_force_checkout["/sites/site/Shared Documents"] = False
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(json_content={"d": {"ETag": '"{guid},1"', "Length": "3"}}))
+        upload_registry = UploadHashRegistry(str(tmp_path))
+        client.upload_file_content("/a.csv", io.BytesIO(b"abc"), upload_registry=upload_registry)
+        assert [verb for verb, url, kwargs in client.session.requests] == ["post"]
+        registry_key = get_state_key(client.sharepoint_origin, "/sites/site/Shared Documents/a.csv")
+        assert upload_registry.get(registry_key)["etag"] == '"{guid},1"'
+
+    def test_checked_in_uploads_are_recorded_by_batch(self, client, tmp_path):
+        def get_response(verb, url, kwargs):
+            if url.endswith("$batch"):
+                body = kwargs["data"].decode("utf-8")
+                if "CheckIn" in body:
+                    return get_batch_response([200])
+                return get_read_batch_response([{"ETag": '"{guid},2"'}])
+            if verb == "get":
+                return FakeResponse(status_code=404, json_content={})
+            return FakeResponse(json_content={"d": {"ETag": '"{guid},1"'}})
+        client.libraries_force_checkout["/sites/site/Shared Documents"] = True
+        client.session = FakeSession(get_response)
+        upload_registry = UploadHashRegistry(str(tmp_path))
+        client.upload_file_content("/a.csv", io.BytesIO(b"abc"), upload_registry=upload_registry)
+        client.queue_check_in("/a.csv")
+        client.flush_check_ins()
+        registry_key = get_state_key(client.sharepoint_origin, "/sites/site/Shared Documents/a.csv")
+        assert upload_registry.get(registry_key)["etag"] == '"{guid},2"'
+        assert [url.endswith("$batch") for verb, url, kwargs in client.session.requests[-2:]] == [True, True]
+
+    def test_run_bulk_transfer_keeps_the_order(self):
+        def transfer_file(full_path, stream):
+            # The first files are the last ones to complete
+            time.sleep(0.01 * (3 - int(stream)))
+            return full_path
+        results = SharePointClient.run_bulk_transfer(transfer_file, [("/a.csv", 0), ("/b.csv", 1), ("/c.csv", 2)], 3)
+        assert results == ["/a.csv", "/b.csv", "/c.csv"]
+
+    def test_download_files_partial_failure(self, client):
+        downloaded_paths = []
+
+        def download_file_content(full_path, stream):
+            if full_path == "/b.csv":
+                raise SharePointClientError("Error 500 while downloading /b.csv")
+            time.sleep(0.01)
+            stream.write(b"abc")
+            downloaded_paths.append(full_path)
+            return 3
+        client.download_file_content = download_file_content
+        streams = [io.BytesIO(), io.BytesIO(), io.BytesIO()]
+        with pytest.raises(SharePointClientError, match="b.csv"):
+            client.download_files(zip(["/a.csv", "/b.csv", "/c.csv"], streams), max_workers=3)
+        # The other files are completed before the error is raised
+        assert sorted(downloaded_paths) == ["/a.csv", "/c.csv"]
+        assert [stream.getvalue() for stream in streams] == [b"abc", b"", b"abc"]
+
+    def test_upload_files_partial_failure(self, client):
+        def get_response(verb, url, kwargs):
+            body = kwargs["data"].decode("utf-8")
+            if "CheckIn" in body:
+                return get_batch_response([200] * body.count("CheckIn"))
+            # None of the files exists yet
+            return get_read_batch_response([{"d": None}] * body.count("GET "))
+
+        def upload_file_content(full_path, stream, upload_registry=None):
+            if full_path == "/b.csv":
+                raise SharePointClientError("Error 500 while uploading /b.csv")
+            time.sleep(0.01 * len(stream.getvalue()))
+            return full_path
+        client.libraries_force_checkout["/sites/site/Shared Documents"] = True
+        client.session = FakeSession(get_response)
+        client.create_path = lambda full_path: None
+        client.upload_file_content = upload_file_content
+        assert client.upload_files([("/a.csv", io.BytesIO(b"abc")), ("/c.csv", io.BytesIO(b"c"))]) == ["/a.csv", "/c.csv"]
+        with pytest.raises(SharePointClientError, match="b.csv"):
+            client.upload_files([("/d.csv", io.BytesIO(b"d")), ("/b.csv", io.BytesIO(b"b"))])
+        # The existence of the files is resolved by batch, the uploaded ones are checked in even when another upload failed
+        check_in_bodies = [kwargs["data"].decode("utf-8") for verb, url, kwargs in client.session.requests if b"CheckIn" in kwargs["data"]]
+        assert len(check_in_bodies) == 2
+        assert "/a.csv" in check_in_bodies[0] and "/c.csv" in check_in_bodies[0]
+        assert "/d.csv" in check_in_bodies[1] and "/b.csv" not in check_in_bodies[1]
+        assert client.pending_check_ins == []
+
+    def test_download_file_content_limit(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: get_range_response(b"0123456789", kwargs))
+        client.download_chunk_size = 3
+        stream = io.BytesIO()
+        assert client.download_file_content("/a.csv", stream, limit=5) == 5
+        assert stream.getvalue() == b"01234"
+        assert client.session.requests[0][2]["headers"] == {"Range": "bytes=0-4"}
+
+    def test_download_file_content_past_the_end(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(status_code=416))
+        stream = io.BytesIO()
+        assert client.download_file_content("/a.csv", stream, limit=5, offset=20) == 0
+        assert stream.getvalue() == b""
+
+    def test_download_file_content_range_ignored(self, client):
+        # The server answers 200 with the whole file, the leading bytes are skipped and the rest cut at the limit
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(content=b"0123456789"))
+        client.download_chunk_size = 2
+        stream = io.BytesIO()
+        assert client.download_file_content("/a.csv", stream, limit=4, offset=3) == 4
+        assert stream.getvalue() == b"3456"
+        assert client.session.requests[0][2]["headers"] == {"Range": "bytes=3-6"}
+
+    def test_download_cached_file_content(self, client, tmp_path):
+        versions = {'"v1"': b"abc", '"v2"': b"abcd"}
+        current_etag = ['"v1"']
+
+        def get_response(verb, url, kwargs):
+            if kwargs["headers"].get("If-None-Match") == current_etag[0]:
+                return FakeResponse(status_code=304)
+            return FakeResponse(content=versions[current_etag[0]], headers={"ETag": current_etag[0]})
+        client.session = FakeSession(get_response)
+        content_cache = FileContentCache(str(tmp_path), 1048576)
+        cache_key = get_state_key(client.sharepoint_origin, "/sites/site/Shared Documents/a.csv")
+        streams = [io.BytesIO() for download in range(4)]
+        client.download_cached_file_content("/a.csv", streams[0], content_cache)
+        assert content_cache.get_etag(cache_key) == '"v1"'
+        # 304, the cached bytes are served
+        client.download_cached_file_content("/a.csv", streams[1], content_cache)
+        assert client.session.requests[1][2]["headers"] == {"If-None-Match": '"v1"'}
+        current_etag[0] = '"v2"'
+        # 200, the new bytes are served and replace the cache entry
+        client.download_cached_file_content("/a.csv", streams[2], content_cache)
+        assert client.session.requests[2][2]["headers"] == {"If-None-Match": '"v1"'}
+        assert content_cache.get_etag(cache_key) == '"v2"'
+        client.download_cached_file_content("/a.csv", streams[3], content_cache)
+        assert client.session.requests[3][2]["headers"] == {"If-None-Match": '"v2"'}
+        assert [stream.getvalue() for stream in streams] == [b"abc", b"abc", b"abcd", b"abcd"]
+        assert len(client.session.requests) == 4
+
+    def test_parallel_download_follows_the_size_of_the_first_part(self, client):
+        content = b"0123456789"
+        client.session = FakeSession(lambda verb, url, kwargs: get_range_response(content, kwargs))
+        client.download_max_workers = 2
+        client.download_part_size = 4
+        stream = io.BytesIO()
+        # The file grew since its size was cached
+        assert client.download_file_content_in_parallel("/a.csv", stream, 6) == 10
+        assert stream.getvalue() == content
+        assert [kwargs["headers"]["Range"] for verb, url, kwargs in client.session.requests] == ["bytes=0-3", "bytes=4-7", "bytes=8-9"]
+
+    def test_parallel_download_of_a_shrunk_file(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: get_range_response(b"012", kwargs))
+        client.download_max_workers = 2
+        client.download_part_size = 4
+        stream = io.BytesIO()
+        assert client.download_file_content_in_parallel("/a.csv", stream, 10) == 3
+        assert stream.getvalue() == b"012"
+        assert len(client.session.requests) == 1
+
+    def test_iter_listing_pages_caches_complete_listings(self, client):
+        client.session = get_listing_session()
+        pages = list(client.iter_listing_pages("/folder", "Files"))
+        assert pages == [[{"Name": "a.csv"}], [{"Name": "b.csv"}]]
+        assert len(client.session.requests) == 2
+        # The cached listing is served as a single page
+        assert list(client.iter_listing_pages("/folder", "Files")) == [[{"Name": "a.csv"}, {"Name": "b.csv"}]]
+        assert len(client.session.requests) == 2
+
+    def test_iter_listing_pages_abandoned_is_not_cached(self, client):
+        client.session = get_listing_session()
+        pages = client.iter_listing_pages("/folder", "Files")
+        assert next(pages) == [{"Name": "a.csv"}]
+        pages.close()
+        assert len(list(client.iter_listing_pages("/folder", "Files"))) == 2
+        assert len(client.session.requests) == 3
+
+    def test_iter_listing_pages_invalidated_on_write(self, client):
+        client.session = get_listing_session()
+        list(client.iter_listing_pages("/folder", "Files"))
+        list(client.iter_listing_pages("/other_folder", "Files"))
+        client.recycle_file("/folder/a.csv")
+        list(client.iter_listing_pages("/folder", "Files"))
+        list(client.iter_listing_pages("/other_folder", "Files"))
+        assert [url.endswith("page_2") for verb, url, kwargs in client.session.requests if verb == "get"] == [False, True, False, True, False, True]
+
+    def test_resolve_path_file(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(json_content={"d": {
+            "FileSystemObjectType": 0, "File": {"Length": "12", "TimeLastModified": "1970-01-01T00:00:01Z"}
+        }}))
+        assert client.resolve_path("/a.csv") == {DSSConstants.IS_DIRECTORY: False, DSSConstants.SIZE: 12, DSSConstants.LAST_MODIFIED: 1000}
+        assert len(client.session.requests) == 1
+        assert "GetListItemUsingPath" in client.session.requests[0][1]
+        assert client.is_known_folder("/a.csv") is False
+
+    def test_resolve_path_folder(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(json_content={"d": {
+            "FileSystemObjectType": 1, "Folder": {"TimeLastModified": "1970-01-01T00:00:02Z"}
+        }}))
+        assert client.resolve_path("/folder") == {DSSConstants.IS_DIRECTORY: True, DSSConstants.SIZE: 0, DSSConstants.LAST_MODIFIED: 2000}
+        assert client.is_known_folder("/folder") is True
+
+    def test_resolve_path_not_found(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(status_code=404, json_content={}))
+        assert client.resolve_path("/missing.csv") is None
+        assert len(client.session.requests) == 1
+
+    def test_resolve_path_errors_are_raised(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(status_code=403, json_content={}))
+        with pytest.raises(SharePointClientError):
+            client.resolve_path("/a.csv")
+        assert len(client.session.requests) == 1
+
+    def test_resolve_path_library_root(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(json_content={"d": {"Exists": True, "TimeLastModified": "1970-01-01T00:00:03Z"}}))
+        assert client.resolve_path("/") == {DSSConstants.IS_DIRECTORY: True, DSSConstants.SIZE: 0, DSSConstants.LAST_MODIFIED: 3000}
+        assert len(client.session.requests) == 1
+        assert "GetListItemUsingPath" not in client.session.requests[0][1]
+
+    def test_is_library_root(self, client):
+        assert client.is_library_root("/") is True
+        assert client.is_library_root("") is True
+        assert client.is_library_root("/folder") is False
+        client.sharepoint_root = ""
+        assert client.is_library_root("/Documents") is True
+        assert client.is_library_root("/Documents/folder") is False
+
+    def test_resolve_paths_by_batch(self, client):
+        def get_response(verb, url, kwargs):
+            if url.endswith("$batch"):
+                return get_read_batch_response(
+                    [
+                        {"d": {"FileSystemObjectType": 0, "File": {"Length": "12", "TimeLastModified": "1970-01-01T00:00:01Z"}}},
+                        {"error": {"message": {"value": "File Not Found."}}},
+                        {"d": {"FileSystemObjectType": 1, "Folder": {"TimeLastModified": "1970-01-01T00:00:02Z"}}}
+                    ],
+                    statuses=["200 OK", "404 Not Found", "200 OK"]
+                )
+            return FakeResponse(json_content={"d": {"Exists": True, "TimeLastModified": "1970-01-01T00:00:03Z"}})
+        client.session = FakeSession(get_response)
+        items = client.resolve_paths(["/a.csv", "/missing.csv", "/folder", "/"])
+        assert items == {
+            "/a.csv": {DSSConstants.IS_DIRECTORY: False, DSSConstants.SIZE: 12, DSSConstants.LAST_MODIFIED: 1000},
+            "/missing.csv": None,
+            "/folder": {DSSConstants.IS_DIRECTORY: True, DSSConstants.SIZE: 0, DSSConstants.LAST_MODIFIED: 2000},
+            "/": {DSSConstants.IS_DIRECTORY: True, DSSConstants.SIZE: 0, DSSConstants.LAST_MODIFIED: 3000}
+        }
+        # The library root has no list item, it is looked up on its own
+        assert len(client.session.requests) == 2
+        batch_body = [kwargs["data"] for verb, url, kwargs in client.session.requests if url.endswith("$batch")][0].decode("utf-8")
+        assert batch_body.count("GetListItemUsingPath") == 3
+        assert client.is_known_folder("/folder") is True
+        # The missing file is cached as well
+        assert client.resolve_path("/missing.csv") is None
+        assert len(client.session.requests) == 2
+
+    def test_create_path_skips_known_folders(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(json_content={}))
+        client.add_known_folders(["/a"])
+        client.create_path("/a/b/c.csv")
+        assert len(client.session.requests) == 1
+        assert "/a/b" in client.session.requests[0][1]
+        assert client.is_known_folder("/a/b") is True
+        client.create_path("/a/b/d.csv")
+        assert len(client.session.requests) == 1
+
+    def test_create_path_retries_failed_folders(self, client):
+        client.session = FakeSession(lambda verb, url, kwargs: FakeResponse(status_code=403, json_content={}))
+        client.create_path("/a/c.csv")
+        client.create_path("/a/d.csv")
+        assert len(client.session.requests) == 2
+        assert client.is_known_folder("/a") is False
@@ -0,0 +1,159 @@
+import threading
+import time
+
+from sharepoint_enumeration import SharePointSearchEnumerator, SharePointFolderCrawler, SharePointLibraryEnumerator, get_extension_query
+from sharepoint_client import SharePointListViewThresholdError
+from dss_constants import DSSConstants
+
+
+class FakeClient(object):
+    def __init__(self, paths):
+        self.paths = paths
+
+    def get_absolute_url(self, full_path):
+        return "https://tenant.sharepoint.com/sites/site/Shared%20Documents" + full_path
+
+    def search_files(self, full_path, query_text="", start_row=0, row_limit=500):
+        cells = [[{"Key": "Path", "Value": path}, {"Key": "Size", "Value": "3"}] for path in self.paths]
+        return {"PrimaryQueryResult": {"RelevantResults": {"Table": {"Rows": [{"Cells": row} for row in cells]}}}}
+
+
+class FakeCrawlClient(object):
+    """ Serves the listings of folders, a dict of full path to (file names, sub-folder names) """
+    def __init__(self, folders, listing_time=0):
+        self.folders = folders
+        self.listing_time = listing_time
+        self.listed_folders = []
+        self.lock = threading.Lock()
+
+    def iter_files(self, full_path, select=None):
+        with self.lock:
+            self.listed_folders.append(full_path)
+        time.sleep(self.listing_time)
+        file_names, sub_folder_names = self.folders[full_path]
+        yield [{"Name": file_name, "Length": "3", "TimeLastModified": "1970-01-01T00:00:01Z"} for file_name in file_names]
+
+    def iter_folders(self, full_path, select=None):
+        file_names, sub_folder_names = self.folders[full_path]
+        yield [{"Name": sub_folder_name, "TimeLastModified": "1970-01-01T00:00:01Z"} for sub_folder_name in sub_folder_names]
+
+
+class FakeLibraryClient(object):
+    """ Serves pages of RenderListDataAsStream rows, chained by NextHref """
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested_params = []
+
+    def get_server_relative_path(self, full_path):
+        return "/sites/site/Shared Documents" + full_path
+
+    def get_library_items(self, full_path, view_xml, params=None):
+        self.requested_params.append(params)
+        page_number = int(params.get("Page", 0))
+        page = {"Row": self.pages[page_number]}
+        if page_number + 1 < len(self.pages):
+            page["NextHref"] = "?Paged=TRUE&Page={}".format(page_number + 1)
+        return page
+
+
+def get_library_row(file_ref, fs_obj_type=0, size="3"):
+    return {
+        "FileRef": "/sites/site/Shared Documents" + file_ref,
+        "FileDirRef": "/sites/site/Shared Documents" + file_ref.rsplit("/", 1)[0],
+        "FSObjType": fs_obj_type,
+        "File_x0020_Size": size,
+        "Modified": "1970-01-01T00:00:01Z"
+    }
+
+
+class ThrottledLibraryEnumerator(object):
+    def iter_files(self, path, full_path, first_non_empty=False, view_xml=None):
+        raise SharePointListViewThresholdError("The query exceeds the list view threshold")
+        yield
+
+
+class TestSharePointFolderCrawlerMethods:
+    folders = {
+        "/root": ([], ["a", "b"]),
+        "/root/a": (["1.csv"], ["c"]),
+        "/root/b": (["2.csv", "3.csv"], []),
+        "/root/a/c": (["4.csv"], [])
+    }
+
+    def test_list_files(self):
+        crawler = SharePointFolderCrawler(FakeCrawlClient(self.folders), max_workers=3)
+        paths = sorted(file[DSSConstants.PATH] for file in crawler.list_files("/", "/root"))
+        assert paths == ["/a/1.csv", "/a/c/4.csv", "/b/2.csv", "/b/3.csv"]
+
+    def test_first_non_empty(self):
+        client = FakeCrawlClient(self.folders)
+        files = SharePointFolderCrawler(client, max_workers=1).list_files("/", "/root", first_non_empty=True)
+        assert [file[DSSConstants.PATH] for file in files] in [["/a/1.csv"], ["/b/2.csv", "/b/3.csv"]]
+        assert "/root/a/c" not in client.listed_folders
+
+    def test_closing_the_enumeration_stops_the_crawl(self):
+        folders = {"/root": ([], ["folder_{}".format(number) for number in range(20)])}
+        for number in range(20):
+            folders["/root/folder_{}".format(number)] = (["{}.csv".format(number)], [])
+        client = FakeCrawlClient(folders, listing_time=0.02)
+        files = SharePointFolderCrawler(client, max_workers=2).iter_files("/", "/root")
+        next(files)
+        files.close()
+        # The queued folders are cancelled and the running workers return without listing their sub-folders
+        assert len(client.listed_folders) < 10
+
+
+class TestSharePointLibraryEnumeratorMethods:
+    pages = [
+        [
+            get_library_row("/root/sub", fs_obj_type=1, size=""),
+            get_library_row("/root/a.csv"),
+            # Same prefix, but outside of the folder
+            get_library_row("/root_2/b.csv")
+        ],
+        [
+            get_library_row("/root/sub/c.csv", size="12")
+        ]
+    ]
+
+    def test_list_files(self):
+        client = FakeLibraryClient(self.pages)
+        files = SharePointLibraryEnumerator(client).list_files("/", "/root")
+        assert files == [
+            {DSSConstants.PATH: "/a.csv", DSSConstants.LAST_MODIFIED: 1000, DSSConstants.SIZE: 3},
+            {DSSConstants.PATH: "/sub/c.csv", DSSConstants.LAST_MODIFIED: 1000, DSSConstants.SIZE: 12}
+        ]
+        assert client.requested_params == [{}, {"Paged": "TRUE", "Page": "1"}]
+
+    def test_first_non_empty(self):
+        client = FakeLibraryClient(self.pages)
+        files = SharePointLibraryEnumerator(client).list_files("/", "/root", first_non_empty=True)
+        assert [file[DSSConstants.PATH] for file in files] == ["/a.csv"]
+        assert len(client.requested_params) == 1
+
+    def test_iter_pages(self):
+        pages = list(SharePointLibraryEnumerator(FakeLibraryClient(self.pages)).iter_pages("/root"))
+        assert [len(rows) for rows in pages] == [3, 1]
+
+
+class TestSharePointSearchEnumeratorMethods:
+    def test_get_extension_query(self):
+        assert get_extension_query("*.xlsx") == "FileExtension:xlsx"
+        assert get_extension_query("reports/*.csv") == "FileExtension:csv"
+        assert get_extension_query("data.*") == ""
+        assert get_extension_query(None) == ""
+
+    def test_list_files(self):
+        client = FakeClient([
+            "https://tenant.sharepoint.com/sites/site/Shared Documents/root/a.xlsx",
+            "https://tenant.sharepoint.com/sites/site/Shared Documents/root/sub/b.xlsx",
+            "https://tenant.sharepoint.com/sites/site/Shared Documents/root/c.csv",
+            "https://tenant.sharepoint.com/sites/site/Shared Documents/other/d.xlsx"
+        ])
+        enumerator = SharePointSearchEnumerator(client, None, glob_pattern="*.xlsx", freshness_min=0)
+        paths = [file[DSSConstants.PATH] for file in enumerator.list_files("/", "/root")]
+        assert paths == ["/a.xlsx", "/sub/b.xlsx"]
+
+    def test_iter_recent_files_above_threshold(self):
+        enumerator = SharePointSearchEnumerator(FakeClient([]), ThrottledLibraryEnumerator(), glob_pattern="*.xlsx", freshness_min=10)
+        assert list(enumerator.iter_recent_files("/", "/root", False)) == []
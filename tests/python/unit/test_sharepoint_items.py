@@ -0,0 +1,69 @@
+from sharepoint_items import (
+    get_sharepoint_items, get_item_resolution, get_next_page_url,
+    get_search_rows, format_search_date, format_list_data_value, format_epoch_to_iso
+)
+from dss_constants import DSSConstants
+
+
+class TestSharePointItemsMethods:
+    def setup_class(self):
+        self.verbose_items = {"d": {"results": [{"Name": "a.csv", "Length": "12", "TimeLastModified": "2020-01-01T00:00:00Z"}]}}
+        self.nometadata_items = {"value": [{"Name": "b.csv", "Length": "3", "TimeLastModified": "2020-01-01T00:00:00Z"}]}
+
+    def test_get_sharepoint_items_verbose(self):
+        assert get_sharepoint_items(self.verbose_items)[0]["Name"] == "a.csv"
+
+    def test_get_sharepoint_items_nometadata(self):
+        assert get_sharepoint_items(self.nometadata_items)[0]["Name"] == "b.csv"
+
+    def test_get_sharepoint_items_empty(self):
+        assert get_sharepoint_items({}) == []
+        assert get_sharepoint_items({"d": {}}) == []
+
+    def test_get_next_page_url(self):
+        assert get_next_page_url({"d": {"results": [], "__next": "https://next/verbose"}}) == "https://next/verbose"
+        assert get_next_page_url({"value": [], "odata.nextLink": "https://next/nometadata"}) == "https://next/nometadata"
+        assert get_next_page_url(self.verbose_items) is None
+        assert get_next_page_url(self.nometadata_items) is None
+
+    def test_get_item_resolution_file(self):
+        item = get_item_resolution({
+            "FileSystemObjectType": 0,
+            "File": {"Length": "12", "TimeLastModified": "2020-01-01T00:00:00Z"}
+        })
+        assert item == {
+            DSSConstants.IS_DIRECTORY: False,
+            DSSConstants.SIZE: 12,
+            DSSConstants.LAST_MODIFIED: 1577836800000
+        }
+
+    def test_get_item_resolution_folder(self):
+        item = get_item_resolution({"FileSystemObjectType": 1, "Folder": {"TimeLastModified": "2020-01-01T00:00:00Z"}})
+        assert item[DSSConstants.IS_DIRECTORY] is True
+
+    def test_get_item_resolution_no_item(self):
+        assert get_item_resolution({}) is None
+        assert get_item_resolution(None) is None
+
+    def test_get_search_rows(self):
+        cells = [{"Key": "Path", "Value": "https://t.sharepoint.com/sites/s/Docs/a.xlsx"}, {"Key": "Size", "Value": "12"}]
+        verbose_response = {"d": {"query": {"PrimaryQueryResult": {"RelevantResults": {"Table": {"Rows": {"results": [{"Cells": {"results": cells}}]}}}}}}}
+        nometadata_response = {"PrimaryQueryResult": {"RelevantResults": {"Table": {"Rows": [{"Cells": cells}]}}}}
+        for response in [verbose_response, nometadata_response]:
+            assert get_search_rows(response) == [{"Path": "https://t.sharepoint.com/sites/s/Docs/a.xlsx", "Size": "12"}]
+        assert get_search_rows({}) == []
+
+    def test_format_search_date(self):
+        assert format_search_date("2020-01-01T00:00:00.0000000Z") == 1577836800000
+        assert format_search_date(None) is None
+
+    def test_format_list_data_value(self):
+        assert format_list_data_value([{"id": "7", "title": "Jane Doe", "email": "jane@example.com"}, {"title": "John Doe"}]) == "Jane Doe, John Doe"
+        assert format_list_data_value([{"lookupId": 1, "lookupValue": "Paris"}]) == "Paris"
+        assert format_list_data_value(["a", "b"]) == "a, b"
+        assert format_list_data_value({"Url": "https://example.com"}) == '{"Url": "https://example.com"}'
+        assert format_list_data_value("text") == "text"
+
+    def test_format_epoch_to_iso(self):
+        assert format_epoch_to_iso(1577836800000) == "2020-01-01T00:00:00.000Z"
+        assert format_epoch_to_iso(None) is None
@@ -0,0 +1,76 @@
+from sharepoint_library_inventory import SharePointLibraryInventory
+
+
+class FakeInventoryClient(object):
+    """ Serves a single page of RenderListDataAsStream rows, and records the ViewXml of the query """
+    def __init__(self, rows):
+        self.rows = rows
+        self.view_xmls = []
+
+    def get_server_relative_path(self, full_path):
+        return "/sites/site/Shared Documents" + full_path
+
+    def get_library_items(self, full_path, view_xml, params=None):
+        self.view_xmls.append(view_xml)
+        return {"Row": self.rows}
+
+
+def get_inventory_row(file_ref, fs_obj_type=0, **fields):
+    row = {
+        "ID": 1,
+        "FileRef": "/sites/site/Shared Documents" + file_ref,
+        "FileLeafRef": file_ref.rsplit("/", 1)[1],
+        "FileDirRef": "/sites/site/Shared Documents" + file_ref.rsplit("/", 1)[0],
+        "FSObjType": fs_obj_type,
+        "File_x0020_Size": "12",
+        "Created": "1970-01-01T00:00:01Z",
+        "Modified.": "1970-01-01T00:00:02Z",
+        "Modified": "1/1/1970 12:00 AM",
+        "Author": [{"title": "Author Name", "email": "author@tenant.com"}],
+        "Editor": [{"title": "Editor Name", "email": "editor@tenant.com"}]
+    }
+    row.update(fields)
+    return row
+
+
+class TestSharePointLibraryInventoryMethods:
+    def test_custom_columns(self):
+        library_inventory = SharePointLibraryInventory(FakeInventoryClient([]), "/root", custom_columns=[" Department ", "", None])
+        assert library_inventory.custom_columns == ["Department"]
+        assert SharePointLibraryInventory(FakeInventoryClient([]), None).custom_columns == []
+        columns = library_inventory.get_read_schema()["columns"]
+        assert columns[-1] == {"name": "Department", "type": "string"}
+
+    def test_format_row(self):
+        library_inventory = SharePointLibraryInventory(FakeInventoryClient([]), "/root", custom_columns=["Department", "Reviewers"])
+        row = get_inventory_row(
+            "/root/sub/a.csv",
+            Department="Sales",
+            Reviewers=[{"title": "First Reviewer"}, {"title": "Second Reviewer"}]
+        )
+        assert library_inventory.format_row(row, "/sites/site/Shared Documents/root") == {
+            "path": "/sub/a.csv",
+            "name": "a.csv",
+            "folder": "/sub",
+            "size": 12,
+            "created": "1970-01-01T00:00:01.000Z",
+            "modified": "1970-01-01T00:00:02.000Z",
+            "author": "Author Name",
+            "editor": "Editor Name",
+            "id": 1,
+            "server_relative_url": "/sites/site/Shared Documents/root/sub/a.csv",
+            "Department": "Sales",
+            "Reviewers": "First Reviewer, Second Reviewer"
+        }
+
+    def test_iter_rows_skips_folders(self):
+        client = FakeInventoryClient([
+            get_inventory_row("/root/sub", fs_obj_type=1),
+            get_inventory_row("/root/sub/a.csv", Department="Sales"),
+            get_inventory_row("/root_2/b.csv")
+        ])
+        library_inventory = SharePointLibraryInventory(client, "/root", custom_columns=["Department"])
+        rows = list(library_inventory.iter_rows(records_limit=10))
+        assert [(row["path"], row["Department"]) for row in rows] == [("/sub/a.csv", "Sales")]
+        assert '<FieldRef Name="Department" />' in client.view_xmls[0]
+        assert '<RowLimit Paged="TRUE">10</RowLimit>' in client.view_xmls[0]
@@ -0,0 +1,188 @@
+import json
+import pytest
+
+import sharepoint_client
+from sharepoint_client import SharePointClient
+from sharepoint_list_reader import SharePointListReader
+
+
+class FakeResponse(object):
+    def __init__(self, json_content):
+        self.status_code = 200
+        self.json_content = json_content
+        self.content = json.dumps(json_content).encode("utf-8")
+        self.url = "https://tenant.sharepoint.com/fake"
+
+    def json(self):
+        return self.json_content
+
+
+class FakeSession(object):
+    """ Answers the default view lookups and a single page of list data, and records the requests """
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append(("get", url, kwargs))
+        if url.endswith("/DefaultView"):
+            return FakeResponse({"d": {"ViewQuery": '<Where><Eq><FieldRef Name="Status" /><Value Type="Text">Open</Value></Eq></Where>'}})
+        return FakeResponse({"d": {"Items": {"results": ["LinkTitle", "Amount0"]}}})
+
+    def post(self, url, **kwargs):
+        self.requests.append(("post", url, kwargs))
+        return FakeResponse({"ListData": {"Row": [{"ID": 1, "Title": "a", "Amount0": 1}]}})
+
+
+class FakeListClient(object):
+    """ Serves number_of_pages pages of page_size rows, and records the requests of the reader """
+    def __init__(self, number_of_pages=10, page_size=2):
+        self.number_of_pages = number_of_pages
+        self.page_size = page_size
+        self.column_ids = {"Title": "string", "Amount0": "double"}
+        self.column_names = {"Title": "Title", "Amount0": "Amount"}
+        self.dss_column_name = {"Title": "Title", "Amount0": "Amount"}
+        self.columns_to_format = []
+        self.default_view_query = ""
+        self.default_view_fields = ["LinkTitle", "Amount0"]
+        self.item_ids = set()
+        self.list_items_requests = []
+        self.number_of_schema_requests = 0
+
+    def get_read_schema(self, display_metadata=False, metadata_to_retrieve=[]):
+        self.number_of_schema_requests += 1
+        return {"columns": [{"name": "Title", "type": "string"}, {"name": "Amount", "type": "double"}]}
+
+    def get_list_default_view_query(self, list_title):
+        return self.default_view_query
+
+    def get_list_default_view(self, list_title):
+        return self.default_view_fields
+
+    def get_list_id_range(self, list_title):
+        return 1, 7000
+
+    def get_list_item_ids(self, list_title):
+        return self.item_ids
+
+    def get_list_items(self, list_title, params=None, view_xml=None):
+        self.list_items_requests.append((params, view_xml))
+        page_number = int((params or {}).get("Page", 0))
+        first_row = page_number * self.page_size
+        page = {"Row": [
+            {"ID": row, "Title": "row_{}".format(row), "Amount0": row, "Modified": "2026-10-17T08:00:00Z"}
+            for row in range(first_row, first_row + self.page_size)
+        ]}
+        if page_number + 1 < self.number_of_pages:
+            page["NextHref"] = "?Page={}".format(page_number + 1)
+        return page
+
+
+class TestSharePointListReaderMethods:
+    def test_read_schema_is_built_once(self):
+        client = FakeListClient()
+        list_reader = SharePointListReader(client, "List")
+        list_reader.get_read_schema()
+        list_reader.get_read_schema()
+        assert client.number_of_schema_requests == 1
+        list_reader.reset_read_schema()
+        list_reader.get_read_schema()
+        assert client.number_of_schema_requests == 2
+
+    def test_iter_rows(self):
+        client = FakeListClient(number_of_pages=3)
+        rows = list(SharePointListReader(client, "List").iter_rows())
+        assert [row["Amount"] for row in rows] == [0, 1, 2, 3, 4, 5]
+        assert len(client.list_items_requests) == 3
+
+    def test_iter_rows_records_limit(self):
+        client = FakeListClient(number_of_pages=10)
+        rows = list(SharePointListReader(client, "List").iter_rows(records_limit=3))
+        assert [row["Title"] for row in rows] == ["row_0", "row_1", "row_2"]
+        # Each page only asks for the remaining rows, with the default view's query, and none is requested past the limit
+        view_xmls = [view_xml for params, view_xml in client.list_items_requests]
+        assert len(view_xmls) == 2
+        assert '<RowLimit Paged="TRUE">3</RowLimit>' in view_xmls[0]
+        assert '<RowLimit Paged="TRUE">1</RowLimit>' in view_xmls[1]
+
+    def test_iter_rows_records_limit_with_a_view(self):
+        client = FakeListClient(number_of_pages=10)
+        rows = list(SharePointListReader(client, "List", list_view_id="view").iter_rows(records_limit=3))
+        assert len(rows) == 3
+        assert all(view_xml is None for params, view_xml in client.list_items_requests)
+
+    def test_records_limit_row_limit_sent(self, monkeypatch):
+        monkeypatch.setattr(sharepoint_client, "get_form_digest_value", lambda *args, **kwargs: None)
+        client = SharePointClient({
+            "auth_type": "oauth",
+            "sharepoint_oauth": {
+                "sharepoint_tenant": "tenant",
+                "sharepoint_site": "sites/site",
+                "sharepoint_root": "Shared Documents",
+                "sharepoint_oauth": "token"
+            }
+        })
+        client.column_ids = {"Title": "string", "Amount0": "double"}
+        client.session = FakeSession()
+        list(SharePointListReader(client, "List").iter_rows(records_limit=100))
+        posts = [kwargs for verb, url, kwargs in client.session.requests if url.endswith("/RenderListDataAsStream")]
+        assert len(posts) == 1
+        view_xml = posts[0]["json"]["parameters"]["ViewXml"]
+        assert '<RowLimit Paged="TRUE">100</RowLimit>' in view_xml
+        assert '<Eq><FieldRef Name="Status" />' in view_xml
+        assert '<ViewFields><FieldRef Name="Title" /><FieldRef Name="Amount0" /></ViewFields>' in view_xml
+
+    def test_iter_rows_by_id_ranges_keep_the_default_view(self):
+        client = FakeListClient(number_of_pages=1)
+        client.default_view_query = '<Where><Eq><FieldRef Name="Status" /><Value Type="Text">Open</Value></Eq></Where>'
+        rows = list(SharePointListReader(client, "List", max_read_workers=2).iter_rows())
+        assert len(rows) == 4
+        view_xmls = sorted(view_xml for params, view_xml in client.list_items_requests)
+        assert len(view_xmls) == 2
+        assert view_xmls[0] == (
+            '<View><Query><Where><And>'
+            '<And><Geq><FieldRef Name="ID" /><Value Type="Counter">1</Value></Geq>'
+            '<Leq><FieldRef Name="ID" /><Value Type="Counter">5000</Value></Leq></And>'
+            '<Eq><FieldRef Name="Status" /><Value Type="Text">Open</Value></Eq>'
+            '</And></Where><OrderBy><FieldRef Name="ID" Ascending="TRUE" /></OrderBy></Query>'
+            '<ViewFields><FieldRef Name="Title" /><FieldRef Name="Amount0" /></ViewFields>'
+            '<RowLimit Paged="TRUE">5000</RowLimit></View>'
+        )
+
+    def test_projected_read_keeps_the_default_view(self):
+        client = FakeListClient(number_of_pages=1)
+        client.default_view_query = '<OrderBy><FieldRef Name="Modified" /></OrderBy>'
+        dataset_schema = {"columns": [{"name": "Amount", "type": "double"}, {"name": "Notes", "type": "string"}]}
+        list(SharePointListReader(client, "List", project_columns=True).iter_rows(dataset_schema=dataset_schema))
+        assert client.list_items_requests[0][1] == (
+            '<View><Query><OrderBy><FieldRef Name="Modified" /></OrderBy></Query>'
+            '<ViewFields><FieldRef Name="Amount0" /></ViewFields><RowLimit Paged="TRUE">5000</RowLimit></View>'
+        )
+
+    def test_incremental_reads_keep_one_state_per_sync_key_and_mode(self, tmp_path):
+        client = FakeListClient(number_of_pages=1)
+        client.sharepoint_origin = "https://tenant.sharepoint.com"
+        client.sharepoint_site = "sites/site"
+        client.item_ids = {"0", "1"}
+        list_reader = SharePointListReader(client, "List")
+        assert len(list(list_reader.iter_incremental_rows(str(tmp_path), "project.dataset", keep_snapshot=True))) == 2
+        # The snapshot's mark does not hide the rows of the first delta read, nor of another dataset
+        assert len(list(list_reader.iter_incremental_rows(str(tmp_path), "project.dataset"))) == 2
+        assert len(list(list_reader.iter_incremental_rows(str(tmp_path), "project.other_dataset"))) == 2
+        assert len(list(list_reader.iter_incremental_rows(str(tmp_path), "project.dataset"))) == 0
+        assert len(list(tmp_path.iterdir())) == 3
+        with pytest.raises(ValueError):
+            list(list_reader.iter_incremental_rows(str(tmp_path), ""))
+
+    def test_incremental_snapshot_filters_within_id_ranges(self, tmp_path):
+        client = FakeListClient(number_of_pages=1)
+        client.sharepoint_origin = "https://tenant.sharepoint.com"
+        client.sharepoint_site = "sites/site"
+        client.item_ids = {"0"}
+        rows = list(SharePointListReader(client, "List").iter_incremental_rows(str(tmp_path), "project.dataset", keep_snapshot=True))
+        # Both ranges return the items 0 and 1, the item 1 has been deleted since
+        assert [row["Title"] for row in rows] == ["row_0"]
+        client.list_items_requests = []
+        list(SharePointListReader(client, "List").iter_incremental_rows(str(tmp_path), "project.dataset", keep_snapshot=True))
+        for params, view_xml in client.list_items_requests:
+            assert '<Where><And><And><Geq><FieldRef Name="ID" />' in view_xml
+            assert '<Geq><FieldRef Name="Modified" /><Value Type="DateTime" IncludeTimeValue="TRUE" StorageTZ="TRUE">' in view_xml
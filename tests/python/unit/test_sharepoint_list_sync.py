@@ -0,0 +1,56 @@
+from sharepoint_list_sync import SharePointListSyncState
+from sharepoint_lists import parse_view_query
+
+
+class TestSharePointListSyncStateMethods:
+    def test_first_read_has_no_query(self, tmp_path):
+        sync_state = SharePointListSyncState(str(tmp_path), ["https://tenant.sharepoint.com", "sites/site", "List"])
+        assert sync_state.get_query() is None
+
+    def test_high_water_mark(self, tmp_path):
+        state_elements = ["https://tenant.sharepoint.com", "sites/site", "List"]
+        sync_state = SharePointListSyncState(str(tmp_path), state_elements)
+        sync_state.add("1", 1000, {"Title": "a"})
+        sync_state.add("3", 3000, {"Title": "c"})
+        sync_state.add("2", 3000, {"Title": "b"})
+        sync_state.save()
+        sync_state = SharePointListSyncState(str(tmp_path), state_elements)
+        assert sync_state.last_modified == 3000
+        assert sync_state.is_already_read("2", 3000) is True
+        assert sync_state.is_already_read("2", 4000) is False
+        assert sync_state.is_already_read("4", 3000) is False
+        assert sync_state.get_query().find("Where/Geq/Value").text == "1970-01-01T00:00:03.000Z"
+
+    def test_snapshot_merge(self, tmp_path):
+        state_elements = ["https://tenant.sharepoint.com", "sites/site", "List"]
+        sync_state = SharePointListSyncState(str(tmp_path), state_elements, keep_snapshot=True)
+        sync_state.add("1", 1000, {"Title": "a"})
+        sync_state.add("2", 2000, {"Title": "b"})
+        sync_state.save()
+        sync_state = SharePointListSyncState(str(tmp_path), state_elements, keep_snapshot=True)
+        sync_state.add("1", 5000, {"Title": "a2"})
+        assert sorted(row["Title"] for row in sync_state.iter_rows()) == ["a2", "b"]
+
+    def test_delta_state_is_not_a_snapshot(self, tmp_path):
+        state_elements = ["https://tenant.sharepoint.com", "sites/site", "List"]
+        sync_state = SharePointListSyncState(str(tmp_path), state_elements)
+        sync_state.add("1", 1000, {"Title": "a"})
+        sync_state.save()
+        sync_state = SharePointListSyncState(str(tmp_path), state_elements, keep_snapshot=True)
+        assert sync_state.get_query() is None
+
+    def test_remove_deleted_rows(self, tmp_path):
+        sync_state = SharePointListSyncState(str(tmp_path), ["https://tenant.sharepoint.com", "sites/site", "List"], keep_snapshot=True)
+        sync_state.add("1", 1000, {"Title": "a"})
+        sync_state.add("2", 2000, {"Title": "b"})
+        sync_state.remove_deleted_rows({"2", "3"})
+        assert [row["Title"] for row in sync_state.iter_rows()] == ["b"]
+
+    def test_query_within_view_query(self, tmp_path):
+        sync_state = SharePointListSyncState(str(tmp_path), ["https://tenant.sharepoint.com", "sites/site", "List"])
+        view_query = parse_view_query('<Where><Eq><FieldRef Name="Status" /><Value Type="Text">Open</Value></Eq></Where>')
+        assert sync_state.get_query(view_query) is view_query
+        sync_state.add("1", 1000, {"Title": "a"})
+        query = sync_state.get_query(view_query)
+        assert query.find("Where/And/Geq/Value").text == "1970-01-01T00:00:01.000Z"
+        assert query.find("Where/And/Eq") is not None
@@ -0,0 +1,77 @@
+from sharepoint_lists import build_view_xml, build_id_range_query, get_id_ranges, iter_pages_ahead, get_projected_fields
+from sharepoint_lists import parse_view_query, map_view_fields
+from xml.etree.ElementTree import Element
+import pytest
+
+
+class TestSharePointListsMethods:
+    def test_build_view_xml_empty(self):
+        assert build_view_xml() == "<View />"
+
+    def test_build_view_xml_recursive_paged(self):
+        view_xml = build_view_xml(view_fields=["FileRef", "Modified"], scope="RecursiveAll", row_limit=5000)
+        assert view_xml == (
+            '<View Scope="RecursiveAll"><ViewFields><FieldRef Name="FileRef" /><FieldRef Name="Modified" /></ViewFields>'
+            '<RowLimit Paged="TRUE">5000</RowLimit></View>'
+        )
+
+    def test_build_view_xml_query(self):
+        view_xml = build_view_xml(query=Element("Query"))
+        assert view_xml == "<View><Query /></View>"
+
+    def test_build_id_range_query(self):
+        view_xml = build_view_xml(query=build_id_range_query(1, 5000))
+        assert view_xml == (
+            '<View><Query><Where><And>'
+            '<Geq><FieldRef Name="ID" /><Value Type="Counter">1</Value></Geq>'
+            '<Leq><FieldRef Name="ID" /><Value Type="Counter">5000</Value></Leq>'
+            '</And></Where><OrderBy><FieldRef Name="ID" Ascending="TRUE" /></OrderBy></Query></View>'
+        )
+
+    def test_build_id_range_query_in_view_query(self):
+        view_query = parse_view_query(
+            '<OrderBy><FieldRef Name="Modified" Ascending="FALSE" /></OrderBy>'
+            '<Where><Eq><FieldRef Name="Status" /><Value Type="Text">Open</Value></Eq></Where>'
+        )
+        view_xml = build_view_xml(query=build_id_range_query(1, 5000, view_query))
+        assert view_xml == (
+            '<View><Query><OrderBy><FieldRef Name="Modified" Ascending="FALSE" /></OrderBy><Where><And>'
+            '<And><Geq><FieldRef Name="ID" /><Value Type="Counter">1</Value></Geq>'
+            '<Leq><FieldRef Name="ID" /><Value Type="Counter">5000</Value></Leq></And>'
+            '<Eq><FieldRef Name="Status" /><Value Type="Text">Open</Value></Eq>'
+            '</And></Where></Query></View>'
+        )
+        assert len(view_query.find("Where")) == 1
+
+    def test_map_view_fields(self):
+        column_ids = {"Title": "string", "Amount0": "double", "Notes": "string"}
+        assert map_view_fields(["LinkTitle", "Amount0", "Attachments"], column_ids) == ["Title", "Amount0"]
+        assert map_view_fields([], column_ids) == ["Title", "Amount0", "Notes"]
+
+    def test_get_id_ranges(self):
+        assert get_id_ranges(3, 12, 5) == [(3, 7), (8, 12)]
+        assert get_id_ranges(1, 11, 5) == [(1, 5), (6, 10), (11, 11)]
+        assert get_id_ranges(4, 4, 5000) == [(4, 4)]
+
+    def test_iter_pages_ahead(self):
+        def get_page(page):
+            number = page.get("number", 0) + 1
+            return {"number": number, "Row": [number]}
+        pages = iter_pages_ahead(get_page, lambda page: page["number"] == 5)
+        assert [page["number"] for page in pages] == [1, 2, 3, 4, 5]
+
+    def test_iter_pages_ahead_error(self):
+        def get_page(page):
+            if page:
+                raise IOError("throttled")
+            return {"Row": []}
+        pages = iter_pages_ahead(get_page, lambda page: False)
+        assert next(pages) == {"Row": []}
+        with pytest.raises(IOError):
+            next(pages)
+
+    def test_get_projected_fields(self):
+        column_names = {"Title": "Title", "Amount0": "Amount", "Notes": "Notes"}
+        dataset_schema = {"columns": [{"name": "Title", "type": "string"}, {"name": "Amount", "type": "double"}]}
+        assert get_projected_fields(column_names, dataset_schema) == ["Title", "Amount0"]
+        assert get_projected_fields(column_names, None) == ["Title", "Amount0", "Notes"]
@@ -0,0 +1,67 @@
+from sharepoint_manifest import SharePointLibraryManifest, get_manifest_entry
+from dss_constants import DSSConstants
+
+
+class FakeClient(object):
+    sharepoint_origin = "https://tenant.sharepoint.com"
+
+    def __init__(self, changes, items):
+        self.changes = changes
+        self.items = items
+
+    def get_server_relative_path(self, full_path):
+        return "/sites/site/Docs" + full_path
+
+    def get_library_changes(self, full_path, change_token):
+        changes, self.changes = self.changes, []
+        return changes
+
+    def get_library_items_by_ids(self, full_path, item_ids):
+        return {item_id: self.items.get(item_id) for item_id in item_ids}
+
+
+class TestSharePointManifestMethods:
+    def get_manifest(self, tmp_path, changes=None, items=None):
+        manifest = SharePointLibraryManifest(FakeClient(changes or [], items or {}), None, "/root", str(tmp_path))
+        manifest.change_token = "1;3;token;0;-1"
+        manifest.items = {
+            "1": {"path": "/sites/site/Docs/root/folder", "is_directory": True, "size": 0, "last_modified": 0},
+            "2": {"path": "/sites/site/Docs/root/folder/a.csv", "is_directory": False, "size": 12, "last_modified": 1},
+            "3": {"path": "/sites/site/Docs/root/b.csv", "is_directory": False, "size": 3, "last_modified": 2}
+        }
+        manifest.index_items()
+        return manifest
+
+    def test_get_manifest_entry(self):
+        entry = get_manifest_entry({
+            "FileRef": "/sites/site/Docs/root/c.csv", "FSObjType": 0,
+            "Modified": "2020-01-01T00:00:00Z", "File": {"Length": "5"}
+        })
+        assert entry["is_directory"] is False
+        assert entry["size"] == 5
+        entry = get_manifest_entry({"FileRef": "/sites/site/Docs/root/d.csv", "FSObjType": "0", "Modified": "2020-01-01T00:00:00Z"})
+        assert entry["is_directory"] is False
+
+    def test_list_files(self, tmp_path):
+        manifest = self.get_manifest(tmp_path)
+        paths = sorted(path[DSSConstants.PATH] for path in manifest.list_files("/", "/root/folder"))
+        assert paths == ["/a.csv"]
+
+    def test_browse(self, tmp_path):
+        manifest = self.get_manifest(tmp_path)
+        children = manifest.browse("/", "/root")[DSSConstants.CHILDREN]
+        assert sorted(child[DSSConstants.FULL_PATH] for child in children) == ["/b.csv", "/folder"]
+        assert manifest.browse("/missing", "/root/missing")[DSSConstants.EXISTS] is False
+
+    def test_apply_changes_folder_deletion(self, tmp_path):
+        changes = [{"ItemId": 1, "ChangeType": 3, "ChangeToken": {"StringValue": "1;3;token;1;-1"}}]
+        manifest = self.get_manifest(tmp_path, changes=changes)
+        assert manifest.apply_changes() is True
+        assert list(manifest.items.keys()) == ["3"]
+        assert manifest.change_token == "1;3;token;1;-1"
+
+    def test_apply_changes_folder_move(self, tmp_path):
+        changes = [{"ItemId": 1, "ChangeType": 2, "ChangeToken": {"StringValue": "1;3;token;1;-1"}}]
+        items = {"1": {"FileRef": "/sites/site/Docs/root/renamed", "FSObjType": 1, "Modified": "2020-01-01T00:00:00Z"}}
+        manifest = self.get_manifest(tmp_path, changes=changes, items=items)
+        assert manifest.apply_changes() is False
@@ -0,0 +1,60 @@
+import threading
+from io import BytesIO
+
+from sharepoint_prefetcher import SharePointReadPrefetcher
+
+
+class TestSharePointReadPrefetcherMethods:
+    def setup_method(self):
+        self.downloaded_paths = []
+
+    def download_file(self, full_path, stream):
+        self.downloaded_paths.append(full_path)
+        stream.write(full_path.encode("utf-8"))
+
+    def test_read_in_order(self):
+        prefetcher = SharePointReadPrefetcher(self.download_file, 2, 1024)
+        prefetcher.schedule(["/a", "/b", "/c"])
+        for full_path in ["/a", "/b", "/c"]:
+            stream = BytesIO()
+            assert prefetcher.read(full_path, stream) is True
+            assert stream.getvalue() == full_path.encode("utf-8")
+        assert prefetcher.read("/d", BytesIO()) is False
+        prefetcher.close()
+        assert sorted(self.downloaded_paths) == ["/a", "/b", "/c"]
+
+    def test_read_out_of_order(self):
+        prefetcher = SharePointReadPrefetcher(self.download_file, 1, 1024)
+        prefetcher.schedule(["/a", "/b", "/c", "/d"])
+        assert prefetcher.read("/c", BytesIO()) is False
+        stream = BytesIO()
+        assert prefetcher.read("/d", stream) is True
+        assert stream.getvalue() == b"/d"
+        prefetcher.close()
+
+    def test_clear(self):
+        prefetcher = SharePointReadPrefetcher(self.download_file, 2, 1024)
+        prefetcher.schedule(["/a", "/b"])
+        prefetcher.clear()
+        assert prefetcher.read("/a", BytesIO()) is False
+        prefetcher.close()
+
+    def test_close_stops_the_downloads(self):
+        download_started = threading.Event()
+        written_chunks = []
+
+        def download_file(full_path, stream):
+            self.downloaded_paths.append(full_path)
+            download_started.set()
+            for chunk in range(1000):
+                stream.write(b"x")
+                written_chunks.append(chunk)
+                threading.Event().wait(0.01)
+
+        prefetcher = SharePointReadPrefetcher(download_file, 1, 1024)
+        prefetcher.schedule(["/a", "/b", "/c"])
+        download_started.wait(5)
+        prefetcher.close()
+        # close waits for the running download, which stops at its next chunk, and no other file is started
+        assert len(written_chunks) < 1000
+        assert self.downloaded_paths == ["/a"]
@@ -0,0 +1,40 @@
+from ttl_cache import TTLCache
+import time
+
+
+class TestTTLCache:
+    def test_get_set(self):
+        cache = TTLCache(ttl_sec=30, max_entries=10)
+        assert cache.get("a") == (False, None)
+        cache.set("a", 1)
+        assert cache.get("a") == (True, 1)
+        assert cache.get_statistics() == {"hits": 1, "misses": 1, "entries": 1}
+
+    def test_expiry(self):
+        cache = TTLCache(ttl_sec=0.01, max_entries=10)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") == (False, None)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(ttl_sec=30, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") == (False, None)
+        assert cache.get("a") == (True, 1)
+        assert cache.get("c") == (True, 3)
+
+    def test_invalidate(self):
+        cache = TTLCache(ttl_sec=30, max_entries=10)
+        cache.set(("Files", "/a"), 1)
+        cache.set(("Files", "/b"), 2)
+        assert cache.invalidate(lambda key: key[1] == "/a") == 1
+        assert cache.get(("Files", "/a")) == (False, None)
+        assert cache.get(("Files", "/b")) == (True, 2)
+
+    def test_disabled(self):
+        cache = TTLCache(ttl_sec=0)
+        cache.set("a", 1)
+        assert cache.get("a") == (False, None)
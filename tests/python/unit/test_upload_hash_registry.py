@@ -0,0 +1,13 @@
+from upload_hash_registry import UploadHashRegistry
+from common import get_state_key
+
+
+class TestUploadHashRegistryMethods:
+    def test_set_and_get(self, tmp_path):
+        registry = UploadHashRegistry(str(tmp_path))
+        key = get_state_key("https://tenant.sharepoint.com", "/sites/site/Docs/a.csv")
+        assert registry.get(key) is None
+        registry.set(key, 12, "abc", '"{guid},2"')
+        assert registry.get(key) == {"size": 12, "hash": "abc", "etag": '"{guid},2"'}
+        registry.remove(key)
+        assert registry.get(key) is None